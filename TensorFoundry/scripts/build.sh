@@ -5,7 +5,7 @@ DIST_PATH="--distpath ../dist/bin"
 WORK_PATH="--workpath ../build"
 SPEC_PATH="--specpath ../"
 PATHS="--paths=../src"
-HIDDEN_IMPORTS="--hidden-import PIL._tkinter_finder"
+HIDDEN_IMPORTS="--hidden-import PIL._tkinter_finder --hidden-import tensorflow --hidden-import coremltools"
 MAIN_SCRIPT="../src/application.py"
 OPTIONS="--onefile --windowed --name TensorFoundry"
 ASSETS_FOLDER="../assets"
@@ -0,0 +1,214 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from application_utils import read_output_labels
+from image_processing import capture_state
+from lazy_imports import LazyModule
+
+tf = LazyModule("tensorflow")
+
+# Action which ends a task on the device, also chosen whenever no prediction reaches the inference limit
+TASK_COMPLETE = "TASK_COMPLETE"
+
+
+class AgentSimulator:
+    # Replays the TestingAgent predict, threshold and act loop over a recorded screen transition graph
+    #
+    # The graph is a JSON file of the form:
+    # {
+    #   "tasks": ["PERFORM_LOGIN", "PERFORM_LOGOUT", ...],
+    #   "screens": {"login": "screens/login.png", "first": "screens/first.png", ...},
+    #   "transitions": {"login": {"PERFORM_LOGIN": "first"}, "first": {"TAP_NEXT_BUTTON": "second"}, ...},
+    #   "cases": [{"task": "NAVIGATE_SECOND_SCREEN", "start": "login", "goal": "second", "assert": "SECOND_SCREEN"}]
+    # }
+    # The task order matches TestData.TaskData as it decides the task augmentation, screenshot paths are relative
+    # to the graph file and actions without a transition leave the screen unchanged.
+
+    def __init__(self, configuration, log_message):
+        self.configuration = configuration
+        self.log_message = log_message
+
+    # Method which simulates every case of a graph and returns the results
+    def run_simulation(self, graph_path, task_model_path, assert_model_path=None, inference_limit=None,
+                       actions_limit=None):
+
+        inference_limit = self.configuration.inference_limit if inference_limit is None else inference_limit
+        actions_limit = self.configuration.actions_limit if actions_limit is None else actions_limit
+
+        with open(graph_path, "r") as file:
+            graph = json.load(file)
+
+        graph_folder = os.path.dirname(os.path.abspath(graph_path))
+        screens = {name: os.path.join(graph_folder, path) for name, path in graph["screens"].items()}
+        cases = graph["cases"]
+        start_time = time.perf_counter()
+
+        # The states only depend on the screen and the task, so every distinct pair is predicted in one batch
+        task_pairs = sorted({(screen, graph["tasks"].index(case["task"]))
+                             for case in cases for screen in self.reachable_screens(graph, case["start"])})
+        task_labels, task_predictions = self.predict_states(task_model_path, "task", screens, task_pairs)
+
+        assert_labels, assert_predictions = None, {}
+        if assert_model_path:
+            assert_pairs = sorted({(screen, None) for screen in screens})
+            assert_labels, assert_predictions = self.predict_states(assert_model_path, "assert", screens, assert_pairs)
+
+        inference_time = time.perf_counter() - start_time
+
+        results = [self.simulate_case(graph, case, task_labels, task_predictions, assert_labels, assert_predictions,
+                                      inference_limit, actions_limit) for case in cases]
+
+        summary = self.summarize(results, len(task_pairs) + len(assert_predictions), inference_time,
+                                 time.perf_counter() - start_time)
+        self.log_results(results, summary)
+
+        return {"summary": summary, "cases": results}
+
+    # Method which returns the screens reachable from a start screen through the recorded transitions
+    def reachable_screens(self, graph, start_screen):
+        reachable = {start_screen}
+        pending = [start_screen]
+
+        while pending:
+            for next_screen in graph["transitions"].get(pending.pop(), {}).values():
+                if next_screen not in reachable:
+                    reachable.add(next_screen)
+                    pending.append(next_screen)
+
+        return reachable
+
+    # Method which runs a batched inference over screen and task pairs, returning the labels and the outputs
+    def predict_states(self, model_path, head_name, screens, pairs):
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+
+        # Multi-head models keep separate label files for each head
+        labels, load_labels = read_output_labels(f"{model_name}_{head_name}", model_path)
+        if not load_labels:
+            labels, load_labels = read_output_labels(model_name, model_path)
+
+        if not load_labels:
+            raise FileNotFoundError("Could not read the output labels of {}".format(model_path))
+
+        if model_path.endswith(".tflite"):
+            outputs = self.predict_tflite(model_path, head_name, screens, pairs)
+        else:
+            outputs = self.predict_keras(model_path, head_name, screens, pairs)
+
+        return labels, dict(zip(pairs, outputs))
+
+    # Method which predicts the states with a .keras model
+    def predict_keras(self, model_path, head_name, screens, pairs):
+        model = tf.keras.models.load_model(model_path)
+        states = np.concatenate([capture_state(screens[screen], model.input_shape[1:], task_index)
+                                 for screen, task_index in pairs])
+        outputs = model(states, training=False)
+
+        if isinstance(outputs, (list, tuple)):
+            outputs = outputs[model.output_names.index(f"{head_name}_output")]
+
+        return np.asarray(outputs)
+
+    # Method which predicts the states with a .tflite model the same way as the device does
+    def predict_tflite(self, model_path, head_name, screens, pairs):
+        interpreter = tf.lite.Interpreter(model_path=model_path)
+        input_details = interpreter.get_input_details()[0]
+
+        # Resize the batch dimension so all states run in a single invoke
+        interpreter.resize_tensor_input(input_details["index"], [len(pairs)] + list(input_details["shape"][1:]))
+        interpreter.allocate_tensors()
+
+        states = np.concatenate([capture_state(screens[screen], input_details["shape"][1:], task_index)
+                                 for screen, task_index in pairs])
+        interpreter.set_tensor(input_details["index"], states)
+        interpreter.invoke()
+
+        output_index = interpreter.get_output_details()[0]["index"]
+
+        # Multi-head models reorder their output tensors, the signature keeps the Keras output order
+        if len(interpreter.get_output_details()) > 1:
+            signature_outputs = interpreter.get_signature_runner().get_output_details()
+            output_index = signature_outputs["output_{}".format(0 if head_name == "task" else 1)]["index"]
+
+        return interpreter.get_tensor(output_index)
+
+    # Method which replays a single case against the precomputed predictions
+    def simulate_case(self, graph, case, task_labels, task_predictions, assert_labels, assert_predictions,
+                      inference_limit, actions_limit):
+
+        task_index = graph["tasks"].index(case["task"])
+        screen = case["start"]
+        actions = []
+        completed = False
+
+        for _ in range(actions_limit):
+            output = task_predictions[(screen, task_index)]
+            action_index = int(np.argmax(output))
+
+            # Below the inference limit the agent treats the task as complete
+            if output[action_index] < inference_limit or task_labels[action_index] == TASK_COMPLETE:
+                completed = True
+                break
+
+            actions.append(task_labels[action_index])
+            screen = graph["transitions"].get(screen, {}).get(task_labels[action_index], screen)
+
+        success = completed and screen == case.get("goal", screen)
+        asserted_state = None
+
+        if assert_labels and "assert" in case:
+            asserted_state = assert_labels[int(np.argmax(assert_predictions[(screen, None)]))]
+            success = success and asserted_state == case["assert"]
+
+        return {
+            "task": case["task"],
+            "start": case["start"],
+            "goal": case.get("goal"),
+            "final_screen": screen,
+            "asserted_state": asserted_state,
+            "completed": completed,
+            "success": success,
+            "steps": len(actions),
+            "actions": actions
+        }
+
+    # Method which summarizes the success rate and steps to complete per task and overall
+    def summarize(self, results, inference_count, inference_time, total_time):
+        summary = {
+            "cases": len(results),
+            "success_rate": float(np.mean([result["success"] for result in results])) if results else 0.0,
+            "mean_steps": self.mean_steps(results),
+            "inferences": inference_count,
+            "inference_time": inference_time,
+            "total_time": total_time,
+            "tasks": {}
+        }
+
+        for task_name in sorted({result["task"] for result in results}):
+            task_results = [result for result in results if result["task"] == task_name]
+            summary["tasks"][task_name] = {
+                "cases": len(task_results),
+                "success_rate": float(np.mean([result["success"] for result in task_results])),
+                "mean_steps": self.mean_steps(task_results)
+            }
+
+        return summary
+
+    # Method which returns the mean number of steps of the successful cases
+    def mean_steps(self, results):
+        steps = [result["steps"] for result in results if result["success"]]
+        return float(np.mean(steps)) if steps else None
+
+    # Method which logs the simulation results as a table
+    def log_results(self, results, summary):
+        self.log_message("{:<28}{:<16}{:<16}{:>7}{:>9}".format("Task", "Start", "Final screen", "Steps", "Result"))
+
+        for result in results:
+            self.log_message("{:<28}{:<16}{:<16}{:>7}{:>9}".format(
+                result["task"][:27], result["start"][:15], result["final_screen"][:15], result["steps"],
+                "PASS" if result["success"] else "FAIL"))
+
+        self.log_message("Success rate {:.1f}% over {} cases with {} batched inferences in {:.2f} s".format(
+            summary["success_rate"] * 100, summary["cases"], summary["inferences"], summary["total_time"]))
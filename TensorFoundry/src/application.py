@@ -1,5 +1,5 @@
-import queue
-from datetime import datetime
+import multiprocessing
+import time
 from tkinter import ttk
 
 from ttkthemes.themed_tk import ThemedTk
@@ -8,6 +8,9 @@ from create_dataset import CreateDataset
 from create_model import CreateModel
 from dataset_preview import DatasetPreview
 from configuration import Configuration
+from lazy_imports import start_warm_up
+from log_pipeline import LogPipeline
+from task_runner import TaskRunner
 from tensorflow_model import TensorflowModel
 from train_model import TrainModel
 
@@ -15,6 +18,7 @@ from train_model import TrainModel
 
 class Application:
     def __init__(self):
+        start_time = time.perf_counter()
 
         # First read configuration
         self.configuration = Configuration()
@@ -27,7 +31,8 @@ class Application:
         self.app.resizable(False, False)
 
         # Setting up the rest of the application objects
-        self.log_queue = queue.Queue()
+        self.log_pipeline = LogPipeline(self.configuration)
+        self.task_runner = TaskRunner(self.app, self.configuration, self.log_message)
         self.notebook = ttk.Notebook(self.app)
         self.create_model_tab = ttk.Frame(self.notebook)
         self.crate_dataset_tab = ttk.Frame(self.notebook)
@@ -44,27 +49,30 @@ class Application:
             self.app,
             self.configuration,
             self.log_message,
-            self.tensorflow_model
+            self.tensorflow_model,
+            self.task_runner
         )
 
         self.create_dataset = CreateDataset(
             self.app,
             self.configuration,
             self.log_message,
-            self.tensorflow_model
+            self.tensorflow_model,
+            self.task_runner
         )
 
         self.dataset_preview = DatasetPreview(
             self.app,
             self.configuration,
-            self.log_message
+            self.log_message,
+            self.task_runner
         )
 
         self.train_model = TrainModel(
             self.app,
             self.configuration,
             self.log_message,
-            self.dataset_preview.plot_dataset,
+            self.dataset_preview.set_dataset,
             self.create_model.output_size,
             self.tensorflow_model
         )
@@ -76,42 +84,44 @@ class Application:
         self.train_model.create_train_model_ui(self.train_model_tab)
         self.dataset_preview.create_dataset_preview_ui(self.dataset_preview_tab)
 
+        # Feed the log views of each tab from the shared log buffer
+        self.log_pipeline.add_view(self.create_model.model_log_view)
+        self.log_pipeline.add_view(self.create_dataset.dataset_log_view)
+        self.log_pipeline.add_view(self.train_model.training_log_view)
+
+        # Show the progress of background jobs
+        self.task_runner.add_view(self.create_model.model_task_view)
+        self.task_runner.add_view(self.create_dataset.dataset_task_view)
+        self.task_runner.add_view(self.dataset_preview.preview_task_view)
+
         # Initialize the data
         self.create_model.add_default_outputs()
 
         # Print a welcome message
-        self.log_message("Application started... Welcome!")
+        self.log_message("Application started in {:.2f} s... Welcome!".format(time.perf_counter() - start_time))
         self.print_log()
 
+        # Import TensorFlow in the background once the window has been drawn
+        self.app.after_idle(start_warm_up, self.log_message)
+
         # Start the application
         self.app.mainloop()
 
+        # Stop the background jobs and flush the remaining log messages once the window has closed
+        self.task_runner.close()
+        self.log_pipeline.close()
+
     def refresh_application(self):
         self.app.update()
 
-    # Method for logging a message
+    # Method for logging a message, safe to call from worker threads
     def log_message(self, message):
-        current_time = datetime.now()
-        timestamp_str = current_time.strftime("%H:%M:%S.%f")[:-3]
-
-        log_entry = timestamp_str + " " + message
-
-        self.log_queue.put(log_entry)
-        self.refresh_application()
+        self.log_pipeline.log_message(message)
 
-    # Method for printing messages into log from the queue
+    # Method for printing a batch of messages from the queue into the log views
     def print_log(self):
-        try:
-            messages = self.log_queue.get(0)
-            messages = messages.split('\n')
-
-            self.create_model.print_model_log(messages)
-            self.create_dataset.print_dataset_log(messages)
-            self.train_model.print_training_log(messages)
-            self.app.after(self.configuration.log_rate, self.print_log)
-
-        except queue.Empty:
-            self.app.after(self.configuration.log_rate, self.print_log)
+        self.log_pipeline.drain()
+        self.app.after(self.configuration.log_rate, self.print_log)
 
     # Method which creates the UI
     def create_application_ui(self):
@@ -173,4 +183,6 @@ class Application:
 
 
 if __name__ == '__main__':
+    # Needed by the dataset render process pool in frozen builds
+    multiprocessing.freeze_support()
     Application()
\ No newline at end of file
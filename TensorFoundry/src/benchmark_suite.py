@@ -0,0 +1,400 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from image_processing import DATASET_FORMATS, augment_image_task, crop_resize_image, encode_dataset_image, \
+    filter_source_images, find_image_filepaths, save_dataset_image
+from lazy_imports import LazyModule, measure_import_times
+
+tf = LazyModule("tensorflow")
+
+# Names of the benchmarks in the order they run, the model benchmarks share a model created by the first of them
+BENCHMARKS = [
+    "augment_image_task",
+    "save_image",
+    "filter_source_images",
+    "find_image_filepaths",
+    "create_datasets",
+    "encode_png",
+    "encode_webp",
+    "encode_npy",
+    "decode_png",
+    "decode_webp",
+    "decode_npy",
+    "training_step",
+    "test_model",
+    "tflite_conversion",
+    "cold_start"
+]
+
+# Synthetic fixture sizes, kept small enough for the suite to finish in about a minute on a laptop CPU
+SCREENSHOT_SIZE = (540, 1200)
+SCREENSHOT_COUNT = 32
+INPUT_SIZE = 96
+DATASET_CLASSES = 4
+DATASET_IMAGES_PER_CLASS = 64
+SOURCE_TREE_FILES = 2000
+TRAINING_BATCH_SIZE = 32
+
+
+class BenchmarkSuite:
+    # Reproducible benchmarks of the TensorFoundry hot paths over synthetic fixtures created with a fixed seed
+    #
+    # Each benchmark is repeated and reports the median time of a repeat and the throughput in its own unit,
+    # a stored baseline is compared per benchmark and a slowdown beyond the threshold is a regression.
+
+    def __init__(self, configuration, log_message, seed=0):
+        self.configuration = configuration
+        self.log_message = log_message
+        self.seed = seed
+        self.fixture_path = None
+        self.screenshot_paths = []
+        self.dataset_images = None
+        self.model_path = None
+        self.tensorflow_model = None
+
+    # Method which runs the selected benchmarks and returns the results with a description of the machine
+    def run_suite(self, benchmark_names=None, repeats=5):
+        benchmark_names = benchmark_names or BENCHMARKS
+        unknown_names = [name for name in benchmark_names if name not in BENCHMARKS]
+
+        if unknown_names:
+            raise ValueError("Unknown benchmarks: {}".format(", ".join(unknown_names)))
+
+        self.fixture_path = tempfile.mkdtemp(prefix="tensorfoundry_benchmark_")
+        results = {"machine": self.describe_machine(), "seed": self.seed, "repeats": repeats, "benchmarks": {}}
+
+        try:
+            self.create_screenshots()
+
+            for name in [name for name in BENCHMARKS if name in benchmark_names]:
+                self.log_message("Running benchmark: {}".format(name))
+                results["benchmarks"][name] = getattr(self, "benchmark_" + name)(repeats)
+        finally:
+            shutil.rmtree(self.fixture_path, ignore_errors=True)
+
+        self.log_results(results)
+        return results
+
+    # Method which describes the machine so results are only compared on similar hardware
+    def describe_machine(self):
+        return {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count()
+        }
+
+    # Method which creates screenshots with a status bar, flat panels and noise like real screens
+    def create_screenshots(self):
+        random = np.random.default_rng(self.seed)
+        screenshots_path = os.path.join(self.fixture_path, "screenshots")
+        os.makedirs(screenshots_path)
+
+        for index in range(SCREENSHOT_COUNT):
+            width, height = SCREENSHOT_SIZE
+            pixels = np.full((height, width, 3), random.integers(0, 256, 3), dtype=np.uint8)
+            pixels[:height // 20] = 0
+
+            for _ in range(8):
+                top, left = random.integers(0, height - 100), random.integers(0, width - 100)
+                pixels[top:top + 100, left:left + random.integers(20, 100)] = random.integers(0, 256, 3)
+
+            pixels[height // 2:height // 2 + 64] = random.integers(0, 256, (64, width, 3))
+            image_path = os.path.join(screenshots_path, "screen_{:03d}.png".format(index))
+            Image.fromarray(pixels).save(image_path)
+            self.screenshot_paths.append(image_path)
+
+    # Method which times a function over the repeats, the work returned by the function is the processed units.
+    # An untimed warm-up repeat runs first so lazy imports, tracing and first reads do not skew the times.
+    def time_repeats(self, function, repeats, unit, warm_up=True):
+        times = []
+        units = 0
+
+        if warm_up:
+            function(0)
+
+        for repeat in range(repeats):
+            start_time = time.perf_counter()
+            units = function(repeat)
+            times.append(time.perf_counter() - start_time)
+
+        median_time = statistics.median(times)
+
+        return {
+            "seconds": median_time,
+            "min_seconds": min(times),
+            "max_seconds": max(times),
+            "units": units,
+            "unit": unit,
+            "throughput": units / median_time if median_time > 0 else None
+        }
+
+    def benchmark_augment_image_task(self, repeats):
+        random = np.random.default_rng(self.seed)
+        images = [Image.fromarray(random.integers(0, 256, (INPUT_SIZE, INPUT_SIZE, 3), dtype=np.uint8))
+                  for _ in range(64)]
+
+        def augment(repeat):
+            for task_index, image in enumerate(images):
+                augment_image_task(image, task_index % 8)
+            return len(images)
+
+        return self.time_repeats(augment, repeats, "images")
+
+    def benchmark_save_image(self, repeats):
+        save_path = os.path.join(self.fixture_path, "saved")
+        os.makedirs(save_path, exist_ok=True)
+
+        def save(repeat):
+            for image_path in self.screenshot_paths:
+                save_dataset_image(image_path, os.path.join(save_path, os.path.basename(image_path)),
+                                   (INPUT_SIZE, INPUT_SIZE, 3))
+            return len(self.screenshot_paths)
+
+        return self.time_repeats(save, repeats, "images")
+
+    def benchmark_filter_source_images(self, repeats):
+        source_images = ["/screenshots/screen_{:06d}.png".format(index) for index in range(20000)]
+        dataset_images = {"screen_{:06d}_TASK".format(index) for index in range(0, 20000, 2)}
+
+        def filter_images(repeat):
+            filter_source_images(source_images, "TASK", dataset_images)
+            return len(source_images)
+
+        return self.time_repeats(filter_images, repeats, "images")
+
+    def benchmark_find_image_filepaths(self, repeats):
+        tree_path = os.path.join(self.fixture_path, "tree")
+
+        for index in range(SOURCE_TREE_FILES):
+            folder_path = os.path.join(tree_path, "session_{:02d}".format(index % 20))
+            os.makedirs(folder_path, exist_ok=True)
+            extension = ".png" if index % 4 else ".txt"
+            open(os.path.join(folder_path, "file_{:05d}{}".format(index, extension)), "w").close()
+
+        def find_images(repeat):
+            find_image_filepaths(tree_path)
+            return SOURCE_TREE_FILES
+
+        return self.time_repeats(find_images, repeats, "files")
+
+    # Method which creates a dataset of the screenshots rendered at the input size
+    def create_dataset_fixture(self):
+        dataset_path = os.path.join(self.fixture_path, "dataset")
+
+        if os.path.isdir(dataset_path):
+            return dataset_path
+
+        for class_index in range(DATASET_CLASSES):
+            class_path = os.path.join(dataset_path, "CLASS_{}".format(class_index))
+            os.makedirs(class_path)
+
+            for index in range(DATASET_IMAGES_PER_CLASS):
+                image_path = self.screenshot_paths[(class_index * DATASET_IMAGES_PER_CLASS + index) % SCREENSHOT_COUNT]
+                save_dataset_image(image_path, os.path.join(class_path, "image_{:03d}.png".format(index)),
+                                   (INPUT_SIZE, INPUT_SIZE, 3))
+
+        return dataset_path
+
+    def benchmark_create_datasets(self, repeats):
+        return self.time_create_datasets(self.create_dataset_fixture(), repeats)
+
+    # Method which times reading a dataset through the training pipeline
+    def time_create_datasets(self, dataset_path, repeats):
+        from tensorflow_dataset import DataSet
+
+        class_names = ["CLASS_{}".format(class_index) for class_index in range(DATASET_CLASSES)]
+        self.configuration.scan_cache_path = os.path.join(self.fixture_path, "dataset_scan.sqlite")
+
+        # A new dataset is created every repeat so the in-memory cache does not hide the decoding
+        def read_dataset(repeat):
+            datasets = DataSet(self.configuration, lambda message: None, (INPUT_SIZE, INPUT_SIZE, 3)).create_datasets(
+                dataset_path, class_names)
+            return sum(int(images.shape[0]) for dataset in datasets if dataset is not None for images, _ in dataset)
+
+        return self.time_repeats(read_dataset, repeats, "images")
+
+    # Method which crops and resizes the screenshots in memory once for the storage format benchmarks
+    def create_dataset_images(self):
+        if self.dataset_images is not None:
+            return
+
+        self.dataset_images = []
+
+        for image_path in self.screenshot_paths:
+            with Image.open(image_path) as image:
+                self.dataset_images.append(crop_resize_image(image, (INPUT_SIZE, INPUT_SIZE, 3)))
+
+    # Method which writes the cropped and resized screenshots into a dataset in a storage format
+    def write_format_dataset(self, dataset_format):
+        self.create_dataset_images()
+
+        dataset_path = os.path.join(self.fixture_path, "dataset_" + dataset_format.lower())
+        extension = DATASET_FORMATS[dataset_format]
+
+        for class_index in range(DATASET_CLASSES):
+            class_path = os.path.join(dataset_path, "CLASS_{}".format(class_index))
+            os.makedirs(class_path, exist_ok=True)
+
+            for index in range(DATASET_IMAGES_PER_CLASS):
+                image = self.dataset_images[(class_index * DATASET_IMAGES_PER_CLASS + index) % SCREENSHOT_COUNT]
+
+                with open(os.path.join(class_path, "image_{:03d}{}".format(index, extension)), "wb") as file:
+                    file.write(encode_dataset_image(image, extension, self.configuration.png_compress_level))
+
+        return dataset_path
+
+    # Method which times writing a dataset in a storage format and adds its size on disk per image
+    def benchmark_encode(self, dataset_format, repeats):
+        self.create_dataset_images()
+
+        result = self.time_repeats(
+            lambda repeat: self.write_format_dataset(dataset_format) and DATASET_CLASSES * DATASET_IMAGES_PER_CLASS,
+            repeats, "images")
+
+        image_paths = [os.path.join(root, file)
+                       for root, dirs, files in os.walk(self.write_format_dataset(dataset_format)) for file in files]
+        result["bytes_per_image"] = sum(os.path.getsize(image_path) for image_path in image_paths) / len(image_paths)
+
+        return result
+
+    def benchmark_encode_png(self, repeats):
+        return self.benchmark_encode("PNG", repeats)
+
+    def benchmark_encode_webp(self, repeats):
+        return self.benchmark_encode("WEBP", repeats)
+
+    def benchmark_encode_npy(self, repeats):
+        return self.benchmark_encode("NPY", repeats)
+
+    def benchmark_decode_png(self, repeats):
+        return self.time_create_datasets(self.write_format_dataset("PNG"), repeats)
+
+    def benchmark_decode_webp(self, repeats):
+        return self.time_create_datasets(self.write_format_dataset("WEBP"), repeats)
+
+    def benchmark_decode_npy(self, repeats):
+        return self.time_create_datasets(self.write_format_dataset("NPY"), repeats)
+
+    # Method which creates the benchmark model with the configured architecture at the benchmark input size
+    def create_model(self):
+        if self.model_path is not None:
+            return
+
+        from model_architectures import read_architecture
+        from tensorflow_model import TensorflowModel
+
+        tf.keras.utils.set_random_seed(self.seed)
+        self.model_path = os.path.join(self.fixture_path, "benchmark.keras")
+        self.tensorflow_model = TensorflowModel(self.configuration, lambda message: None, lambda: None)
+        self.tensorflow_model.model = self.tensorflow_model.build_model(
+            INPUT_SIZE, DATASET_CLASSES, read_architecture(self.configuration.model_architecture),
+            self.configuration.width_multiplier)
+        self.tensorflow_model.compile_model()
+        self.tensorflow_model.save_model(self.model_path,
+                                         ["CLASS_{}".format(index) for index in range(DATASET_CLASSES)])
+
+    def benchmark_training_step(self, repeats):
+        self.create_model()
+        model = self.tensorflow_model.model
+        random = np.random.default_rng(self.seed)
+        images = random.integers(0, 256, (TRAINING_BATCH_SIZE, INPUT_SIZE, INPUT_SIZE, 3)).astype(np.float32)
+        labels = random.integers(0, DATASET_CLASSES, TRAINING_BATCH_SIZE)
+
+        # The warm-up repeat traces the train function
+        def train_steps(repeat):
+            for _ in range(10):
+                model.train_on_batch(images, labels)
+            return 10
+
+        return self.time_repeats(train_steps, repeats, "steps")
+
+    def benchmark_test_model(self, repeats):
+        self.create_model()
+        class_names = ["CLASS_{}".format(index) for index in range(DATASET_CLASSES)]
+
+        # An empty prediction cache and a new screenshot every repeat measure what a user waits for
+        self.configuration.prediction_cache_path = os.path.join(self.fixture_path, "predictions.sqlite")
+        self.tensorflow_model.prediction_cache = None
+
+        def test_model(repeat):
+            self.tensorflow_model.test_model(self.model_path, self.screenshot_paths[repeat], class_names)
+            return 1
+
+        # The warm-up predicts the last screenshot, which no repeat predicts again
+        self.tensorflow_model.test_model(self.model_path, self.screenshot_paths[-1], class_names)
+        return self.time_repeats(test_model, min(repeats, SCREENSHOT_COUNT - 1), "predictions", warm_up=False)
+
+    def benchmark_tflite_conversion(self, repeats):
+        self.create_model()
+        return self.time_repeats(lambda repeat: self.tensorflow_model.convert_model_tflite(self.model_path) or 1,
+                                 repeats, "conversions")
+
+    # Method which times importing the application in a fresh interpreter, the window itself needs a display
+    def benchmark_cold_start(self, repeats):
+        times = [measure_import_times(("application",))["application"]["seconds"] for _ in range(repeats)]
+
+        if None in times:
+            return None
+
+        return {
+            "seconds": statistics.median(times),
+            "min_seconds": min(times),
+            "max_seconds": max(times),
+            "units": 1,
+            "unit": "starts",
+            "throughput": 1 / statistics.median(times)
+        }
+
+    # Method which compares results against a baseline and returns the benchmarks which slowed down too much
+    def compare_baseline(self, results, baseline, threshold):
+        regressions = []
+
+        self.log_message("{:<24}{:>12}{:>12}{:>9}".format("Benchmark", "Baseline s", "Current s", "Change"))
+
+        for name, result in results["benchmarks"].items():
+            baseline_result = baseline["benchmarks"].get(name)
+
+            if result is None or baseline_result is None:
+                continue
+
+            change = result["seconds"] / baseline_result["seconds"] - 1
+            regressed = change > threshold
+
+            self.log_message("{:<24}{:>12.4f}{:>12.4f}{:>8.1f}%{}".format(
+                name, baseline_result["seconds"], result["seconds"], change * 100, "  REGRESSION" if regressed else ""))
+
+            if regressed:
+                regressions.append(name)
+
+        if baseline.get("machine") != results["machine"]:
+            self.log_message("The baseline was recorded on a different machine, compare with care")
+
+        return regressions
+
+    # Method which logs the benchmark results as a table
+    def log_results(self, results):
+        self.log_message("{:<24}{:>12}{:>12}{:>16}".format("Benchmark", "Median s", "Min s", "Throughput"))
+
+        for name, result in results["benchmarks"].items():
+            if result is None:
+                self.log_message("{:<24}{:>12}".format(name, "failed"))
+                continue
+
+            self.log_message("{:<24}{:>12.4f}{:>12.4f}{:>10.1f} {}/s{}".format(
+                name, result["seconds"], result["min_seconds"], result["throughput"], result["unit"],
+                "  {:.1f} KB/image".format(result["bytes_per_image"] / 1024) if "bytes_per_image" in result else ""))
+
+
+# Function which reads a stored baseline
+def read_baseline(baseline_path):
+    with open(baseline_path, "r") as file:
+        return json.load(file)
@@ -0,0 +1,536 @@
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from configuration import Configuration
+
+
+# Function for logging a message to the console in the same format as the application log
+def log_message(message):
+    timestamp_str = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+    for line in message.split('\n'):
+        print(timestamp_str + " " + line, flush=True)
+
+
+# Function which writes command results into a JSON file when requested
+def write_results(results, output_path):
+    if output_path:
+        with open(output_path, 'w') as file:
+            json.dump(results, file, indent=2)
+        log_message("Results written to: {}".format(output_path))
+
+
+# Function for the benchmark command
+def benchmark_command(arguments):
+    from model_benchmark import ModelBenchmark
+
+    results = ModelBenchmark(Configuration(), log_message).run_benchmark(
+        arguments.model,
+        arguments.images,
+        task_index=arguments.task,
+        thread_counts=arguments.threads,
+        repeats=arguments.repeats,
+        warmups=arguments.warmups)
+
+    write_results(results, arguments.output)
+
+
+# Function for the cost sweep command
+def sweep_command(arguments):
+    from model_architectures import read_architecture
+    from tensorflow_model import TensorflowModel
+
+    configuration = Configuration()
+    results = TensorflowModel(configuration, log_message, lambda: None).sweep_model_costs(
+        arguments.sizes or configuration.cost_sweep_sizes,
+        [read_architecture(architecture) for architecture in arguments.architectures],
+        arguments.widths,
+        arguments.outputs)
+
+    write_results(results, arguments.output)
+
+
+# Function for the model evaluation command, repeated evaluations are served from the prediction cache
+def evaluate_command(arguments):
+    from model_evaluation import ModelEvaluation
+    from tensorflow_model import TensorflowModel
+
+    configuration = Configuration()
+    model_evaluation = ModelEvaluation(
+        configuration, log_message, TensorflowModel(configuration, log_message, lambda: None))
+    results = model_evaluation.run_evaluation(arguments.model, arguments.dataset, arguments.threshold)
+
+    if results is not None:
+        model_evaluation.log_results(results)
+        write_results(results, arguments.output)
+
+
+# Function for the import time report command
+def import_report_command(arguments):
+    from lazy_imports import measure_import_times
+
+    results = measure_import_times()
+
+    for module_name, result in results.items():
+        if result["seconds"] is None:
+            log_message("{:<36} failed to import".format(module_name))
+        else:
+            log_message("{:<36}{:>8.2f} s  heavy modules loaded: {}".format(
+                module_name, result["seconds"], ", ".join(result["heavy_modules"]) or "-"))
+
+    write_results(results, arguments.output)
+
+
+# Function for the embedding index build command
+def index_build_command(arguments):
+    from embedding_index import EmbeddingIndex
+
+    index = EmbeddingIndex.build(arguments.model, arguments.dataset, log_message)
+
+    if index is not None:
+        index.save(arguments.index)
+        log_message("Embedding index written to: {}".format(arguments.index))
+
+
+# Function for the embedding index add command which inserts a new screen without retraining
+def index_add_command(arguments):
+    from embedding_index import EmbeddingIndex
+    from image_processing import find_image_filepaths
+
+    index = EmbeddingIndex.load(arguments.index)
+    image_paths = find_image_filepaths(arguments.images)
+
+    if len(image_paths) == 0:
+        log_message("Could not find any images to add from: {}".format(arguments.images))
+        return
+
+    index.add(index.embed_images(image_paths, arguments.screenshots, arguments.task), arguments.label)
+    index.save(arguments.index)
+    log_message("Added {} embeddings of '{}' into: {}".format(len(image_paths), arguments.label, arguments.index))
+
+
+# Function for the embedding index classify command
+def index_classify_command(arguments):
+    from embedding_index import EmbeddingIndex
+    from image_processing import find_image_filepaths
+
+    index = EmbeddingIndex.load(arguments.index)
+    image_paths = find_image_filepaths(arguments.images)
+
+    if len(image_paths) == 0:
+        log_message("Could not find any images to classify from: {}".format(arguments.images))
+        return
+
+    predictions = index.classify(index.embed_images(image_paths, arguments.screenshots, arguments.task), arguments.k)
+    results = []
+
+    for image_path, (label_name, score) in zip(image_paths, predictions):
+        log_message("{}: {} ({:.2f})".format(image_path, label_name, score))
+        results.append({"image": image_path, "label": label_name, "score": score})
+
+    write_results(results, arguments.output)
+
+
+# Function for the agent simulation command
+def simulate_command(arguments):
+    from agent_simulator import AgentSimulator
+
+    results = AgentSimulator(Configuration(), log_message).run_simulation(
+        arguments.graph,
+        arguments.task_model,
+        assert_model_path=arguments.assert_model,
+        inference_limit=arguments.inference_limit,
+        actions_limit=arguments.actions_limit)
+
+    write_results(results, arguments.output)
+
+
+# Function for the train command, which trains a supervised model without the application window
+def train_command(arguments):
+    import os
+
+    from application_utils import read_output_labels
+    from tensorflow_dataset import DataSet
+    from tensorflow_model import TensorflowModel
+
+    configuration = Configuration()
+    if arguments.profile_start is not None:
+        configuration.profile_start_batch = arguments.profile_start
+
+    model_name = os.path.splitext(os.path.basename(arguments.model))[0]
+    class_names, load_classes = read_output_labels(model_name, arguments.model)
+
+    if not load_classes:
+        log_message("Could not read the {}_output_labels.txt!".format(model_name))
+        return
+
+    tensorflow_model = TensorflowModel(configuration, log_message, lambda: None)
+    input_size = tensorflow_model.get_model_input(arguments.model)
+    datasets = DataSet(configuration, log_message, input_size).create_datasets(arguments.dataset, class_names)
+
+    if datasets is None:
+        return
+
+    tensorflow_model.train_model(arguments.model, arguments.epochs or configuration.epoch_count, datasets[0],
+                                 datasets[1], class_names, lambda accuracy, loss: None, arguments.profile_steps)
+
+
+# Function for the distillation command, which trains a smaller student on the outputs of a trained teacher
+def distill_command(arguments):
+    import os
+
+    from application_utils import read_output_labels
+    from model_architectures import read_architecture
+    from tensorflow_dataset import DataSet
+    from tensorflow_model import TensorflowModel
+
+    configuration = Configuration()
+    model_name = os.path.splitext(os.path.basename(arguments.teacher))[0]
+    class_names, load_classes = read_output_labels(model_name, arguments.teacher)
+
+    if not load_classes:
+        log_message("Could not read the {}_output_labels.txt!".format(model_name))
+        return
+
+    tensorflow_model = TensorflowModel(configuration, log_message, lambda: None)
+    input_size = tensorflow_model.get_model_input(arguments.teacher)
+    datasets = DataSet(configuration, log_message, input_size).create_datasets(arguments.dataset, class_names)
+
+    if datasets is None:
+        return
+
+    results = tensorflow_model.distill_model(
+        arguments.teacher,
+        arguments.student,
+        arguments.epochs or configuration.epoch_count,
+        datasets[0],
+        datasets[1],
+        class_names,
+        read_architecture(arguments.architecture),
+        arguments.width,
+        lambda accuracy, loss: None,
+        temperature=arguments.temperature,
+        alpha=arguments.alpha)
+
+    if results is not None and arguments.tflite:
+        tensorflow_model.convert_model_tflite(results["student_path"])
+
+    write_results(results, arguments.output)
+
+
+# Function for the serve command, which keeps models loaded and predicts screenshots sent over HTTP
+def serve_command(arguments):
+    from inference_server import InferenceServer
+    from tensorflow_model import TensorflowModel
+
+    configuration = Configuration()
+    tensorflow_model = TensorflowModel(configuration, log_message, lambda: None)
+    inference_server = InferenceServer(configuration, log_message, tensorflow_model, arguments.batch_window,
+                                       arguments.max_batch)
+
+    for model_path in arguments.models:
+        inference_server.load_model(model_path)
+
+    inference_server.serve(arguments.host, arguments.port, arguments.socket)
+
+
+# Function for the benchmark suite command, exits with an error when a benchmark regressed against the baseline
+def bench_command(arguments):
+    from benchmark_suite import BenchmarkSuite, read_baseline
+
+    configuration = Configuration()
+    benchmark_suite = BenchmarkSuite(configuration, log_message, arguments.seed)
+    results = benchmark_suite.run_suite(arguments.only, arguments.repeats)
+    write_results(results, arguments.output)
+
+    if arguments.save_baseline:
+        write_results(results, arguments.save_baseline)
+
+    if arguments.baseline:
+        threshold = configuration.benchmark_threshold if arguments.threshold is None else arguments.threshold
+        regressions = benchmark_suite.compare_baseline(results, read_baseline(arguments.baseline), threshold)
+
+        if regressions:
+            log_message("Regressed benchmarks: {}".format(", ".join(regressions)))
+            sys.exit(1)
+
+
+# Function for the render command
+def render_command(arguments):
+    from dataset_manifest import render_dataset
+
+    configuration = Configuration()
+    render_dataset(arguments.dataset, arguments.target, (arguments.size, arguments.size, arguments.channels),
+                   arguments.channels, arguments.workers or configuration.render_processes, log_message,
+                   png_compress_level=configuration.png_compress_level)
+
+
+# Function for the synthetic dataset generation command
+def generate_command(arguments):
+    from screenshot_generator import generate_dataset
+
+    configuration = Configuration()
+    size = arguments.size or configuration.input_size
+    channels = arguments.channels or configuration.num_channels
+    generate_dataset(arguments.target, arguments.layout, arguments.count, arguments.classes, arguments.tasks,
+                     (size, size, channels), channels, arguments.workers or configuration.render_processes,
+                     log_message, arguments.seed, arguments.format or configuration.dataset_format)
+
+
+# Function for the dataset scan command, exits with an error when the dataset would fail training
+def scan_command(arguments):
+    import os
+
+    from dataset_scanner import DatasetScanner
+
+    configuration = Configuration()
+    size = arguments.size or configuration.input_size
+    channels = arguments.channels or configuration.num_channels
+
+    if arguments.labels:
+        with open(arguments.labels, "r") as file:
+            class_names = [label.strip() for label in file if label.strip()]
+    else:
+        class_names = [name for name in sorted(os.listdir(arguments.dataset))
+                       if not name.startswith(".") and os.path.isdir(os.path.join(arguments.dataset, name))]
+
+    dataset_scanner = DatasetScanner(configuration, log_message)
+    report = dataset_scanner.scan_dataset(arguments.dataset, class_names, (size, size, channels))
+    dataset_scanner.log_report(report)
+    write_results(report, arguments.output)
+
+    if report["errors"]:
+        sys.exit(1)
+
+
+# Function for the image store deduplication command
+def store_dedupe_command(arguments):
+    from image_store import deduplicate_dataset
+
+    for dataset in arguments.datasets:
+        deduplicate_dataset(dataset, log_message)
+
+
+# Function for the dataset branch command
+def store_branch_command(arguments):
+    from image_store import branch_dataset
+
+    branch_dataset(arguments.dataset, arguments.target, log_message)
+
+
+# Function for the image store garbage collection command
+def store_gc_command(arguments):
+    from image_store import ImageStore, dataset_store_path
+
+    image_store = ImageStore(dataset_store_path(arguments.dataset))
+    removed_count, removed_bytes = image_store.collect_garbage()
+    log_message("Removed {} unused images from: {}, freeing {:.1f} MB".format(
+        removed_count, image_store.store_path, removed_bytes / (1024 * 1024)))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="TensorFoundry", description="TensorFoundry command line tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Benchmark command
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="Benchmark the .keras and .tflite variants of a model on screenshots")
+    benchmark_parser.add_argument("model", help="Path to the .keras or .tflite model")
+    benchmark_parser.add_argument("images", help="Directory of raw screenshots")
+    benchmark_parser.add_argument("--task", type=int, default=None, help="Task index used for augmentation")
+    benchmark_parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4],
+                                  help="TFLite interpreter thread counts")
+    benchmark_parser.add_argument("--repeats", type=int, default=3, help="Passes over the screenshots")
+    benchmark_parser.add_argument("--warmups", type=int, default=3, help="Warm-up inferences before timing")
+    benchmark_parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    benchmark_parser.set_defaults(handler=benchmark_command)
+
+    # Cost sweep command
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="Tabulate model cost across input sizes, architectures and widths")
+    sweep_parser.add_argument("--sizes", type=int, nargs="+", default=None, help="Candidate input sizes")
+    sweep_parser.add_argument("--architectures", nargs="+", default=["CONV_FLATTEN", "CONV_GAP", "SEPARABLE"],
+                              help="Candidate architectures")
+    sweep_parser.add_argument("--widths", type=float, nargs="+", default=[1.0], help="Candidate width multipliers")
+    sweep_parser.add_argument("--outputs", type=int, default=8, help="Number of model outputs")
+    sweep_parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    sweep_parser.set_defaults(handler=sweep_command)
+
+    # Import time report command
+    import_report_parser = subparsers.add_parser(
+        "import-report", help="Measure the cold import time of the application and its heavy dependencies")
+    import_report_parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    import_report_parser.set_defaults(handler=import_report_command)
+
+    # Model evaluation command
+    evaluate_parser = subparsers.add_parser(
+        "evaluate", help="Evaluate a model against a dataset with a folder per output")
+    evaluate_parser.add_argument("model", help="Path to the .keras model")
+    evaluate_parser.add_argument("dataset", help="Dataset directory")
+    evaluate_parser.add_argument("--threshold", type=float, default=0.0,
+                                 help="Confidence threshold for the coverage report")
+    evaluate_parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    evaluate_parser.set_defaults(handler=evaluate_command)
+
+    # Agent simulation command
+    simulate_parser = subparsers.add_parser(
+        "simulate", help="Replay the testing agent over a recorded screen transition graph")
+    simulate_parser.add_argument("graph", help="Screen transition graph JSON file")
+    simulate_parser.add_argument("task_model", help="Path to the .keras or .tflite task model")
+    simulate_parser.add_argument("--assert-model", default=None, help="Optional .keras or .tflite assert model")
+    simulate_parser.add_argument("--inference-limit", type=float, default=None,
+                                 help="Confidence needed to act, defaults to INFERENCE_LIMIT")
+    simulate_parser.add_argument("--actions-limit", type=int, default=None,
+                                 help="Actions per task, defaults to ACTIONS_LIMIT")
+    simulate_parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    simulate_parser.set_defaults(handler=simulate_command)
+
+    # Embedding index commands
+    index_build_parser = subparsers.add_parser(
+        "index-build", help="Export the penultimate layer embeddings of a dataset into a nearest neighbour index")
+    index_build_parser.add_argument("model", help="Path to the trained .keras model")
+    index_build_parser.add_argument("dataset", help="Dataset directory with a folder per label")
+    index_build_parser.add_argument("index", help="Path of the .npz index to write")
+    index_build_parser.set_defaults(handler=index_build_command)
+
+    for command, handler, help_text in (
+            ("index-add", index_add_command, "Add the embeddings of a new screen to an index without retraining"),
+            ("index-classify", index_classify_command, "Classify images by their nearest neighbours in an index")):
+        index_parser = subparsers.add_parser(command, help=help_text)
+        index_parser.add_argument("index", help="Path to the .npz index")
+        index_parser.add_argument("images", help="Directory of images")
+        index_parser.add_argument("--screenshots", action="store_true",
+                                  help="Images are raw screenshots instead of dataset images")
+        index_parser.add_argument("--task", type=int, default=None, help="Task index used to augment screenshots")
+        index_parser.set_defaults(handler=handler)
+
+        if command == "index-add":
+            index_parser.add_argument("--label", required=True, help="Label of the added screen")
+        else:
+            index_parser.add_argument("--k", type=int, default=5, help="Number of nearest neighbours")
+            index_parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+
+    # Training command
+    train_parser = subparsers.add_parser(
+        "train", help="Train a supervised model on a dataset, optionally capturing a profiler trace")
+    train_parser.add_argument("model", help="Path to the .keras model with its output labels")
+    train_parser.add_argument("dataset", help="Dataset directory with a folder per output")
+    train_parser.add_argument("--epochs", type=int, default=None, help="Epochs, defaults to EPOCH_COUNT")
+    train_parser.add_argument("--profile-steps", type=int, default=0,
+                              help="Number of batches to capture in a profiler trace, zero disables profiling")
+    train_parser.add_argument("--profile-start", type=int, default=None,
+                              help="First profiled batch, defaults to PROFILE_START_BATCH")
+    train_parser.set_defaults(handler=train_command)
+
+    # Distillation command
+    distill_parser = subparsers.add_parser(
+        "distill", help="Distill a trained model into a smaller student model and compare them")
+    distill_parser.add_argument("teacher", help="Path to the trained .keras teacher model with its output labels")
+    distill_parser.add_argument("dataset", help="Dataset directory with a folder per output")
+    distill_parser.add_argument("student", help="Path of the .keras student model to write")
+    distill_parser.add_argument("--architecture", choices=["CONV_FLATTEN", "CONV_GAP", "SEPARABLE"],
+                                default="SEPARABLE", help="Architecture of the student")
+    distill_parser.add_argument("--width", type=float, default=0.5, help="Width multiplier of the student")
+    distill_parser.add_argument("--epochs", type=int, default=None, help="Epochs, defaults to EPOCH_COUNT")
+    distill_parser.add_argument("--temperature", type=float, default=None,
+                                help="Softmax temperature, defaults to DISTILLATION_TEMPERATURE")
+    distill_parser.add_argument("--alpha", type=float, default=None,
+                                help="Weight of the dataset labels, defaults to DISTILLATION_ALPHA")
+    distill_parser.add_argument("--tflite", action="store_true", help="Convert the student to .tflite")
+    distill_parser.add_argument("--output", default=None, help="Optional JSON file for the report")
+    distill_parser.set_defaults(handler=distill_command)
+
+    # Inference server command
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve models over HTTP or a Unix socket, batching concurrent requests")
+    serve_parser.add_argument("models", nargs="+", help="Paths to the .keras models, served by their file names")
+    serve_parser.add_argument("--host", default=None, help="Host to listen on, defaults to SERVE_HOST")
+    serve_parser.add_argument("--port", type=int, default=None, help="Port to listen on, defaults to SERVE_PORT")
+    serve_parser.add_argument("--socket", default=None, help="Unix socket path to listen on instead of a port")
+    serve_parser.add_argument("--batch-window", type=float, default=None,
+                              help="Milliseconds a request waits to share a batch, defaults to SERVE_BATCH_WINDOW")
+    serve_parser.add_argument("--max-batch", type=int, default=None,
+                              help="Largest batch of requests, defaults to SERVE_MAX_BATCH")
+    serve_parser.set_defaults(handler=serve_command)
+
+    # Benchmark suite command
+    bench_parser = subparsers.add_parser(
+        "bench", help="Run the hot path benchmark suite and compare it against a stored baseline")
+    bench_parser.add_argument("--only", nargs="+", default=None, help="Names of the benchmarks to run")
+    bench_parser.add_argument("--repeats", type=int, default=5, help="Repeats of each benchmark")
+    bench_parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic fixtures")
+    bench_parser.add_argument("--baseline", default=None, help="Baseline JSON file to compare against")
+    bench_parser.add_argument("--save-baseline", default=None, help="Write the results as a new baseline")
+    bench_parser.add_argument("--threshold", type=float, default=None,
+                              help="Allowed slowdown before a regression, defaults to BENCHMARK_THRESHOLD")
+    bench_parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    bench_parser.set_defaults(handler=bench_command)
+
+    # Dataset render command
+    render_parser = subparsers.add_parser(
+        "render", help="Re-render a dataset from its canonical crops at another input size")
+    render_parser.add_argument("dataset", help="Dataset directory with a dataset_manifest.json")
+    render_parser.add_argument("target", help="Directory of the re-rendered dataset, may be the dataset itself")
+    render_parser.add_argument("--size", type=int, required=True, help="Input width and height in pixels")
+    render_parser.add_argument("--channels", type=int, choices=[1, 3], default=3, help="Image channels")
+    render_parser.add_argument("--workers", type=int, default=None,
+                               help="Render processes, defaults to RENDER_PROCESSES")
+    render_parser.set_defaults(handler=render_command)
+
+    # Synthetic dataset generation command
+    generate_parser = subparsers.add_parser(
+        "generate", help="Generate synthetic app screenshots in the source, assert or task dataset layout")
+    generate_parser.add_argument("target", help="Directory of the generated images")
+    generate_parser.add_argument("--layout", choices=["source", "assert", "task"], default="assert",
+                                 help="SourceImages, AssertDataset or TaskDataset layout")
+    generate_parser.add_argument("--count", type=int, default=1000, help="Number of images")
+    generate_parser.add_argument("--classes", type=int, default=8, help="Number of screens or actions")
+    generate_parser.add_argument("--tasks", type=int, default=5, help="Number of tasks of the task layout")
+    generate_parser.add_argument("--size", type=int, default=None,
+                                 help="Input width and height of the dataset layouts, defaults to INPUT_SIZE")
+    generate_parser.add_argument("--channels", type=int, choices=[1, 3], default=None,
+                                 help="Image channels of the dataset layouts, defaults to NUM_CHANNELS")
+    generate_parser.add_argument("--workers", type=int, default=None,
+                                 help="Writer processes, defaults to RENDER_PROCESSES")
+    generate_parser.add_argument("--seed", type=int, default=0, help="Seed of the generated screens")
+    generate_parser.add_argument("--format", choices=["PNG", "WEBP", "NPY"], default=None,
+                                 help="Storage format of the dataset layouts, defaults to DATASET_FORMAT")
+    generate_parser.set_defaults(handler=generate_command)
+
+    # Dataset scan command
+    scan_parser = subparsers.add_parser(
+        "scan", help="Validate every image of a dataset before training, rechecking only changed files")
+    scan_parser.add_argument("dataset", help="Dataset directory with a folder per output")
+    scan_parser.add_argument("--labels", default=None,
+                             help="Output labels file of the model, defaults to the dataset folders")
+    scan_parser.add_argument("--size", type=int, default=None,
+                             help="Input width and height of the model, defaults to INPUT_SIZE")
+    scan_parser.add_argument("--channels", type=int, choices=[1, 3], default=None,
+                             help="Image channels of the model, defaults to NUM_CHANNELS")
+    scan_parser.add_argument("--output", default=None, help="Optional JSON file for the report")
+    scan_parser.set_defaults(handler=scan_command)
+
+    # Image store commands
+    store_dedupe_parser = subparsers.add_parser(
+        "store-dedupe", help="Move the images of datasets into their image store, linking identical images once")
+    store_dedupe_parser.add_argument("datasets", nargs="+", help="Dataset directories")
+    store_dedupe_parser.set_defaults(handler=store_dedupe_command)
+
+    store_branch_parser = subparsers.add_parser(
+        "store-branch", help="Branch a dataset into a new directory by linking its images")
+    store_branch_parser.add_argument("dataset", help="Dataset directory to branch")
+    store_branch_parser.add_argument("target", help="New dataset directory, must not exist")
+    store_branch_parser.set_defaults(handler=store_branch_command)
+
+    store_gc_parser = subparsers.add_parser(
+        "store-gc", help="Remove the images no dataset links to from an image store")
+    store_gc_parser.add_argument("dataset", help="Any dataset directory using the image store")
+    store_gc_parser.set_defaults(handler=store_gc_command)
+
+    arguments = parser.parse_args()
+    arguments.handler(arguments)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,18 @@
 import glob
 
-from screeninfo import get_monitors
+from screeninfo import get_monitors, ScreenInfoError
 
 
 class Configuration:
     def __init__(self):
         # Application
-        self.screen_resolutions = [(monitor.width, monitor.height) for monitor in get_monitors()]
+        self.screen_resolutions = self.read_screen_resolutions()
         self.window_size = 0.85
         self.window_width = int(min(monitor[0] for monitor in self.screen_resolutions) * self.window_size)
         self.window_height = int(min(monitor[1] for monitor in self.screen_resolutions) * self.window_size)
         self.refresh_rate = 100
+        self.worker_threads = 4
+        self.task_poll_rate = 50
 
         # Colours
         self.app_light_background_color = "#2E2E2E"
@@ -28,21 +30,97 @@ class Configuration:
         self.app_plot_height = 0.75
         self.app_padding = 5
 
+        # Dataset preview
+        self.thumbnail_cache_path = "~/.cache/tensorfoundry/thumbnails"
+        self.thumbnail_size = 96
+
+        # Size limit of the thumbnail cache in megabytes, the least recently used thumbnails are evicted above it
+        # and zero disables the limit
+        self.thumbnail_cache_limit = 512
+        self.preview_columns = 10
+        self.preview_rows = 6
+
+        # Prediction cache
+        self.prediction_cache_path = "~/.cache/tensorfoundry/predictions.sqlite"
+
         # Logging
         self.log_limit = 1000
         self.log_rate = 10
+        self.log_batch_size = 500
+        self.log_file_path = "tensorfoundry.log"
+        self.log_file_bytes = 1048576
+        self.log_file_backups = 3
 
         # Model
         self.input_size = 128
         self.num_channels = 3
+        self.model_architecture = "CONV_FLATTEN"
+        self.width_multiplier = 1.0
+        self.cost_sweep_sizes = [64, 96, 128, 192, 256]
 
         # Training
         self.epoch_count = 1000
         self.min_dataset_size = 20
+        self.learning_rate = 0.001
+        self.validation_split = 0.2
+
+        # Early stopping is disabled with a zero patience, the schedule is NONE, PLATEAU or COSINE and the time
+        # limit is in minutes with zero for no limit
+        self.early_stopping_patience = 20
+        self.lr_schedule = "PLATEAU"
+        self.lr_plateau_patience = 5
+        self.lr_plateau_factor = 0.5
+        self.lr_minimum = 0.00001
+        self.training_time_limit = 0
+
+        # Training telemetry is written into this folder, an empty path disables it
+        self.telemetry_path = "telemetry"
+
+        # Profiler trace capture, zero profile steps leaves the profiler off
+        self.profile_start_batch = 10
+        self.profile_steps = 0
+
+        # Knowledge distillation, the temperature softens the teacher outputs and the alpha weighs the dataset
+        # labels against the teacher outputs in the student loss
+        self.distillation_temperature = 4.0
+        self.distillation_alpha = 0.1
+
+        # Dataset creation
+        self.prelabel_threshold = 0.95
+        self.render_processes = 4
+
+        # Storage format of the dataset images, PNG, WEBP (lossless) or NPY (raw pixels), and the PNG zlib level
+        self.dataset_format = "PNG"
+        self.png_compress_level = 6
+
+        # Dataset scan before training
+        self.scan_cache_path = "~/.cache/tensorfoundry/dataset_scan.sqlite"
+        self.scan_processes = 4
+
+        # Benchmark suite, the share a benchmark may slow down against its baseline
+        self.benchmark_threshold = 0.2
+
+        # Agent simulation, matching the TestingAgent on the device
+        self.inference_limit = 0.9
+        self.actions_limit = 10
+
+        # Inference server, the batch window is the longest time in milliseconds a request waits for others to
+        # share its batch
+        self.serve_host = "127.0.0.1"
+        self.serve_port = 8500
+        self.serve_batch_window = 5.0
+        self.serve_max_batch = 32
 
         # Read the config file
         self.read_config()
 
+    # Method which reads the monitor resolutions with a fallback for headless command line use
+    def read_screen_resolutions(self):
+        try:
+            return [(monitor.width, monitor.height) for monitor in get_monitors()]
+        except ScreenInfoError:
+            return [(1920, 1080)]
+
     # Method which reads configuration from file
     def read_config(self):
 
@@ -68,6 +146,12 @@ class Configuration:
                     if "REFRESH_RATE" in config.upper():
                         self.window_size = int(value)
 
+                    if "WORKER_THREADS" in config.upper():
+                        self.worker_threads = int(value)
+
+                    if "TASK_POLL_RATE" in config.upper():
+                        self.task_poll_rate = int(value)
+
                     # Colors
                     if "APP_LIGHT_BACKGROUND_COLOR" in config.upper():
                         self.app_light_background_color = value
@@ -106,6 +190,26 @@ class Configuration:
                     if "APP_PADDING" in config.upper():
                         self.app_padding = int(value)
 
+                    # Dataset preview
+                    if "THUMBNAIL_CACHE_PATH" in config.upper():
+                        self.thumbnail_cache_path = value
+
+                    if "THUMBNAIL_SIZE" in config.upper():
+                        self.thumbnail_size = int(value)
+
+                    if "THUMBNAIL_CACHE_LIMIT" in config.upper():
+                        self.thumbnail_cache_limit = float(value)
+
+                    if "PREVIEW_COLUMNS" in config.upper():
+                        self.preview_columns = int(value)
+
+                    if "PREVIEW_ROWS" in config.upper():
+                        self.preview_rows = int(value)
+
+                    # Prediction cache
+                    if "PREDICTION_CACHE_PATH" in config.upper():
+                        self.prediction_cache_path = value
+
                     # Logging
                     if "LOG_LIMIT" in config.upper():
                         self.log_limit = int(value)
@@ -113,6 +217,18 @@ class Configuration:
                     if "LOG_RATE" in config.upper():
                         self.log_rate = int(value)
 
+                    if "LOG_BATCH_SIZE" in config.upper():
+                        self.log_batch_size = int(value)
+
+                    if "LOG_FILE_PATH" in config.upper():
+                        self.log_file_path = value
+
+                    if "LOG_FILE_BYTES" in config.upper():
+                        self.log_file_bytes = int(value)
+
+                    if "LOG_FILE_BACKUPS" in config.upper():
+                        self.log_file_backups = int(value)
+
                     # Inputs
                     if "MAX_VALUE" in config.upper():
                         self.max_value = int(value)
@@ -124,6 +240,15 @@ class Configuration:
                     if "NUM_CHANNELS" in config.upper():
                         self.num_channels = int(value)
 
+                    if "MODEL_ARCHITECTURE" in config.upper():
+                        self.model_architecture = value.upper()
+
+                    if "WIDTH_MULTIPLIER" in config.upper():
+                        self.width_multiplier = float(value)
+
+                    if "COST_SWEEP_SIZES" in config.upper():
+                        self.cost_sweep_sizes = [int(size) for size in value.split(",")]
+
                     # Training
                     if "EPOCH_COUNT" in config.upper():
                         self.epoch_count = int(value)
@@ -131,4 +256,88 @@ class Configuration:
                     if "MIN_DATASET_SIZE" in config.upper():
                         self.min_dataset_size = int(value)
 
+                    if "LEARNING_RATE" in config.upper():
+                        self.learning_rate = float(value)
+
+                    if "VALIDATION_SPLIT" in config.upper():
+                        self.validation_split = float(value)
+
+                    if "EARLY_STOPPING_PATIENCE" in config.upper():
+                        self.early_stopping_patience = int(value)
+
+                    if "LR_SCHEDULE" in config.upper():
+                        self.lr_schedule = value.upper()
+
+                    if "LR_PLATEAU_PATIENCE" in config.upper():
+                        self.lr_plateau_patience = int(value)
+
+                    if "LR_PLATEAU_FACTOR" in config.upper():
+                        self.lr_plateau_factor = float(value)
+
+                    if "LR_MINIMUM" in config.upper():
+                        self.lr_minimum = float(value)
+
+                    if "TRAINING_TIME_LIMIT" in config.upper():
+                        self.training_time_limit = float(value)
+
+                    if "TELEMETRY_PATH" in config.upper():
+                        self.telemetry_path = value
+
+                    if "PROFILE_START_BATCH" in config.upper():
+                        self.profile_start_batch = int(value)
+
+                    if "PROFILE_STEPS" in config.upper():
+                        self.profile_steps = int(value)
+
+                    # Knowledge distillation
+                    if "DISTILLATION_TEMPERATURE" in config.upper():
+                        self.distillation_temperature = float(value)
+
+                    if "DISTILLATION_ALPHA" in config.upper():
+                        self.distillation_alpha = float(value)
+
+                    # Dataset creation
+                    if "PRELABEL_THRESHOLD" in config.upper():
+                        self.prelabel_threshold = float(value)
+
+                    if "RENDER_PROCESSES" in config.upper():
+                        self.render_processes = int(value)
+
+                    if "DATASET_FORMAT" in config.upper():
+                        self.dataset_format = value.upper()
+
+                    if "PNG_COMPRESS_LEVEL" in config.upper():
+                        self.png_compress_level = int(value)
+
+                    # Dataset scan
+                    if "SCAN_CACHE_PATH" in config.upper():
+                        self.scan_cache_path = value
+
+                    if "SCAN_PROCESSES" in config.upper():
+                        self.scan_processes = int(value)
+
+                    # Benchmark suite
+                    if "BENCHMARK_THRESHOLD" in config.upper():
+                        self.benchmark_threshold = float(value)
+
+                    # Agent simulation
+                    if "INFERENCE_LIMIT" in config.upper():
+                        self.inference_limit = float(value)
+
+                    if "ACTIONS_LIMIT" in config.upper():
+                        self.actions_limit = int(value)
+
+                    # Inference server
+                    if "SERVE_HOST" in config.upper():
+                        self.serve_host = value
+
+                    if "SERVE_PORT" in config.upper():
+                        self.serve_port = int(value)
+
+                    if "SERVE_BATCH_WINDOW" in config.upper():
+                        self.serve_batch_window = float(value)
+
+                    if "SERVE_MAX_BATCH" in config.upper():
+                        self.serve_max_batch = int(value)
+
         return
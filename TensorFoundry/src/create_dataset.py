@@ -1,24 +1,33 @@
 import os
 import platform
-from tkinter import END, messagebox, ttk, Listbox
+from tkinter import END, messagebox, ttk, DoubleVar, Listbox
 
 from PIL import Image
-from PIL.Image import Resampling
 from matplotlib import image as mpimg
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
 from application_utils import DialogType, read_output_labels, read_task_labels, filepath_dialog
+from dataset_manifest import DatasetManifest, render_dataset
+from image_processing import DATASET_FORMATS, DATASET_IMAGE_TYPES, augment_image_task, crop_resize_image, \
+    filter_source_images, find_image_filepaths, walk_visible
 from input_dialog import InputDialog
+from log_pipeline import LogView
+from task_runner import TaskView
+from thumbnail_cache import ThumbnailCache
+from thumbnail_gallery import ThumbnailGallery
 
 
 class CreateDataset:
-    def __init__(self, app, configuration, log_message, tensorflow_model):
+    def __init__(self, app, configuration, log_message, tensorflow_model, task_runner):
         self.app = app
         self.configuration = configuration
         self.log_message = log_message
         self.tensorflow_model = tensorflow_model
-        self.dataset_log_listbox = None
+        self.task_runner = task_runner
+        self.thumbnail_cache = ThumbnailCache(configuration, log_message)
+        self.dataset_log_view = None
+        self.dataset_task_view = None
         self.task_listbox = None
         self.link_output_listbox = None
         self.source_images_path = None
@@ -26,21 +35,15 @@ class CreateDataset:
         self.source_plot_figure = None
         self.source_plot_canvas = None
         self.source_plot = None
+        self.source_gallery = None
+        self.gallery_visible = False
         self.dataset_folder = None
+        self.dataset_manifest = None
         self.dataset_link_actions = []
         self.dataset_input_size = None
-
-    # Method which logs into the dataset log listbox
-    def print_dataset_log(self, messages):
-        for msg in messages:
-            self.dataset_log_listbox.insert(END, msg)
-            self.dataset_log_listbox.yview(END)
-
-        if self.dataset_log_listbox.index("end") > self.configuration.log_limit:
-            self.dataset_log_listbox.delete(0)
-
-    def disable_log_selection(self, event):
-        self.dataset_log_listbox.selection_clear(0, END)
+        self.dataset_model_path = None
+        self.source_predictions = {}
+        self.prelabel_threshold_var = None
 
     # Method which updates the current image when task selection changes
     def select_listbox_task(self, event):
@@ -140,65 +143,37 @@ class CreateDataset:
 
     # Method for reading image files from a target folder
     def find_image_filepaths(self, images_path):
+        return find_image_filepaths(images_path)
 
-        image_types = [".jpg", ".jpeg", ".png", ".gif"]
-        image_paths = []
+    # Method which returns the names without extension of the images already in the dataset
+    def find_dataset_images(self, dataset_folder):
+        dataset_images = set()
 
-        # Read all compatible image files from the target folder
-        for root, dirs, files in os.walk(images_path):
-            for image in files:
-                if any(image.lower().endswith(type) for type in image_types):
-                    image_paths.append(os.path.join(root, image))
+        for root, dirs, files in walk_visible(dataset_folder):
+            dataset_images.update(os.path.splitext(file)[0] for file in files if file.endswith(DATASET_IMAGE_TYPES))
 
-        return image_paths
+        return dataset_images
 
     # Method which filters out image filepaths which already exists in the dataset
-    def filter_source_images(self, source_images, task_name):
-
-        images_list = []
-
-        # Check if the task augmented image exists in the target dataset
-        for source_image in source_images:
-
-            image_name, image_extension = os.path.splitext(os.path.basename(source_image))
-
-            if task_name:
-                image_name += f"_{task_name}"
+    def filter_source_images(self, source_images, task_name, dataset_images):
+        return filter_source_images(source_images, task_name, dataset_images)
 
-            image_name += image_extension
+    # Method which writes a linked image into the dataset of the manifest, run on the task runner
+    def write_dataset_image(self, dataset_manifest, source_image_path, dataset_image_path, input_size, task_index):
 
-            # Searching if the current image is not included in any existing images in the dataset
-            found = False
-            for root, dirs, files in os.walk(self.dataset_folder):
+        with Image.open(source_image_path) as image:
+            image = crop_resize_image(image, input_size)
 
-                # Filter to only include .png files
-                png_files = [file for file in files if file.endswith('.png')]
+        # Augment the image with the task index if available so it can be recognized, in memory as the written
+        # image may be shared with other datasets through the image store
+        if task_index is not None:
+            image = augment_image_task(image, task_index)
 
-                if image_name in png_files:
-                    found = True
-                    break
+        # Save the image into the image store in a single write and link it into the destination dataset folder
+        dataset_manifest.image_store.write_image(image, dataset_image_path, self.configuration.png_compress_level)
 
-            if not found:
-                images_list.append(source_image)
-
-        return images_list
-
-    # Method which converts and saves it to target folder
-    def save_image(self, image_path, save_path):
-        with Image.open(image_path) as image:
-            # Crop the top bar off the image
-            width, height = image.size
-            image = image.crop((0, int(height * 0.05), width, height))
-
-            # Resize and format the image
-            image = image.resize(
-                [self.dataset_input_size[0], self.dataset_input_size[1]],
-                resample=Resampling.NEAREST
-            )
-
-            # Convert to RGB and save the image
-            image = image.convert('RGB')
-            image.save(save_path, format='PNG')
+        # Keep the full resolution crop so the dataset can be re-rendered at another input size
+        dataset_manifest.add_image(source_image_path, dataset_image_path, task_index)
 
     # Method for deleting a dataset image
     def delete_image(self, image_path):
@@ -212,12 +187,8 @@ class CreateDataset:
         except Exception as e:
             print(f"An error occurred: {e}")
 
-    # Method for adding a task to an output
-    def link_output_button(self):
-
-        # Sanity check in case no source entries were found
-        if self.source_entries is None:
-            return
+    # Method which returns the selected task index and name along with the matching source entry index
+    def current_source_entry(self):
 
         # Try to get the currently selected task
         task_index = self.task_listbox.curselection()
@@ -229,52 +200,143 @@ class CreateDataset:
             task_name = self.task_listbox.get(task_index)
             source_entry_index = self.get_source_entry_index(task_name)
 
-        # Sanity check in case all images have been added to dataset
-        if len(self.source_entries[source_entry_index][1]) == 0:
-            return
+        return task_index, task_name, source_entry_index
 
-        # Output index
+    # Method which returns the name of the selected output, or None when no output is selected
+    def selected_link_output(self):
         link_output_index = self.link_output_listbox.curselection()
 
         if not link_output_index:
             self.log_message("No dataset output selected!")
+            return None
+
+        return self.link_output_listbox.get(link_output_index)
+
+    # Method which returns whether the input size of the dataset model has been read, images are only linked at the
+    # input size of the model
+    def input_size_read(self):
+
+        if self.dataset_input_size is None:
+            self.log_message("The input size of the dataset model has not been read, images cannot be added yet!")
+            return False
+
+        return True
+
+    # Method for adding a task to an output
+    def link_output_button(self):
+
+        # Sanity check in case no source entries were found or the model input size is not known yet
+        if self.source_entries is None or not self.input_size_read():
             return
 
-        link_output_name = self.link_output_listbox.get(link_output_index)
+        task_index, task_name, source_entry_index = self.current_source_entry()
 
-        # Update the image name if task is selected
-        source_image_name = os.path.basename(self.source_entries[source_entry_index][1][0])
+        # Sanity check in case all images have been added to dataset
+        if len(self.source_entries[source_entry_index][1]) == 0:
+            return
 
-        if task_index:
-            source_image_name = (
-                    os.path.splitext(source_image_name)[0] + "_" + task_name + ".png")
+        link_output_name = self.selected_link_output()
 
-        dataset_image_path = os.path.join(self.dataset_folder, link_output_name, source_image_name)
+        if link_output_name:
+            self.link_source_images(task_index, task_name, source_entry_index, link_output_name,
+                                    [self.source_entries[source_entry_index][1][0]])
 
-        # Save the image to the destination dataset folder as bitmap
-        self.save_image(self.source_entries[source_entry_index][1][0], dataset_image_path)
+    # Method for adding the images selected in the gallery to an output
+    def link_selection_button(self):
 
-        # Augment the image with the task index if available so it can be recognized
-        if task_index:
-            self.augment_image_task(dataset_image_path, task_index[0])
+        # Sanity check in case no source entries were found or the model input size is not known yet
+        if self.source_entries is None or not self.input_size_read():
+            return
 
-        self.log_message("Added image: {} into dataset output: '{}'".format(source_image_name, link_output_name))
+        source_image_paths = self.source_gallery.selected_paths()
 
-        source_task_name = self.source_entries[source_entry_index][0]
-        source_image_path = self.source_entries[source_entry_index][1][0]
+        if not source_image_paths:
+            self.log_message("No source images selected in the gallery!")
+            return
+
+        task_index, task_name, source_entry_index = self.current_source_entry()
+        link_output_name = self.selected_link_output()
+
+        if link_output_name:
+            self.link_source_images(task_index, task_name, source_entry_index, link_output_name, source_image_paths)
+
+    # Method which links source images to an output, writing them into the dataset as one background batch
+    def link_source_images(self, task_index, task_name, source_entry_index, link_output_name, source_image_paths):
+
+        # The dataset is read when the images are queued, another dataset may be loaded before they are written
+        dataset_folder = self.dataset_folder
+        dataset_manifest = self.dataset_manifest
+        links = []
+        image_extension = DATASET_FORMATS[self.configuration.dataset_format]
+
+        for source_image_path in source_image_paths:
+
+            # Update the image name if task is selected
+            source_image_name = os.path.splitext(os.path.basename(source_image_path))[0]
+
+            if task_index:
+                source_image_name += "_" + task_name
+
+            links.append((source_image_path, os.path.join(dataset_folder, link_output_name,
+                                                          source_image_name + image_extension)))
+
+        input_size = self.dataset_input_size
+        task_value = task_index[0] if task_index else None
+
+        if len(links) == 1:
+            added_message = "Added image: {} into dataset output: '{}'".format(
+                os.path.basename(links[0][1]), link_output_name)
+        else:
+            added_message = "Added {} images into dataset output: '{}'".format(len(links), link_output_name)
+
+        written_links = []
+
+        # Method which writes a single image, an image which cannot be written is left out of the dataset
+        def write_link(link):
+            try:
+                self.write_dataset_image(dataset_manifest, link[0], link[1], input_size, task_value)
+            except Exception as e:
+                self.log_message("Could not add image {}: {}".format(link[0], e))
+                return
+
+            written_links.append(link)
+
+        # Method which writes the images and updates the manifest on the task runner
+        def write_links(task):
+            try:
+                task.map(write_link, links)
+            finally:
+                dataset_manifest.save()
 
-        # Add into the list of completed actions
-        self.dataset_link_actions.insert(0,
-                                         (
-                                             source_entry_index,
-                                             source_task_name,
-                                             source_image_path,
-                                             dataset_image_path
-                                         )
-                                         )
+        source_images = self.source_entries[source_entry_index][1]
 
-        # Remove the image from the current task source entry
-        self.source_entries[source_entry_index][1].pop(0)
+        # Write the images in the background so the next image can be labeled straight away, the images which were
+        # not written are returned to the source entry once the job has finished, failed or been cancelled
+        self.task_runner.run(
+            "Adding images",
+            write_links,
+            lambda result: self.restore_unwritten_links(source_images, links, written_links, added_message),
+            lambda error: self.restore_unwritten_links(source_images, links, written_links, added_message),
+            task_view=self.dataset_task_view)
+
+        source_task_name = self.source_entries[source_entry_index][0]
+
+        # Add into the list of completed actions, each image can be undone on its own
+        for source_image_path, dataset_image_path in links:
+            self.dataset_link_actions.insert(0,
+                                             (
+                                                 source_entry_index,
+                                                 source_task_name,
+                                                 source_image_path,
+                                                 dataset_image_path
+                                             )
+                                             )
+
+        # Remove the images from the current task source entry
+        linked_paths = set(source_image_paths)
+        self.source_entries[source_entry_index][1][:] = [
+            source_image_path for source_image_path in self.source_entries[source_entry_index][1]
+            if source_image_path not in linked_paths]
 
         # Sanity check in case all images have been added to dataset
         if len(self.source_entries[source_entry_index][1]) == 0:
@@ -283,12 +345,116 @@ class CreateDataset:
             return
 
         # Update for drawing the correct image
-        source_task_name = self.source_entries[source_entry_index][0]
         source_image_path = self.source_entries[source_entry_index][1][0]
 
         # Display the next image
         self.plot_source(source_task_name, source_image_path)
 
+    # Method which returns the images of a link batch which were not written into the dataset to their source entry
+    # and removes their link actions so they cannot be undone
+    def restore_unwritten_links(self, source_images, links, written_links, added_message):
+        written_paths = {dataset_image_path for _, dataset_image_path in written_links}
+        unwritten_links = [link for link in links if link[1] not in written_paths]
+
+        if not unwritten_links:
+            self.log_message(added_message)
+            return
+
+        self.log_message("Added {} of {} images, the remaining images are back in the source images".format(
+            len(written_links), len(links)))
+
+        unwritten_paths = {dataset_image_path for _, dataset_image_path in unwritten_links}
+        self.dataset_link_actions = [link_action for link_action in self.dataset_link_actions
+                                     if link_action[3] not in unwritten_paths]
+
+        # Images already returned by an undo are not added twice
+        source_images[:0] = [source_image_path for source_image_path, _ in unwritten_links
+                             if source_image_path not in source_images]
+
+        if self.source_entries and any(source_entry[1] is source_images for source_entry in self.source_entries):
+            self.select_listbox_task(None)
+
+    # Method for pre-labeling the remaining images of the current task with the dataset model
+    def prelabel_button(self):
+
+        # Sanity check in case no source entries were found
+        if self.source_entries is None or not self.dataset_model_path:
+            return
+
+        task_index, task_name, source_entry_index = self.current_source_entry()
+        source_task_name = self.source_entries[source_entry_index][0]
+        image_paths = list(self.source_entries[source_entry_index][1])
+        output_names = self.link_output_listbox.get(0, END)
+        model_path = self.dataset_model_path
+
+        # The images are augmented with the task the same way as they would be when linked
+        self.task_runner.run(
+            "Pre-labeling images",
+            lambda task: self.tensorflow_model.predict_images(
+                task, model_path, image_paths, task_index[0] if task_index else None),
+            lambda predictions: self.load_predictions(
+                source_entry_index, source_task_name, image_paths, output_names, predictions),
+            task_view=self.dataset_task_view,
+            serial=False)
+
+    # Method which stores the predictions and sorts the task images by predicted output and confidence
+    def load_predictions(self, source_entry_index, source_task_name, image_paths, output_names, predictions):
+
+        for image_path, (output_index, confidence) in zip(image_paths, predictions):
+            self.source_predictions[(source_task_name, image_path)] = (output_names[output_index], confidence)
+
+        # Images linked while the predictions were running are no longer in the source entry
+        source_images = self.source_entries[source_entry_index][1]
+        remaining_paths = set(source_images)
+        sorted_paths = [image_path for (output_index, confidence), image_path in
+                        sorted(zip(predictions, image_paths), key=lambda item: (item[0][0], -item[0][1]))
+                        if image_path in remaining_paths]
+        predicted_paths = set(sorted_paths)
+        source_images[:] = sorted_paths + [image_path for image_path in source_images
+                                           if image_path not in predicted_paths]
+
+        # Summarize how many images each output would accept with the current threshold
+        threshold = self.prelabel_threshold_var.get()
+        self.log_message("Pre-labeled {} images, accepted above {:.2f}:".format(len(predictions), threshold))
+
+        for output_index, output_name in enumerate(output_names):
+            confidences = [confidence for index, confidence in predictions if index == output_index]
+            self.log_message("{}: {} predicted, {} accepted".format(
+                output_name, len(confidences), sum(confidence >= threshold for confidence in confidences)))
+
+        if source_images:
+            self.plot_source(source_task_name, source_images[0])
+
+    # Method which links every pre-labeled image above the threshold to its predicted output
+    def accept_prelabels_button(self):
+
+        # Sanity check in case no source entries were found or the model input size is not known yet
+        if self.source_entries is None or not self.input_size_read():
+            return
+
+        task_index, task_name, source_entry_index = self.current_source_entry()
+        source_task_name = self.source_entries[source_entry_index][0]
+        threshold = self.prelabel_threshold_var.get()
+        accepted_paths = {}
+
+        for image_path in self.source_entries[source_entry_index][1]:
+            output_name, confidence = self.source_predictions.get((source_task_name, image_path), (None, 0.0))
+
+            if output_name and confidence >= threshold:
+                accepted_paths.setdefault(output_name, []).append(image_path)
+
+        if not accepted_paths:
+            self.log_message("No pre-labeled images above the threshold {:.2f}!".format(threshold))
+            return
+
+        accepted_count = sum(len(image_paths) for image_paths in accepted_paths.values())
+
+        for output_name, image_paths in accepted_paths.items():
+            self.link_source_images(task_index, task_name, source_entry_index, output_name, image_paths)
+
+        self.log_message("Accepted {} pre-labeled images, {} left for review".format(
+            accepted_count, len(self.source_entries[source_entry_index][1])))
+
     # Method for undoing a linking which was just done
     def undo_linking_button(self):
 
@@ -296,8 +462,17 @@ class CreateDataset:
         if len(self.dataset_link_actions) == 0:
             return
 
-        # Delete existing image from dataset
-        self.delete_image(self.dataset_link_actions[0][3])
+        # Delete existing image from dataset after any queued writes have finished
+        dataset_image_path = self.dataset_link_actions[0][3]
+        dataset_manifest = self.dataset_manifest
+
+        # Method which deletes the image and its manifest entry on the task runner
+        def remove_image(task):
+            self.delete_image(dataset_image_path)
+            dataset_manifest.remove_image(dataset_image_path)
+            dataset_manifest.save()
+
+        self.task_runner.run("Removing image", remove_image, task_view=self.dataset_task_view)
 
         # Get the source entry index
         source_entry_index = self.dataset_link_actions[0][0]
@@ -324,50 +499,6 @@ class CreateDataset:
 
         return source_entry_index
 
-    # Method which adds the task value to the pixels of an image
-    def augment_image_task(self, image_path, task_index):
-
-        # Open the image
-        with Image.open(image_path) as image:
-
-            if image.mode != 'RGB':
-                self.log_message("Image must be an RGB bitmap to augment!")
-                return
-
-            # Get the image dimensions
-            width, height = image.size
-            prev_red, prev_green, prev_blue = 0, 0, 0
-            augmented_red, augmented_green, augmented_blue = 0, 0, 0
-
-            # Iterate through each pixel and modify its values
-            pixels = image.load()
-            for x in range(width):
-                for y in range(height):
-                    pixel_red, pixel_green, pixel_blue = pixels[x, y]
-
-                    # If matching, update the pixel value using the previous values
-                    if pixel_red == prev_red and pixel_green == prev_green and pixel_blue == prev_blue:
-                        pixels[x, y] = (augmented_red, augmented_green, augmented_blue)
-
-                    else:
-                        # Add or subtract the value from each color channel
-                        augmented_red = self.augment_pixel(pixel_red + task_index)
-                        augmented_green = self.augment_pixel(pixel_green + task_index)
-                        augmented_blue = self.augment_pixel(pixel_blue + task_index)
-
-                        # Update the pixel value
-                        pixels[x, y] = (augmented_red, augmented_green, augmented_blue)
-
-                    prev_red = pixel_red
-                    prev_green = pixel_green
-                    prev_blue = pixel_blue
-
-            self.log_message("Image was augmented with task: {}".format(self.task_listbox.get(task_index)))
-
-            # Save the modified image
-            image.save(image_path)
-            return
-
     # Method for handling the create dataset button
     def create_dataset_button(self):
         self.create_load_dataset(new_dataset=True)
@@ -398,8 +529,21 @@ class CreateDataset:
             self.log_message("Could not read the {}_output_labels.txt as actions!".format(model_name))
             return
 
-        # Store the input size of the model
-        self.dataset_input_size = self.tensorflow_model.get_model_input(model_path)
+        # Keep the model for pre-labeling the source images
+        self.dataset_model_path = model_path
+        self.source_predictions.clear()
+
+        # Read the input size of the model in the background while the remaining dialogs are answered, the input size
+        # of the previous model is never used for the new model
+        self.dataset_input_size = None
+        self.task_runner.run(
+            "Reading model input size",
+            lambda task: self.tensorflow_model.get_model_input(model_path),
+            lambda input_size: self.set_dataset_input_size(model_path, input_size),
+            lambda error: self.log_message("Could not read the input size of {}, images cannot be added!".format(
+                model_name)),
+            task_view=self.dataset_task_view,
+            serial=False)
 
         # Ask where to find the source images
         self.log_message("Please select the source images directory")
@@ -458,6 +602,9 @@ class CreateDataset:
             # Create the folder structure
             self.create_dataset_folders(self.dataset_folder, dataset_name, output_labels)
 
+        # Read the canonical crops of the linked images
+        self.dataset_manifest = DatasetManifest(self.dataset_folder)
+
         # Add dataset tasks
         self.create_source_entries()
 
@@ -465,55 +612,136 @@ class CreateDataset:
         self.dataset_link_actions.clear()
 
         # Set the tasks listbox selection to the first entry if there are entries
+        # The first image is displayed once the source entries have been scanned
         if len(self.task_listbox.get(0, END)) > 0:
             self.task_listbox.select_set(0)
 
-        # Display the first image to begin the dataset creation
-        if self.source_entries:
-            self.plot_source(self.source_entries[0][0], self.source_entries[0][1][0])
+    # Method which stores the input size of the model read by the task runner, unless another model has been
+    # selected since
+    def set_dataset_input_size(self, model_path, input_size):
+        if model_path == self.dataset_model_path:
+            self.dataset_input_size = input_size
+
+    # Method for re-rendering a dataset from its canonical crops at the input size of another model
+    def render_dataset_button(self):
+
+        self.log_message("Please select a model for the new input size")
+        model_path, load_model = filepath_dialog(
+            self.app,
+            DialogType.OPENFILE,
+            "Please select a model for the new input size:",
+            [('Keras models', '.keras')])
+
+        if not load_model:
+            return
+
+        self.log_message("Please select the dataset to re-render")
+        dataset_folder, load_dataset = (
+            filepath_dialog(self.app, DialogType.SELECTDIR, "Please select the dataset to re-render:"))
+
+        if not load_dataset:
+            return
+
+        self.log_message("Please select where to write the re-rendered dataset")
+        target_folder, select_target = (
+            filepath_dialog(self.app, DialogType.SELECTDIR, "Please select where to write the re-rendered dataset:"))
+
+        if not select_target:
+            return
+
+        workers = self.configuration.render_processes
+        png_compress_level = self.configuration.png_compress_level
+
+        # Method which reads the model input and renders every image on the task runner
+        def render_images(task):
+            input_size = self.tensorflow_model.get_model_input(model_path)
+            return render_dataset(dataset_folder, target_folder, input_size, input_size[2], workers,
+                                  self.log_message, task, png_compress_level)
+
+        # The dataset is rendered into another folder from the saved manifest, so it does not wait for the queued writes
+        self.task_runner.run("Rendering dataset", render_images, task_view=self.dataset_task_view, serial=False)
 
     # Method which creates source entries
     def create_source_entries(self):
 
-        # List the source images
-        source_images = self.find_image_filepaths(self.source_images_path)
+        # Sanity check in case no source images have been selected yet
+        if not self.source_images_path:
+            return
+
+        source_images_path = self.source_images_path
+        dataset_folder = self.dataset_folder
 
         # List the tasks from the tasks listbox
         task_names = self.task_listbox.get(0, END)
 
-        # If there are no tasks listed then adding a default empty one, otherwise creating the full set for each task
-        if len(task_names) == 0:
-            self.source_entries = [("",
-                                    self.filter_source_images(source_images, ""))]
-        else:
-            self.source_entries = [(task,
-                                    self.filter_source_images(source_images, task)) for
-                                   task in task_names]
-
-            # Writing the tasks into a file
+        # Writing the tasks into a file
+        if len(task_names) > 0:
             self.create_tasks_file()
 
+        # Method which scans the source images and the dataset on the task runner
+        def scan_source_images(task):
+
+            # List the source images and the images already in the dataset
+            source_images = self.find_image_filepaths(source_images_path)
+            task.check_cancelled()
+            dataset_images = self.find_dataset_images(dataset_folder)
+            task.check_cancelled()
+
+            # If there are no tasks listed then adding a default empty one, otherwise creating the full set for
+            # each task
+            if len(task_names) == 0:
+                return [("", self.filter_source_images(source_images, "", dataset_images))]
+
+            return [(task_name, self.filter_source_images(source_images, task_name, dataset_images))
+                    for task_name in task_names]
+
+        self.task_runner.run("Scanning source images", scan_source_images, self.load_source_entries,
+                             task_view=self.dataset_task_view)
+
+    # Method which stores the scanned source entries and displays the first image
+    def load_source_entries(self, source_entries):
+
         # If no new images were found then setting back to None
-        if len(self.source_entries[0][1]) == 0:
+        if len(source_entries[0][1]) == 0:
             self.log_message("Could not find any new images from: {}".format(self.source_images_path))
             self.source_entries = None
+            self.clear_source()
             return
 
+        self.source_entries = source_entries
         self.log_message("Source images loaded from: {}".format(self.source_images_path))
 
-        return
+        # Display the image of the selected task
+        self.select_listbox_task(None)
 
     # Method which removes task source entries
     def remove_source_entries(self, task_index):
 
         task_name = self.task_listbox.get(task_index)
+        dataset_folder = self.dataset_folder
+        dataset_manifest = self.dataset_manifest
+
+        # Method which deletes the task images on the task runner
+        def remove_task_images(task):
+            image_paths = [os.path.join(root, filename)
+                           for root, dirs, files in walk_visible(dataset_folder)
+                           for filename in files if task_name in filename]
+            task.check_cancelled()
+            task.map(os.remove, image_paths)
+
+            for image_path in image_paths:
+                dataset_manifest.remove_image(image_path)
+            dataset_manifest.save()
+
+            return len(image_paths)
 
         # Ask if user wants to remove any images with the task name
         if messagebox.askyesno("Remove data?", "Do you want to remove the task images from dataset?"):
-            for root, dirs, files in os.walk(self.dataset_folder):
-                for filename in files:
-                    if task_name in filename:
-                        os.remove(os.path.join(root, filename))
+            self.task_runner.run(
+                "Removing task images",
+                remove_task_images,
+                lambda count: self.log_message("Removed {} images of task: {}".format(count, task_name)),
+                task_view=self.dataset_task_view)
 
         # Remove the source entry matching the task index
         self.source_entries.pop(task_index)
@@ -536,15 +764,22 @@ class CreateDataset:
                 with open(tasks_path, 'w') as file:
                     for task_name in task_names: file.write(task_name + "\n")
 
-    # Linear Congruential Generator which generates a pseudo random value for a pixel
-    def augment_pixel(self, seed):
-        a = 1664525
-        c = 1013904223
-        m = 2 ** 32
-        return ((a * seed + c) % m) % 256
-
-    # Method which plots the source image
+    # Method which plots the source image, or shows the remaining task images when the gallery is visible
     def plot_source(self, task_name, image_path):
+
+        if self.gallery_visible:
+            image_paths = self.source_entries[self.get_source_entry_index(task_name)][1]
+            captions = {}
+
+            # Caption the pre-labeled images with their predicted output and confidence
+            for image_path in image_paths:
+                if (task_name, image_path) in self.source_predictions:
+                    output_name, confidence = self.source_predictions[(task_name, image_path)]
+                    captions[image_path] = "{} {:.0%}".format(output_name, confidence)
+
+            self.source_gallery.set_images(image_paths, captions)
+            return
+
         self.source_plot_figure.clear()
         self.source_plot = self.source_plot_figure.add_subplot(1, 1, 1)
         self.source_plot.imshow(mpimg.imread(image_path))
@@ -554,9 +789,24 @@ class CreateDataset:
 
     # Method which plots the source image
     def clear_source(self):
+        self.source_gallery.set_images([])
         self.source_plot_figure.clear()
         self.source_plot_canvas.draw()
 
+    # Method for switching between the single image view and the thumbnail gallery
+    def toggle_gallery_button(self):
+        self.gallery_visible = not self.gallery_visible
+
+        if self.gallery_visible:
+            self.source_plot_canvas.get_tk_widget().pack_forget()
+            self.source_gallery.pack(side="right", anchor="se", fill="both", expand=False)
+        else:
+            self.source_gallery.pack_forget()
+            self.source_plot_canvas.get_tk_widget().pack(side="right", anchor="se", fill="both", expand=False)
+
+        # Show the current task images in the selected view
+        self.select_listbox_task(None)
+
     # Method which creates the UI for the Create Dataset tab
     def create_dataset_ui(self, create_dataset_tab):
 
@@ -600,6 +850,20 @@ class CreateDataset:
             width=self.configuration.app_button_size
         )
 
+        link_selection_button = ttk.Button(
+            create_dataset_tab,
+            text="Link selection",
+            command=self.link_selection_button,
+            width=self.configuration.app_button_size
+        )
+
+        toggle_gallery_button = ttk.Button(
+            create_dataset_tab,
+            text="Gallery view",
+            command=self.toggle_gallery_button,
+            width=self.configuration.app_button_size
+        )
+
         undo_linking_button = ttk.Button(
             create_dataset_tab,
             text="Undo linking",
@@ -607,6 +871,27 @@ class CreateDataset:
             width=self.configuration.app_button_size
         )
 
+        prelabel_button = ttk.Button(
+            create_dataset_tab,
+            text="Pre-label images",
+            command=self.prelabel_button,
+            width=self.configuration.app_button_size
+        )
+
+        accept_prelabels_button = ttk.Button(
+            create_dataset_tab,
+            text="Accept pre-labels",
+            command=self.accept_prelabels_button,
+            width=self.configuration.app_button_size
+        )
+
+        render_dataset_button = ttk.Button(
+            create_dataset_tab,
+            text="Re-render dataset",
+            command=self.render_dataset_button,
+            width=self.configuration.app_button_size
+        )
+
         create_dataset_button = ttk.Button(
             create_dataset_tab,
             text="Create dataset",
@@ -621,17 +906,26 @@ class CreateDataset:
             width=self.configuration.app_button_size
         )
 
-        # List boxes
-        self.dataset_log_listbox = Listbox(
+        # Spinboxes
+        prelabel_threshold_label = ttk.Label(
             create_dataset_tab,
-            bg=self.configuration.app_dark_background_color,
-            fg=self.configuration.app_text_foreground_color,
-            selectbackground=self.configuration.app_select_background_color,
-            selectforeground=self.configuration.app_select_foreground_color,
-            takefocus=0
+            text="Pre-label threshold:"
+        )
+
+        self.prelabel_threshold_var = DoubleVar(value=self.configuration.prelabel_threshold)
+        prelabel_threshold_spinbox = ttk.Spinbox(
+            create_dataset_tab,
+            from_=0.5,
+            to=1.0,
+            increment=0.01,
+            textvariable=self.prelabel_threshold_var,
+            width=self.configuration.app_spinbox_size,
+            state="readonly"
         )
 
-        self.dataset_log_listbox.bind("<<ListboxSelect>>", self.disable_log_selection)
+        # List boxes
+        self.dataset_log_view = LogView(create_dataset_tab, self.configuration)
+        self.dataset_task_view = TaskView(create_dataset_tab, self.configuration)
 
         self.task_listbox = Listbox(
             create_dataset_tab,
@@ -659,12 +953,19 @@ class CreateDataset:
         dpi = self.app.winfo_fpixels('1i')
 
         # Create Dataset tab UI layouts
-        self.dataset_log_listbox.pack(side="top",
-                                      anchor="se",
-                                      fill="both",
-                                      padx=self.configuration.app_padding,
-                                      pady=self.configuration.app_padding,
-                                      expand=False)
+        self.dataset_log_view.pack(side="top",
+                                   anchor="se",
+                                   fill="both",
+                                   padx=self.configuration.app_padding,
+                                   pady=self.configuration.app_padding,
+                                   expand=False)
+
+        self.dataset_task_view.pack(side="top",
+                                    anchor="se",
+                                    fill="x",
+                                    padx=self.configuration.app_padding,
+                                    pady=self.configuration.app_padding,
+                                    expand=False)
 
         self.source_plot_figure = Figure(figsize=(
             int(self.configuration.window_width * self.configuration.app_plot_width / dpi),
@@ -679,6 +980,16 @@ class CreateDataset:
                                                      anchor="se",
                                                      fill="both",
                                                      expand=False)
+
+        # The gallery takes the place of the single image view when toggled
+        self.source_gallery = ThumbnailGallery(
+            create_dataset_tab,
+            self.configuration,
+            self.thumbnail_cache,
+            self.task_runner,
+            self.dataset_task_view,
+            int(self.configuration.window_width * self.configuration.app_plot_width),
+            int(self.configuration.window_height * self.configuration.app_plot_height))
         tasks_label.pack(side="top",
                          anchor="nw",
                          padx=self.configuration.app_padding,
@@ -734,6 +1045,20 @@ class CreateDataset:
                                 pady=self.configuration.app_padding,
                                 expand=False)
 
+        link_selection_button.pack(side="top",
+                                   fill='x',
+                                   anchor="center",
+                                   padx=self.configuration.app_padding,
+                                   pady=self.configuration.app_padding,
+                                   expand=False)
+
+        toggle_gallery_button.pack(side="top",
+                                   fill='x',
+                                   anchor="center",
+                                   padx=self.configuration.app_padding,
+                                   pady=self.configuration.app_padding,
+                                   expand=False)
+
         undo_linking_button.pack(side="top",
                                  fill='x',
                                  anchor="center",
@@ -741,6 +1066,13 @@ class CreateDataset:
                                  pady=self.configuration.app_padding,
                                  expand=False)
 
+        render_dataset_button.pack(side="bottom",
+                                   fill='x',
+                                   anchor="center",
+                                   padx=self.configuration.app_padding,
+                                   pady=self.configuration.app_padding,
+                                   expand=False)
+
         load_dataset_button.pack(side="bottom",
                                  fill='x',
                                  anchor="center",
@@ -754,3 +1086,30 @@ class CreateDataset:
                                    padx=self.configuration.app_padding,
                                    pady=self.configuration.app_padding,
                                    expand=False)
+
+        accept_prelabels_button.pack(side="bottom",
+                                     fill='x',
+                                     anchor="center",
+                                     padx=self.configuration.app_padding,
+                                     pady=self.configuration.app_padding,
+                                     expand=False)
+
+        prelabel_button.pack(side="bottom",
+                             fill='x',
+                             anchor="center",
+                             padx=self.configuration.app_padding,
+                             pady=self.configuration.app_padding,
+                             expand=False)
+
+        prelabel_threshold_spinbox.pack(side="bottom",
+                                        fill='x',
+                                        anchor="center",
+                                        padx=self.configuration.app_padding,
+                                        pady=self.configuration.app_padding,
+                                        expand=False)
+
+        prelabel_threshold_label.pack(side="bottom",
+                                      anchor="nw",
+                                      padx=self.configuration.app_padding,
+                                      pady=self.configuration.app_padding,
+                                      expand=False)
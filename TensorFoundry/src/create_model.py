@@ -1,36 +1,31 @@
 import os
 import sys
-from tkinter import END, ttk, Listbox, IntVar
+from tkinter import END, ttk, Listbox, IntVar, DoubleVar, StringVar
 
 from PIL import ImageTk, Image
 
 from application_utils import DialogType, filepath_dialog, validate_spinbox
 from input_dialog import InputDialog
+from log_pipeline import LogView
+from model_architectures import Architecture, read_architecture
+from task_runner import TaskView
 
 
 class CreateModel:
-    def __init__(self, app, configuration, log_message, tensorflow_model):
+    def __init__(self, app, configuration, log_message, tensorflow_model, task_runner):
         self.app = app
         self.configuration = configuration
         self.log_message = log_message
 
         self.tensorflow_model = tensorflow_model
-        self.model_log_listbox = None
+        self.task_runner = task_runner
+        self.model_log_view = None
+        self.model_task_view = None
         self.output_listbox = None
         self.input_var = None
         self.output_var = None
-
-    # Method which logs into the model log listbox
-    def print_model_log(self, messages):
-        for msg in messages:
-            self.model_log_listbox.insert(END, msg)
-            self.model_log_listbox.yview(END)
-
-        if self.model_log_listbox.index("end") > self.configuration.log_limit:
-            self.model_log_listbox.delete(0)
-
-    def disable_log_selection(self, event):
-        self.model_log_listbox.selection_clear(0, END)
+        self.architecture_var = None
+        self.width_multiplier_var = None
 
     # Method for adding default model outputs at startup
     def add_default_outputs(self):
@@ -88,6 +83,10 @@ class CreateModel:
         self.output_var = output_size
         return True
 
+    # Method which returns the currently selected model architecture
+    def architecture(self):
+        return read_architecture(self.architecture_var.get())
+
     # Method for handling the create model button
     def create_model_button(self):
 
@@ -103,7 +102,62 @@ class CreateModel:
 
         if save_model:
             output_names = self.output_listbox.get(0, END)
-            self.tensorflow_model.create_model(self.input_var.get(), self.output_var, model_path, output_names)
+            self.tensorflow_model.create_model(self.input_var.get(), self.output_var, model_path, output_names,
+                                               self.architecture(), self.width_multiplier_var.get())
+
+    # Method for handling the create multi-head model button
+    def create_multihead_model_button(self):
+
+        if not self.output_size():
+            return
+
+        # The current outputs are used for the task head and the assert head outputs are imported
+        self.log_message("Please select the assert output labels file")
+        assert_path, load_asserts = filepath_dialog(self.app,
+                                                    DialogType.OPENFILE,
+                                                    "Please select the assert output labels file:",
+                                                    [('Outputs file', '.txt')])
+
+        if not load_asserts:
+            return
+
+        with open(assert_path, "r") as file:
+            assert_names = [label.strip() for label in file.readlines() if label.strip()]
+
+        if len(assert_names) < 2:
+            self.log_message("Assert head must have at least two outputs defined!")
+            return
+
+        self.log_message("Please save the model")
+        model_path, save_model = filepath_dialog(
+            self.app,
+            DialogType.SAVEFILE,
+            "Please save the model:",
+            [('Keras models', '.keras')])
+
+        if save_model:
+            task_names = self.output_listbox.get(0, END)
+            self.tensorflow_model.create_multihead_model(self.input_var.get(), task_names, assert_names, model_path,
+                                                         self.architecture(), self.width_multiplier_var.get())
+
+    # Method for handling the cost sweep button
+    def cost_sweep_button(self):
+
+        if not self.output_size():
+            return
+
+        # Sweep the configured candidate sizes together with the currently chosen size
+        input_sizes = sorted(set(self.configuration.cost_sweep_sizes) | {self.input_var.get()})
+        width_multipliers = [self.width_multiplier_var.get()]
+        output_size = self.output_var
+
+        # Every configuration is built and trained for a few steps, so the sweep runs in the background
+        self.task_runner.run(
+            "Sweeping model costs",
+            lambda task: self.tensorflow_model.sweep_model_costs(
+                input_sizes, list(Architecture), width_multipliers, output_size, task),
+            task_view=self.model_task_view,
+            serial=False)
 
     # Method for handling the tflite convert button
     def convert_model_tflite_button(self):
@@ -122,6 +176,23 @@ class CreateModel:
             self.tensorflow_model.convert_model_tflite(
                 model_path)
 
+    # Method for handling the tflite convert with preprocessing button
+    def convert_model_tflite_preprocessing_button(self):
+
+        if not self.output_size():
+            return
+
+        self.log_message("Please select a model")
+        model_path, load_model = filepath_dialog(
+            self.app,
+            DialogType.OPENFILE,
+            "Please select a model:",
+            [('Keras models', '.keras')])
+
+        if load_model:
+            self.tensorflow_model.convert_model_tflite(
+                model_path, embed_preprocessing=True)
+
         # Method for handling the coreml convert button
 
     def convert_model_coreml_button(self):
@@ -187,6 +258,11 @@ class CreateModel:
             text="Model input size (.png):"
         )
 
+        architecture_label = ttk.Label(
+            create_model_tab,
+            text="Model architecture / width:"
+        )
+
         output_label = ttk.Label(
             create_model_tab,
             text="Model outputs:"
@@ -221,6 +297,20 @@ class CreateModel:
             width=self.configuration.app_button_size
         )
 
+        create_multihead_model_button = ttk.Button(
+            create_model_tab,
+            text="Create multi-head model",
+            command=self.create_multihead_model_button,
+            width=self.configuration.app_button_size
+        )
+
+        cost_sweep_button = ttk.Button(
+            create_model_tab,
+            text="Cost sweep",
+            command=self.cost_sweep_button,
+            width=self.configuration.app_button_size
+        )
+
         convert_model_tflite_button = ttk.Button(
             create_model_tab,
             text="TFLite conversion",
@@ -228,6 +318,13 @@ class CreateModel:
             width=self.configuration.app_button_size
         )
 
+        convert_model_tflite_preprocessing_button = ttk.Button(
+            create_model_tab,
+            text="TFLite + preprocessing",
+            command=self.convert_model_tflite_preprocessing_button,
+            width=self.configuration.app_button_size
+        )
+
         convert_model_coreml_button = ttk.Button(
             create_model_tab,
             text="CoreML conversion",
@@ -243,16 +340,8 @@ class CreateModel:
         )
 
         # List boxes
-        self.model_log_listbox = Listbox(
-            create_model_tab,
-            bg=self.configuration.app_dark_background_color,
-            fg=self.configuration.app_text_foreground_color,
-            selectbackground=self.configuration.app_select_background_color,
-            selectforeground=self.configuration.app_select_foreground_color,
-            takefocus=0
-        )
-
-        self.model_log_listbox.bind("<<ListboxSelect>>", self.disable_log_selection)
+        self.model_log_view = LogView(create_model_tab, self.configuration)
+        self.model_task_view = TaskView(create_model_tab, self.configuration)
 
         self.output_listbox = Listbox(
             create_model_tab,
@@ -277,13 +366,41 @@ class CreateModel:
 
         input_spinbox.config(validate="key", validatecommand=(create_model_tab.register(validate_spinbox), "%P"))
 
+        self.width_multiplier_var = DoubleVar(value=self.configuration.width_multiplier)
+        width_multiplier_spinbox = ttk.Spinbox(
+            create_model_tab,
+            from_=0.25,
+            to=4.0,
+            increment=0.25,
+            textvariable=self.width_multiplier_var,
+            width=self.configuration.app_spinbox_size,
+            state="readonly"
+        )
+
+        # Combo boxes
+        self.architecture_var = StringVar(value=read_architecture(self.configuration.model_architecture).value)
+        architecture_combobox = ttk.Combobox(
+            create_model_tab,
+            textvariable=self.architecture_var,
+            values=[architecture.value for architecture in Architecture],
+            width=self.configuration.app_spinbox_size,
+            state="readonly"
+        )
+
         # Create Model tab UI layout
-        self.model_log_listbox.pack(side="right",
-                                    anchor="se",
-                                    fill="both",
-                                    padx=self.configuration.app_padding,
-                                    pady=self.configuration.app_padding,
-                                    expand=True)
+        self.model_task_view.pack(side="bottom",
+                                  anchor="se",
+                                  fill="x",
+                                  padx=self.configuration.app_padding,
+                                  pady=self.configuration.app_padding,
+                                  expand=False)
+
+        self.model_log_view.pack(side="right",
+                                 anchor="se",
+                                 fill="both",
+                                 padx=self.configuration.app_padding,
+                                 pady=self.configuration.app_padding,
+                                 expand=True)
 
         model_image_label.pack(side="top",
                                anchor="center",
@@ -304,6 +421,26 @@ class CreateModel:
                            pady=self.configuration.app_padding,
                            expand=False)
 
+        architecture_label.pack(side="top",
+                                anchor="nw",
+                                padx=self.configuration.app_padding,
+                                pady=self.configuration.app_padding,
+                                expand=False)
+
+        architecture_combobox.pack(side="top",
+                                   fill='x',
+                                   anchor="center",
+                                   padx=self.configuration.app_padding,
+                                   pady=self.configuration.app_padding,
+                                   expand=False)
+
+        width_multiplier_spinbox.pack(side="top",
+                                      fill='x',
+                                      anchor="center",
+                                      padx=self.configuration.app_padding,
+                                      pady=self.configuration.app_padding,
+                                      expand=False)
+
         output_label.pack(side="top",
                           anchor="nw",
                           padx=self.configuration.app_padding,
@@ -355,6 +492,13 @@ class CreateModel:
         # TODO: This has version incompatibility!
         convert_model_coreml_button['state'] = 'disabled'
 
+        convert_model_tflite_preprocessing_button.pack(side="bottom",
+                                                       fill='x',
+                                                       anchor="center",
+                                                       padx=self.configuration.app_padding,
+                                                       pady=self.configuration.app_padding,
+                                                       expand=False)
+
         convert_model_tflite_button.pack(side="bottom",
                                          fill='x',
                                          anchor="center",
@@ -362,6 +506,20 @@ class CreateModel:
                                          pady=self.configuration.app_padding,
                                          expand=False)
 
+        cost_sweep_button.pack(side="bottom",
+                               fill='x',
+                               anchor="center",
+                               padx=self.configuration.app_padding,
+                               pady=self.configuration.app_padding,
+                               expand=False)
+
+        create_multihead_model_button.pack(side="bottom",
+                                           fill='x',
+                                           anchor="center",
+                                           padx=self.configuration.app_padding,
+                                           pady=self.configuration.app_padding,
+                                           expand=False)
+
         create_model_button.pack(side="bottom",
                                  fill='x',
                                  anchor="center",
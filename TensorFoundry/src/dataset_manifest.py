@@ -0,0 +1,168 @@
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from image_processing import PNG_COMPRESS_LEVEL, augment_image_task, crop_image, resize_image
+from image_store import ImageStore, dataset_store_path
+from prediction_cache import file_hash
+
+# Manifest which maps every dataset image to its canonical crop and task
+MANIFEST_NAME = "dataset_manifest.json"
+
+# Hidden folder of the canonical crops, skipped by every dataset walk
+CANONICAL_FOLDER = ".canonical"
+
+
+# Function which renders a dataset image from its canonical crop, run in a worker process
+def render_image(canonical_path, dataset_image_path, input_size, num_channels, task_index, store_path,
+                 png_compress_level):
+    with Image.open(canonical_path) as image:
+        image = resize_image(image, input_size)
+
+    # The task augmentation is applied to the RGB pixels the same way as on the device
+    if task_index is not None:
+        image = augment_image_task(image, task_index)
+
+    if num_channels == 1:
+        image = image.convert("L")
+
+    ImageStore(store_path).write_image(image, dataset_image_path, png_compress_level)
+
+
+class DatasetManifest:
+    # Canonical full resolution crops of the linked screenshots so a dataset can be re-rendered at any input size
+    #
+    # The manifest maps each dataset image path, relative to the dataset folder, to its canonical crop and task:
+    # {"images": {"LOGIN_SCREEN/login_PERFORM_LOGIN.png": {"canonical": "<sha256>.png", "task_index": 1}}}
+    # Canonical crops are named by the content hash of the source screenshot, so relinking a screenshot to
+    # another output or task reuses the same crop.
+
+    def __init__(self, dataset_folder):
+        self.dataset_folder = dataset_folder
+        self.manifest_path = os.path.join(dataset_folder, MANIFEST_NAME)
+        self.canonical_path = os.path.join(dataset_folder, CANONICAL_FOLDER)
+        self.image_store = ImageStore(dataset_store_path(dataset_folder))
+        self.images = {}
+        self.lock = threading.Lock()
+
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "r") as file:
+                self.images = json.load(file)["images"]
+
+    # Method which returns the manifest key of a dataset image
+    def image_key(self, dataset_image_path):
+        return os.path.relpath(dataset_image_path, self.dataset_folder).replace(os.sep, "/")
+
+    # Method which stores the canonical crop of a source screenshot and records the dataset image made from it
+    def add_image(self, source_image_path, dataset_image_path, task_index):
+        canonical_name = file_hash(source_image_path) + ".png"
+        canonical_path = os.path.join(self.canonical_path, canonical_name)
+
+        # The crop is linked from the image store, so the assert and task datasets share it
+        if not os.path.isfile(canonical_path):
+            with Image.open(source_image_path) as image:
+                image = crop_image(image).convert("RGB")
+
+            self.image_store.write_image(image, canonical_path)
+
+        with self.lock:
+            self.images[self.image_key(dataset_image_path)] = {"canonical": canonical_name, "task_index": task_index}
+
+    # Method which forgets a removed dataset image, its canonical crop is kept for other images using it
+    def remove_image(self, dataset_image_path):
+        with self.lock:
+            self.images.pop(self.image_key(dataset_image_path), None)
+
+    # Method which writes the manifest into the dataset folder
+    def save(self):
+        with self.lock:
+            manifest = json.dumps({"images": self.images}, indent=1, sort_keys=True)
+
+        temporary_path = "{}.{}.tmp".format(self.manifest_path, os.getpid())
+        with open(temporary_path, "w") as file:
+            file.write(manifest)
+        os.replace(temporary_path, self.manifest_path)
+
+
+# Function which links or copies the canonical crops into a new dataset folder
+def copy_canonical_folder(source_folder, target_folder):
+    os.makedirs(target_folder, exist_ok=True)
+
+    for file in os.listdir(source_folder):
+        target_path = os.path.join(target_folder, file)
+
+        if os.path.isfile(target_path):
+            continue
+
+        # Hard links cost no space, copies are used across file systems
+        try:
+            os.link(os.path.join(source_folder, file), target_path)
+        except OSError:
+            shutil.copy2(os.path.join(source_folder, file), target_path)
+
+
+# Function which re-renders every dataset image from its canonical crop at a new input size and channel count,
+# each image keeps the storage format of its file extension
+def render_dataset(dataset_folder, target_folder, input_size, num_channels, workers, log_message, task=None,
+                   png_compress_level=PNG_COMPRESS_LEVEL):
+    manifest = DatasetManifest(dataset_folder)
+
+    if not manifest.images:
+        log_message("Could not find any canonical crops in: {}".format(dataset_folder))
+        return 0
+
+    # The target gets the same output folders, tasks file, manifest and canonical crops as the source
+    in_place = os.path.abspath(dataset_folder) == os.path.abspath(target_folder)
+    if not in_place:
+        os.makedirs(target_folder, exist_ok=True)
+
+        for name in os.listdir(dataset_folder):
+            source_path = os.path.join(dataset_folder, name)
+
+            if os.path.isdir(source_path) and not name.startswith("."):
+                os.makedirs(os.path.join(target_folder, name), exist_ok=True)
+            elif name == "dataset_tasks.txt":
+                shutil.copy2(source_path, target_folder)
+
+        copy_canonical_folder(manifest.canonical_path, os.path.join(target_folder, CANONICAL_FOLDER))
+        target_manifest = DatasetManifest(target_folder)
+        target_manifest.images = dict(manifest.images)
+        target_manifest.save()
+
+    render_jobs = [(os.path.join(manifest.canonical_path, entry["canonical"]),
+                    os.path.join(target_folder, *key.split("/")),
+                    input_size, num_channels, entry["task_index"], dataset_store_path(target_folder),
+                    png_compress_level)
+                   for key, entry in sorted(manifest.images.items())]
+
+    # Images whose canonical crop has been deleted keep their current rendering
+    missing_count = sum(not os.path.isfile(job[0]) for job in render_jobs)
+    render_jobs = [job for job in render_jobs if os.path.isfile(job[0])]
+
+    if missing_count:
+        log_message("Skipped {} images without a canonical crop".format(missing_count))
+
+    # Spawned workers only import the imaging modules, never the GUI or TensorFlow
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(render_image, *job) for job in render_jobs]
+
+        for done_count, future in enumerate(futures, start=1):
+            future.result()
+
+            if task:
+                task.set_progress(done_count, len(futures))
+
+                if task.cancel_event.is_set():
+                    executor.shutdown(cancel_futures=True)
+                    task.check_cancelled()
+
+    log_message("Rendered {} images at size {}x{} with {} channels into: {}".format(
+        len(render_jobs), input_size[0], input_size[1], num_channels, target_folder))
+
+    return len(render_jobs)
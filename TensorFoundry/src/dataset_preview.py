@@ -1,44 +1,229 @@
-import platform
+import math
+from tkinter import StringVar, ttk
 
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+from PIL import ImageTk
+
+from application_utils import DialogType, filepath_dialog
+from task_runner import TaskView
+from thumbnail_cache import ThumbnailCache
+
+# Class filter value which shows the images of every class
+ALL_CLASSES = "All classes"
 
 
 class DatasetPreview:
-    def __init__(self, app, configuration, log_message):
+    def __init__(self, app, configuration, log_message, task_runner):
         self.app = app
         self.configuration = configuration
         self.log_message = log_message
-        self.dataset_plot_figure = None
-        self.dataset_plot_canvas = None
-        self.dataset_plot = None
-
-    # Method which plots some dataset preview images
-    def plot_dataset(self, dataset):
-        self.dataset_plot_figure.clear()
-        for images, labels in dataset.take(1):
-            for i in range(16):
-                self.dataset_plot = self.dataset_plot_figure.add_subplot(4, 4, i + 1)
-                self.dataset_plot.imshow(images[i].numpy().astype("uint8"))
-                self.dataset_plot.set_title(dataset.class_names[labels[i]],
-                                            color=self.configuration.app_text_foreground_color)
-                self.dataset_plot.axis("off")
-        self.dataset_plot_figure.tight_layout()
-        self.dataset_plot_canvas.draw()
+        self.task_runner = task_runner
+        self.thumbnail_cache = ThumbnailCache(configuration, log_message)
+        self.dataset_path = None
+        self.dataset_stale = False
+        self.dataset_images = []
+        self.page_index = 0
+        self.page_generation = 0
+        self.class_filter_var = None
+        self.class_filter_combobox = None
+        self.page_var = None
+        self.preview_label = None
+        self.preview_image = None
+        self.preview_task_view = None
+
+    # Method for the load dataset button
+    def load_dataset_button(self):
+
+        self.log_message("Please select a dataset directory")
+        dataset_path, load_dataset = (
+            filepath_dialog(self.app, DialogType.SELECTDIR, "Please select a dataset directory:"))
+
+        if load_dataset:
+            self.dataset_path = dataset_path
+            self.show_dataset()
+
+    # Method which sets the dataset to preview, it is only scanned once the preview tab is shown
+    def set_dataset(self, dataset_path):
+
+        if dataset_path == self.dataset_path:
+            return
+
+        self.dataset_path = dataset_path
+        self.dataset_stale = True
+
+        if self.preview_label.winfo_viewable():
+            self.show_dataset()
+
+    # Method which shows a stale dataset when the preview tab is shown
+    def map_preview(self, event):
+        if self.dataset_stale:
+            self.show_dataset()
+
+    # Method which scans the dataset images on the task runner
+    def show_dataset(self):
+        dataset_path = self.dataset_path
+        self.dataset_stale = False
+
+        self.task_runner.run(
+            "Scanning dataset",
+            lambda task: self.thumbnail_cache.find_dataset_images(dataset_path),
+            self.load_dataset_images,
+            task_view=self.preview_task_view,
+            serial=False)
+
+    # Method which shows the first page of the scanned dataset and builds the remaining thumbnails
+    def load_dataset_images(self, dataset_images):
+        self.dataset_images = dataset_images
+        self.page_index = 0
+
+        class_names = sorted({class_name for class_name, _ in dataset_images})
+        self.class_filter_combobox.configure(values=[ALL_CLASSES] + class_names)
+        self.class_filter_var.set(ALL_CLASSES)
+
+        self.log_message("Previewing {} images of {} classes from: {}".format(
+            len(dataset_images), len(class_names), self.dataset_path))
+
+        # The first page is queued before the rest of the thumbnails so it is shown straight away
+        self.render_page()
+
+        self.task_runner.run(
+            "Building thumbnails",
+            lambda task: self.thumbnail_cache.build_thumbnails(task, dataset_images),
+            lambda count: self.log_message("Cached {} new thumbnails".format(count)) if count else None,
+            task_view=self.preview_task_view,
+            serial=False)
+
+    # Method which returns the dataset images matching the class filter
+    def filtered_images(self):
+        class_filter = self.class_filter_var.get()
+
+        if class_filter == ALL_CLASSES:
+            return self.dataset_images
+
+        return [image for image in self.dataset_images if image[0] == class_filter]
+
+    # Method which returns the number of images on a page
+    def page_size(self):
+        return self.configuration.preview_columns * self.configuration.preview_rows
+
+    # Method which returns the number of pages of the filtered images
+    def page_count(self):
+        return max(1, math.ceil(len(self.filtered_images()) / self.page_size()))
+
+    # Method which composites the current page, directly when its thumbnails are cached and otherwise in the
+    # background. Every render is numbered, a background render finishing after a later page was requested is dropped.
+    def render_page(self):
+        self.page_generation += 1
+        page_generation = self.page_generation
+
+        images = self.filtered_images()
+        self.page_index = max(0, min(self.page_index, self.page_count() - 1))
+        page_images = images[self.page_index * self.page_size():(self.page_index + 1) * self.page_size()]
+
+        self.page_var.set("Page {} / {}  ({} images)".format(self.page_index + 1, self.page_count(), len(images)))
+
+        def render(task=None):
+            return self.thumbnail_cache.render_page(
+                page_images, self.configuration.preview_columns, self.configuration.preview_rows)
+
+        def show_current_page(page_image):
+            if page_generation == self.page_generation:
+                self.show_page(page_image)
+
+        if all(self.thumbnail_cache.is_cached(image_path) for _, image_path in page_images):
+            self.show_page(render())
+        else:
+            self.task_runner.run("Rendering preview", render, show_current_page, task_view=self.preview_task_view,
+                                 serial=False)
+
+    # Method which displays a composited page
+    def show_page(self, page_image):
+        self.preview_image = ImageTk.PhotoImage(page_image)
+        self.preview_label.configure(image=self.preview_image)
+
+    def previous_page_button(self):
+        if self.page_index > 0:
+            self.page_index -= 1
+            self.render_page()
+
+    def next_page_button(self):
+        if self.page_index < self.page_count() - 1:
+            self.page_index += 1
+            self.render_page()
+
+    def select_class_filter(self, event):
+        self.page_index = 0
+        self.render_page()
 
     # Method which creates the UI for the Dataset Preview tab
     def create_dataset_preview_ui(self, dataset_preview_tab):
 
-        # Fetch the dpi
-        dpi = self.app.winfo_fpixels('1i')
+        controls_frame = ttk.Frame(dataset_preview_tab)
+
+        # Buttons
+        load_dataset_button = ttk.Button(
+            controls_frame,
+            text="Load dataset",
+            command=self.load_dataset_button,
+            width=self.configuration.app_button_size
+        )
+
+        previous_page_button = ttk.Button(
+            controls_frame,
+            text="<",
+            command=self.previous_page_button,
+            width=self.configuration.app_button_size
+        )
+
+        next_page_button = ttk.Button(
+            controls_frame,
+            text=">",
+            command=self.next_page_button,
+            width=self.configuration.app_button_size
+        )
+
+        # Class filter
+        self.class_filter_var = StringVar(value=ALL_CLASSES)
+        self.class_filter_combobox = ttk.Combobox(
+            controls_frame,
+            textvariable=self.class_filter_var,
+            values=[ALL_CLASSES],
+            width=self.configuration.app_spinbox_size,
+            state="readonly"
+        )
+        self.class_filter_combobox.bind("<<ComboboxSelected>>", self.select_class_filter)
+
+        # Labels
+        self.page_var = StringVar(value="")
+        page_label = ttk.Label(
+            controls_frame,
+            textvariable=self.page_var
+        )
+
+        self.preview_label = ttk.Label(dataset_preview_tab, anchor="center")
+        self.preview_label.bind("<Map>", self.map_preview)
+
+        self.preview_task_view = TaskView(dataset_preview_tab, self.configuration)
 
         # Dataset Preview tab UI layout
-        self.dataset_plot_figure = Figure(figsize=(int(self.configuration.window_width / dpi),
-                                                   int(self.configuration.window_height / dpi)),
-                                          dpi=dpi if platform.system() == 'Darwin' else None,
-                                          facecolor=self.configuration.app_dark_background_color)
-        self.dataset_plot_canvas = FigureCanvasTkAgg(self.dataset_plot_figure, dataset_preview_tab)
-        self.dataset_plot_canvas.get_tk_widget().pack(fill="both",
-                                                      padx=self.configuration.app_padding,
-                                                      pady=self.configuration.app_padding,
-                                                      expand=False)
+        for widget in (load_dataset_button, self.class_filter_combobox, previous_page_button, next_page_button,
+                       page_label):
+            widget.pack(side="left",
+                        padx=self.configuration.app_padding,
+                        pady=self.configuration.app_padding,
+                        expand=False)
+
+        controls_frame.pack(side="top",
+                            fill="x",
+                            expand=False)
+
+        self.preview_task_view.pack(side="bottom",
+                                    fill="x",
+                                    padx=self.configuration.app_padding,
+                                    pady=self.configuration.app_padding,
+                                    expand=False)
+
+        self.preview_label.pack(side="top",
+                                fill="both",
+                                padx=self.configuration.app_padding,
+                                pady=self.configuration.app_padding,
+                                expand=True)
@@ -0,0 +1,226 @@
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+import numpy as np
+from PIL import Image
+
+from image_processing import DATASET_IMAGE_TYPES, walk_visible
+
+# Image types read by the dataset loaders, other files in the output folders are ignored
+SCANNED_IMAGE_TYPES = (".bmp", ".gif", ".jpeg", ".jpg") + DATASET_IMAGE_TYPES
+
+# Storage formats the Keras directory loader cannot read, datasets with them are read by the format loader
+FORMAT_LOADER_TYPES = {".webp", ".npy"}
+
+# Image modes of the raw pixel arrays by their channel count
+ARRAY_MODES = {1: "L", 3: "RGB", 4: "RGBA"}
+
+# Files read per job in a worker process, fewer unchecked files than this are read in the calling process
+CHUNK_SIZE = 256
+
+# Example paths logged per problem, the full lists are in the report
+REPORT_EXAMPLES = 5
+
+# Problems found by the scan with their severity and a hint on fixing them, errors stop the training
+PROBLEMS = {
+    "undecodable": ("error", "files cannot be decoded, delete or replace them"),
+    "wrong_size": ("warning", "images do not match the input size, re-render the dataset with the render command"),
+    "wrong_channels": ("error", "images have the wrong image mode for the model channels, re-render the dataset"),
+    "unknown_output": ("error", "folders are not outputs of the model, add them as outputs or move them out"),
+    "orphaned_task": ("warning", "images have no task suffix listed in dataset_tasks.txt, link them again"),
+    "empty_output": ("warning", "outputs of the model have no images")
+}
+
+
+# Problems which are errors when the dataset is read by the format loader, as it does not resize the images
+FORMAT_LOADER_ERRORS = {"wrong_size"}
+
+
+# Function which returns the severity of a problem for the loader reading the dataset
+def problem_severity(problem, format_loader):
+    return "error" if format_loader and problem in FORMAT_LOADER_ERRORS else PROBLEMS[problem][0]
+
+
+# Function which decodes an image fully and returns its width, height, mode and decoding error, run in a worker
+def read_image_facts(image_path):
+    try:
+        if image_path.lower().endswith(".npy"):
+            pixels = np.load(image_path, allow_pickle=False)
+
+            if pixels.dtype != np.uint8 or pixels.ndim not in (2, 3):
+                return None, None, None, "not an array of uint8 pixels: {} {}".format(pixels.dtype, pixels.shape)
+
+            channels = 1 if pixels.ndim == 2 else pixels.shape[2]
+            return pixels.shape[1], pixels.shape[0], ARRAY_MODES.get(channels), None
+
+        with Image.open(image_path) as image:
+            image.load()
+            return image.width, image.height, image.mode, None
+    except Exception as e:
+        return None, None, None, str(e) or type(e).__name__
+
+
+# Function which reads the facts of a list of images
+def read_images_facts(image_paths):
+    return [read_image_facts(image_path) for image_path in image_paths]
+
+
+class DatasetScanner:
+    # Pre-flight check of a dataset folder which decodes every image and validates its size, channels, output
+    # folder and task suffix before a training job starts
+    #
+    # The decoded facts of each file are cached in SQLite keyed by path, size and mtime, so a rescan only decodes
+    # the files which changed and the expected input size can change without invalidating the cache.
+
+    def __init__(self, configuration, log_message):
+        self.configuration = configuration
+        self.log_message = log_message
+        self.cache_path = os.path.expanduser(configuration.scan_cache_path)
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                "width INTEGER, height INTEGER, mode TEXT, error TEXT) WITHOUT ROWID")
+
+    # Method which opens a connection, one per call so the scanner can be used from any thread
+    def connect(self):
+        return sqlite3.connect(self.cache_path, timeout=30)
+
+    # Method which lists the output folders and the path, size and mtime of every image in them
+    def find_dataset_files(self, dataset_path):
+        output_files = {}
+
+        for output_name in sorted(os.listdir(dataset_path)):
+            output_path = os.path.join(dataset_path, output_name)
+
+            if output_name.startswith(".") or not os.path.isdir(output_path):
+                continue
+
+            output_files[output_name] = []
+
+            for root, dirs, files in walk_visible(output_path):
+                for file in sorted(files):
+                    if file.lower().endswith(SCANNED_IMAGE_TYPES):
+                        image_path = os.path.abspath(os.path.join(root, file))
+                        stat = os.stat(image_path)
+                        output_files[output_name].append((image_path, stat.st_size, stat.st_mtime_ns))
+
+        return output_files
+
+    # Method which reads the cached facts of the files under a dataset folder
+    def read_cached_facts(self, dataset_path):
+        prefix = os.path.abspath(dataset_path) + os.sep
+
+        # Every path starting with the prefix sorts between the prefix and the prefix with its last character bumped
+        with closing(self.connect()) as connection:
+            rows = connection.execute(
+                "SELECT path, size, mtime_ns, width, height, mode, error FROM files WHERE path >= ? AND path < ?",
+                (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))).fetchall()
+
+        return {row[0]: row[1:] for row in rows}
+
+    # Method which decodes the images missing from the cache, in worker processes when there are many
+    def read_missing_facts(self, image_paths):
+        if len(image_paths) <= CHUNK_SIZE:
+            return read_images_facts(image_paths)
+
+        chunks = [image_paths[start:start + CHUNK_SIZE] for start in range(0, len(image_paths), CHUNK_SIZE)]
+
+        # Spawned workers only import the imaging modules, never the GUI or TensorFlow
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.configuration.scan_processes, mp_context=context) as executor:
+            return [facts for chunk_facts in executor.map(read_images_facts, chunks) for facts in chunk_facts]
+
+    # Method which scans a dataset against the model outputs and input size and returns the problems found
+    def scan_dataset(self, dataset_path, class_names, input_size):
+        start_time = time.perf_counter()
+        output_files = self.find_dataset_files(dataset_path)
+        cached_facts = self.read_cached_facts(dataset_path)
+        problems = {problem: [] for problem in PROBLEMS}
+
+        # Only the new and changed files are decoded
+        dataset_files = [file for output_name in output_files for file in output_files[output_name]
+                         if output_name in class_names]
+        missing_files = [(image_path, size, mtime_ns) for image_path, size, mtime_ns in dataset_files
+                         if cached_facts.get(image_path, (None, None))[:2] != (size, mtime_ns)]
+        missing_facts = self.read_missing_facts([image_path for image_path, _, _ in missing_files])
+
+        with closing(self.connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [file + facts for file, facts in zip(missing_files, missing_facts)])
+
+            # Deleted files are forgotten so the cache does not grow with every regenerated dataset
+            dataset_paths = {image_path for files in output_files.values() for image_path, _, _ in files}
+            connection.executemany("DELETE FROM files WHERE path = ?",
+                                   [(image_path,) for image_path in cached_facts if image_path not in dataset_paths])
+
+        for (image_path, size, mtime_ns), facts in zip(missing_files, missing_facts):
+            cached_facts[image_path] = (size, mtime_ns) + facts
+
+        tasks_path = os.path.join(dataset_path, "dataset_tasks.txt")
+        task_suffixes = None
+
+        if os.path.isfile(tasks_path):
+            with open(tasks_path, "r") as file:
+                task_suffixes = tuple("_" + line.strip() for line in file if line.strip())
+
+        expected_mode = "L" if input_size[2] == 1 else "RGB"
+
+        for image_path, _, _ in dataset_files:
+            _, _, width, height, mode, error = cached_facts[image_path]
+
+            if error is not None:
+                problems["undecodable"].append(image_path)
+                continue
+
+            if (width, height) != (input_size[0], input_size[1]):
+                problems["wrong_size"].append(image_path)
+
+            if mode != expected_mode:
+                problems["wrong_channels"].append(image_path)
+
+            if task_suffixes and not os.path.splitext(os.path.basename(image_path))[0].endswith(task_suffixes):
+                problems["orphaned_task"].append(image_path)
+
+        problems["unknown_output"] = [os.path.join(dataset_path, output_name) for output_name in output_files
+                                      if output_name not in class_names]
+        problems["empty_output"] = [class_name for class_name in class_names if not output_files.get(class_name)]
+
+        # The Keras directory loader resizes the images while the format loader reads them as they are
+        format_loader = any(os.path.splitext(image_path)[1].lower() in FORMAT_LOADER_TYPES
+                            for image_path, _, _ in dataset_files)
+        severities = {problem: problem_severity(problem, format_loader) for problem, paths in problems.items() if paths}
+
+        return {
+            "dataset": dataset_path,
+            "files": len(dataset_files),
+            "decoded": len(missing_files),
+            "seconds": time.perf_counter() - start_time,
+            "format_loader": format_loader,
+            "errors": sum(len(problems[problem]) for problem, severity in severities.items() if severity == "error"),
+            "problems": {problem: problems[problem] for problem in severities},
+            "severities": severities
+        }
+
+    # Method which logs the problems of a scan with a few example paths and a hint on fixing each
+    def log_report(self, report):
+        self.log_message("Scanned {} dataset files in {:.2f} s, decoded {} new or changed files".format(
+            report["files"], report["seconds"], report["decoded"]))
+
+        for problem, paths in report["problems"].items():
+            severity, hint = report["severities"][problem], PROBLEMS[problem][1]
+            self.log_message("{}: {} {}".format(severity.capitalize(), len(paths), hint))
+
+            for path in paths[:REPORT_EXAMPLES]:
+                self.log_message("    {}".format(path))
+
+            if len(paths) > REPORT_EXAMPLES:
+                self.log_message("    ... and {} more".format(len(paths) - REPORT_EXAMPLES))
@@ -0,0 +1,230 @@
+import os
+
+import numpy as np
+
+from image_processing import DATASET_IMAGE_TYPES, capture_state, load_dataset_state
+from lazy_imports import LazyModule
+
+tf = LazyModule("tensorflow")
+
+# Indexes smaller than this are searched by brute force, larger ones are split into inverted lists
+IVF_MIN_SIZE = 1024
+
+# Number of k-means iterations used to train the inverted list centroids
+KMEANS_ITERATIONS = 10
+
+
+# Function which creates a model returning the input of the last dense layer as the screen embedding
+def create_embedding_model(model):
+    return tf.keras.Model(inputs=model.inputs, outputs=model.layers[-1].input)
+
+
+# Function which scales embeddings to unit length so their dot product is the cosine similarity
+def normalize_embeddings(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+# Function which computes the normalized embeddings of states in batches
+def compute_embeddings(embedding_model, states, batch_size=32):
+    embeddings = [embedding_model(np.concatenate(states[start:start + batch_size]), training=False).numpy()
+                  for start in range(0, len(states), batch_size)]
+
+    return normalize_embeddings(np.concatenate(embeddings).astype(np.float32))
+
+
+class EmbeddingIndex:
+    # Nearest neighbour index of float16 screen embeddings with an optional inverted file for large indexes
+    #
+    # The inverted file keeps the embedding indexes of every list, so a search only reads the probed lists.
+
+    def __init__(self, model_path, label_names, embeddings, labels, centroids=None, assignments=None):
+        self.model_path = model_path
+        self.label_names = list(label_names)
+        self.embeddings = embeddings.astype(np.float16)
+        self.labels = labels.astype(np.int32)
+        self.centroids = centroids
+        self.assignments = assignments
+        self.inverted_lists = None
+        self.embedding_model = None
+
+        if assignments is not None:
+            self.build_inverted_lists()
+
+    # Method which returns the embedding model of the indexed model, loading it on first use
+    def get_embedding_model(self):
+        if self.embedding_model is None:
+            self.embedding_model = create_embedding_model(tf.keras.models.load_model(self.model_path))
+
+        return self.embedding_model
+
+    # Method which embeds dataset images or raw screenshots
+    def embed_images(self, image_paths, screenshots=False, task_index=None):
+        embedding_model = self.get_embedding_model()
+        input_size = embedding_model.input_shape[1:]
+
+        if screenshots:
+            states = [capture_state(image_path, input_size, task_index) for image_path in image_paths]
+        else:
+            states = [load_dataset_state(image_path, input_size) for image_path in image_paths]
+
+        return compute_embeddings(embedding_model, states)
+
+    # Method which adds embeddings of a new or existing label without retraining the model
+    def add(self, embeddings, label_name):
+
+        if label_name not in self.label_names:
+            self.label_names.append(label_name)
+
+        labels = np.full(len(embeddings), self.label_names.index(label_name), dtype=np.int32)
+        new_indexes = np.arange(len(self.embeddings), len(self.embeddings) + len(embeddings))
+        self.embeddings = np.concatenate([self.embeddings, embeddings.astype(np.float16)])
+        self.labels = np.concatenate([self.labels, labels])
+
+        # New embeddings join the inverted list of their nearest centroid, the lists are retrained on rebuild
+        if self.centroids is not None:
+            new_assignments = self.nearest_centroids(embeddings, 1)[:, 0]
+            self.assignments = np.concatenate([self.assignments, new_assignments])
+
+            for list_index in np.unique(new_assignments):
+                self.inverted_lists[list_index] = np.concatenate(
+                    [self.inverted_lists[list_index], new_indexes[new_assignments == list_index]])
+        elif len(self.embeddings) >= IVF_MIN_SIZE:
+            self.train_inverted_lists()
+
+    # Method which clusters the embeddings into inverted lists with k-means
+    def train_inverted_lists(self):
+        embeddings = self.embeddings.astype(np.float32)
+        list_count = int(np.sqrt(len(embeddings)))
+        random = np.random.default_rng(0)
+
+        self.centroids = embeddings[random.choice(len(embeddings), list_count, replace=False)]
+
+        for _ in range(KMEANS_ITERATIONS):
+            self.assignments = self.nearest_centroids(embeddings, 1)[:, 0]
+
+            for list_index in range(list_count):
+                members = embeddings[self.assignments == list_index]
+                if len(members) > 0:
+                    self.centroids[list_index] = members.mean(axis=0)
+
+            self.centroids = normalize_embeddings(self.centroids)
+
+        self.assignments = self.nearest_centroids(embeddings, 1)[:, 0]
+        self.build_inverted_lists()
+
+    # Method which groups the embedding indexes by their assigned list
+    def build_inverted_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        list_sizes = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.inverted_lists = np.split(order, np.cumsum(list_sizes)[:-1])
+
+    # Method which returns the indexes of the closest centroids of each embedding
+    def nearest_centroids(self, embeddings, count):
+        similarities = embeddings.astype(np.float32) @ self.centroids.T
+        return np.argsort(-similarities, axis=1)[:, :count]
+
+    # Method which returns the indexes and cosine similarities of the nearest indexed embeddings
+    def search(self, queries, k=5, probes=4):
+        queries = queries.astype(np.float32)
+        neighbours = np.zeros((len(queries), k), dtype=np.int64)
+        similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        # Brute force search compares against every embedding
+        if self.centroids is None:
+            candidate_lists = [np.arange(len(self.embeddings))] * len(queries)
+        else:
+            probed_lists = self.nearest_centroids(queries, min(probes, len(self.centroids)))
+            candidate_lists = [np.concatenate([self.inverted_lists[list_index] for list_index in lists])
+                               for lists in probed_lists]
+
+        for query_index, candidates in enumerate(candidate_lists):
+            candidate_similarities = self.embeddings[candidates].astype(np.float32) @ queries[query_index]
+            nearest = np.argsort(-candidate_similarities)[:k]
+            neighbours[query_index, :len(nearest)] = candidates[nearest]
+            similarities[query_index, :len(nearest)] = candidate_similarities[nearest]
+
+        return neighbours, similarities
+
+    # Method which classifies embeddings by a similarity weighted vote of their nearest neighbours
+    def classify(self, queries, k=5, probes=4):
+        neighbours, similarities = self.search(queries, k, probes)
+        predictions = []
+
+        for query_neighbours, query_similarities in zip(neighbours, similarities):
+            votes = np.zeros(len(self.label_names), dtype=np.float32)
+
+            for neighbour, similarity in zip(query_neighbours, query_similarities):
+                if np.isfinite(similarity):
+                    votes[self.labels[neighbour]] += max(float(similarity), 0.0)
+
+            label_index = int(np.argmax(votes))
+            predictions.append((self.label_names[label_index], float(votes[label_index] / max(votes.sum(), 1e-12))))
+
+        return predictions
+
+    # Method which writes the index into a compressed numpy archive
+    def save(self, index_path):
+        arrays = {
+            "model_path": np.array(os.path.abspath(self.model_path)),
+            "label_names": np.array(self.label_names),
+            "embeddings": self.embeddings,
+            "labels": self.labels
+        }
+
+        if self.centroids is not None:
+            arrays["centroids"] = self.centroids.astype(np.float16)
+            arrays["assignments"] = self.assignments.astype(np.int32)
+
+        np.savez_compressed(index_path, **arrays)
+
+    # Method which reads an index written by save
+    @staticmethod
+    def load(index_path):
+        with np.load(index_path) as arrays:
+            centroids = arrays["centroids"].astype(np.float32) if "centroids" in arrays else None
+            assignments = arrays["assignments"] if "assignments" in arrays else None
+
+            return EmbeddingIndex(str(arrays["model_path"]), arrays["label_names"].tolist(), arrays["embeddings"],
+                                  arrays["labels"], centroids, assignments)
+
+    # Method which embeds every image of a dataset folder with a trained model, hidden folders are skipped
+    @staticmethod
+    def build(model_path, dataset_path, log_message):
+        index = EmbeddingIndex(model_path, [], np.zeros((0, 0)), np.zeros(0))
+        label_images = {}
+
+        for label_name in sorted(os.listdir(dataset_path)):
+            label_path = os.path.join(dataset_path, label_name)
+
+            if label_name.startswith(".") or not os.path.isdir(label_path):
+                continue
+
+            label_images[label_name] = [os.path.join(label_path, file) for file in sorted(os.listdir(label_path))
+                                        if file.lower().endswith(DATASET_IMAGE_TYPES)]
+
+        if not any(label_images.values()):
+            log_message("Could not find any dataset images to index from: {}".format(dataset_path))
+            return None
+
+        embeddings = []
+        labels = []
+
+        for label_index, (label_name, image_paths) in enumerate(label_images.items()):
+            if image_paths:
+                embeddings.append(index.embed_images(image_paths))
+                labels.append(np.full(len(image_paths), label_index, dtype=np.int32))
+
+            log_message("Embedded {} images of: {}".format(len(image_paths), label_name))
+
+        index.label_names = list(label_images)
+        index.embeddings = np.concatenate(embeddings).astype(np.float16)
+        index.labels = np.concatenate(labels)
+
+        if len(index.embeddings) >= IVF_MIN_SIZE:
+            index.train_inverted_lists()
+
+        log_message("Built an index of {} embeddings of size {} for {} labels".format(
+            len(index.embeddings), index.embeddings.shape[1], len(index.label_names)))
+
+        return index
@@ -0,0 +1,160 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+from PIL.Image import Resampling
+
+# Share of the screenshot height which is cropped off as the top status bar
+TOP_CROP_RATIO = 0.05
+
+# Storage formats of the dataset images and their file extensions
+DATASET_FORMATS = {"PNG": ".png", "WEBP": ".webp", "NPY": ".npy"}
+
+# File extensions of the dataset images in any storage format
+DATASET_IMAGE_TYPES = tuple(DATASET_FORMATS.values())
+
+# zlib compression level of the PNG dataset images, the Pillow default
+PNG_COMPRESS_LEVEL = 6
+
+# Linear Congruential Generator parameters used for the task augmentation
+LCG_MULTIPLIER = 1664525
+LCG_INCREMENT = 1013904223
+LCG_MODULUS = 2 ** 32
+
+
+# Function which walks a folder like os.walk but skips hidden folders such as the canonical crop store
+def walk_visible(path):
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [folder for folder in dirs if not folder.startswith(".")]
+        yield root, dirs, files
+
+
+# Function for reading image files from a target folder
+def find_image_filepaths(images_path):
+
+    image_types = [".jpg", ".jpeg", ".png", ".gif"]
+    image_paths = []
+
+    # Read all compatible image files from the target folder
+    for root, dirs, files in walk_visible(images_path):
+        for image in files:
+            if any(image.lower().endswith(type) for type in image_types):
+                image_paths.append(os.path.join(root, image))
+
+    return image_paths
+
+
+# Function which filters out the source images already linked into the dataset under a task, the dataset images
+# are compared by their names without the extension as they may be stored in any format
+def filter_source_images(source_images, task_name, dataset_images):
+
+    images_list = []
+
+    # Check if the task augmented image exists in the target dataset
+    for source_image in source_images:
+
+        image_name = os.path.splitext(os.path.basename(source_image))[0]
+
+        if task_name:
+            image_name += f"_{task_name}"
+
+        if image_name not in dataset_images:
+            images_list.append(source_image)
+
+    return images_list
+
+
+# Function which crops the top bar off a screenshot
+def crop_image(image):
+    width, height = image.size
+    return image.crop((0, int(height * TOP_CROP_RATIO), width, height))
+
+
+# Function which resizes a cropped screenshot for a model input
+def resize_image(image, input_size):
+    return image.resize(
+        [input_size[0], input_size[1]],
+        resample=Resampling.NEAREST
+    )
+
+
+# Function which crops the top bar off a screenshot and resizes it for a model input
+def crop_resize_image(image, input_size):
+
+    # Crop the top bar off the image, then resize and format it
+    return resize_image(crop_image(image), input_size).convert('RGB')
+
+
+# Function which encodes a dataset image in the storage format of its file extension
+def encode_dataset_image(image, extension, png_compress_level=PNG_COMPRESS_LEVEL):
+    image_buffer = io.BytesIO()
+
+    if extension == ".npy":
+        np.save(image_buffer, np.asarray(image, dtype=np.uint8), allow_pickle=False)
+    elif extension == ".webp":
+        image.save(image_buffer, format="WEBP", lossless=True)
+    else:
+        image.save(image_buffer, format="PNG", compress_level=png_compress_level)
+
+    return image_buffer.getvalue()
+
+
+# Function which opens a dataset image stored in any of the storage formats
+def open_dataset_image(image_path):
+    if image_path.lower().endswith(".npy"):
+        return Image.fromarray(np.load(image_path, allow_pickle=False))
+
+    return Image.open(image_path)
+
+
+# Function which crops, resizes and saves a screenshot into a dataset in the format of its file extension
+def save_dataset_image(image_path, save_path, input_size, png_compress_level=PNG_COMPRESS_LEVEL):
+    with Image.open(image_path) as image:
+        # Crop, resize and convert to RGB before saving the image
+        image = crop_resize_image(image, input_size)
+
+    with open(save_path, "wb") as file:
+        file.write(encode_dataset_image(image, os.path.splitext(save_path)[1].lower(), png_compress_level))
+
+
+# Linear Congruential Generator which generates a pseudo random value for a pixel
+def augment_pixel(seed):
+    return ((LCG_MULTIPLIER * seed + LCG_INCREMENT) % LCG_MODULUS) % 256
+
+
+# Function which adds the task value to the pixels of an RGB image
+def augment_image_task(image, task_index):
+
+    pixels = np.asarray(image, dtype=np.int64)
+    augmented = augment_pixel(pixels + task_index).astype(np.uint8)
+
+    # The devices walk the pixels column by column starting from a black pixel and every pixel matching
+    # its predecessor reuses the previous value, so only the leading run of black pixels stays untouched
+    height, width = pixels.shape[:2]
+    column_major = pixels.transpose(1, 0, 2).reshape(-1, pixels.shape[2])
+    leading_black = (np.cumsum(column_major.any(axis=1)) == 0).reshape(width, height).T
+    augmented[leading_black] = 0
+
+    return Image.fromarray(augmented)
+
+
+# Function which prepares a screenshot as a model input state the same way as the Android ActionUtils does
+def capture_state(image_path, input_size, task_index=None):
+
+    with Image.open(image_path) as image:
+        image = crop_resize_image(image, input_size)
+
+    if task_index is not None:
+        image = augment_image_task(image, task_index)
+
+    # Create the batch axis
+    return np.expand_dims(np.asarray(image, dtype=np.float32), 0)
+
+
+# Function which loads a dataset image as a model input state, the dataset images are already cropped and augmented
+def load_dataset_state(image_path, input_size):
+    with open_dataset_image(image_path) as image:
+        image = image.convert("RGB").resize([input_size[0], input_size[1]], Resampling.BILINEAR)
+
+    return np.expand_dims(np.asarray(image, dtype=np.float32), 0)
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from image_processing import DATASET_IMAGE_TYPES, PNG_COMPRESS_LEVEL, encode_dataset_image
+from prediction_cache import file_hash
+
+# Hidden folder beside the dataset folders holding the images of all of them, skipped by every dataset walk
+STORE_FOLDER = ".image_store"
+
+
+# Function which returns the image store shared by the dataset folders in the same parent folder
+def dataset_store_path(dataset_folder):
+    return os.path.join(os.path.dirname(os.path.abspath(dataset_folder)), STORE_FOLDER)
+
+
+# Function which replaces a file with a hard link to another file, or a copy across file systems
+def link_file(source_path, target_path):
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+    # Linked under a temporary name and renamed over the target, so a reader never sees a missing file
+    temporary_path = "{}.{}.{}.tmp".format(target_path, os.getpid(), threading.get_ident())
+
+    try:
+        os.link(source_path, temporary_path)
+    except OSError:
+        shutil.copy2(source_path, temporary_path)
+
+    os.replace(temporary_path, target_path)
+
+
+class ImageStore:
+    # Content-addressed store of dataset images, every image is a blob named by the SHA-256 of its encoded bytes
+    #
+    # Dataset folders hard link their images to the blobs, so an image shared by the assert and task datasets
+    # or by a branch of a dataset is stored and written once. A linked image is shared and must never be
+    # rewritten in place, writers create the final image in memory and replace the link with write_image.
+    # Blobs no dataset links to any more have a single link left and are removed by collect_garbage.
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+
+    # Method which returns the path of the blob of a content hash, sharded by its first two characters
+    def blob_path(self, content_hash, extension):
+        return os.path.join(self.store_path, content_hash[:2], content_hash + extension)
+
+    # Method which stores encoded image bytes and returns the path of their blob, which is only written once
+    def add_bytes(self, image_bytes, extension):
+        blob_path = self.blob_path(hashlib.sha256(image_bytes).hexdigest(), extension)
+
+        if not os.path.isfile(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+            # Written under a temporary name as the same image may be stored from several threads or processes
+            temporary_path = "{}.{}.{}.tmp".format(blob_path, os.getpid(), threading.get_ident())
+            with open(temporary_path, "wb") as file:
+                file.write(image_bytes)
+            os.replace(temporary_path, blob_path)
+
+        return blob_path
+
+    # Method which stores an image in the format of the target path extension and links it into a dataset
+    def write_image(self, image, target_path, png_compress_level=PNG_COMPRESS_LEVEL):
+        extension = os.path.splitext(target_path)[1].lower()
+        blob_path = self.add_bytes(encode_dataset_image(image, extension, png_compress_level), extension)
+        link_file(blob_path, target_path)
+
+        return blob_path
+
+    # Method which moves an existing dataset file into the store and returns the bytes it no longer takes
+    def add_file(self, file_path):
+        file_stat = os.stat(file_path)
+        blob_path = self.blob_path(file_hash(file_path), os.path.splitext(file_path)[1].lower())
+
+        if os.path.isfile(blob_path):
+            if os.path.samefile(blob_path, file_path):
+                return 0
+
+            link_file(blob_path, file_path)
+
+            # The bytes are only freed when the replaced file had no other links
+            return file_stat.st_size if file_stat.st_nlink == 1 else 0
+
+        link_file(file_path, blob_path)
+        return 0
+
+    # Method which removes the blobs no dataset links to and returns their count and size
+    def collect_garbage(self):
+        removed_count = 0
+        removed_bytes = 0
+
+        for root, dirs, files in os.walk(self.store_path):
+            for file in files:
+                blob_path = os.path.join(root, file)
+                blob_stat = os.stat(blob_path)
+
+                if blob_stat.st_nlink == 1:
+                    os.remove(blob_path)
+                    removed_count += 1
+                    removed_bytes += blob_stat.st_size
+
+        return removed_count, removed_bytes
+
+
+# Function which lists every file of a dataset folder including the hidden canonical crops
+def dataset_files(dataset_folder):
+    return [os.path.join(root, file) for root, dirs, files in os.walk(dataset_folder) for file in sorted(files)]
+
+
+# Function which moves the images of an existing dataset into its image store, linking identical images once
+def deduplicate_dataset(dataset_folder, log_message):
+    image_store = ImageStore(dataset_store_path(dataset_folder))
+    image_paths = [path for path in dataset_files(dataset_folder) if path.lower().endswith(DATASET_IMAGE_TYPES)]
+    saved_bytes = sum(image_store.add_file(image_path) for image_path in image_paths)
+
+    log_message("Linked {} images of {} into: {}, freeing {:.1f} MB".format(
+        len(image_paths), dataset_folder, image_store.store_path, saved_bytes / (1024 * 1024)))
+
+    return saved_bytes
+
+
+# Function which branches a dataset into a new folder, the images are hard linked and the other files copied
+def branch_dataset(source_folder, target_folder, log_message):
+    if os.path.exists(target_folder):
+        raise FileExistsError("The branch target already exists: {}".format(target_folder))
+
+    file_count = 0
+
+    for source_path in dataset_files(source_folder):
+        target_path = os.path.join(target_folder, os.path.relpath(source_path, source_folder))
+
+        # The tasks file and manifest are rewritten in place, so each branch gets its own copy of them
+        if source_path.lower().endswith(DATASET_IMAGE_TYPES):
+            link_file(source_path, target_path)
+        else:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            shutil.copy2(source_path, target_path)
+
+        file_count += 1
+
+    # Empty output folders are part of the dataset too
+    for root, dirs, files in os.walk(source_folder):
+        for folder in dirs:
+            os.makedirs(os.path.join(target_folder, os.path.relpath(os.path.join(root, folder), source_folder)),
+                        exist_ok=True)
+
+    log_message("Branched {} files of {} into: {}".format(file_count, source_folder, target_folder))
+
+    return file_count
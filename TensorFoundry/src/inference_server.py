@@ -0,0 +1,359 @@
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from application_utils import read_output_labels
+from image_processing import capture_state
+
+# Latencies kept per model for the percentiles of the metrics
+LATENCY_HISTORY = 2000
+
+# Seconds a request waits for its prediction before the server gives up on it
+REQUEST_TIMEOUT = 30
+
+
+# Function which summarizes a list of latencies in milliseconds
+def latency_distribution(latencies):
+    if not latencies:
+        return None
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "mean": float(np.mean(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p90": float(np.percentile(latencies, 90)),
+        "p99": float(np.percentile(latencies, 99)),
+        "max": float(np.max(latencies))
+    }
+
+
+# Function which reads the output labels of every head of a model, multi-head models keep a file per head
+def read_head_labels(model_path, output_names):
+    model_name = os.path.splitext(os.path.basename(model_path))[0]
+    head_labels = {}
+
+    for output_name in output_names:
+        labels, load_labels = read_output_labels("{}_{}".format(model_name, output_name.replace("_output", "")),
+                                                 model_path)
+        if not load_labels:
+            labels, load_labels = read_output_labels(model_name, model_path)
+
+        head_labels[output_name] = labels if load_labels else None
+
+    return head_labels
+
+
+class ModelBatcher:
+    # Keeps a model loaded and coalesces concurrent single image requests into micro-batches
+    #
+    # Requests are queued with the time they arrived. A batch starts with the oldest request and takes every
+    # request arriving until the batch window after it has passed or the batch is full, so a lone request waits
+    # at most the batch window while a burst shares a single inference. One thread runs the batches of a model,
+    # so the model is never called concurrently.
+
+    def __init__(self, name, model, head_labels, batch_window, max_batch_size):
+        self.name = name
+        self.model = model
+        self.head_labels = head_labels
+        self.input_size = model.input_shape[1:]
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.requests = queue.Queue()
+
+        self.metrics_lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.queue_waits = deque(maxlen=LATENCY_HISTORY)
+        self.inference_times = deque(maxlen=LATENCY_HISTORY)
+
+        self.thread = threading.Thread(target=self.run_batches, name="batcher-" + name, daemon=True)
+        self.thread.start()
+
+    # Method which queues a state for prediction and returns the future of its outputs
+    def submit(self, state):
+        future = Future()
+        self.requests.put((state, future, time.perf_counter()))
+
+        with self.metrics_lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.requests.qsize())
+
+        return future
+
+    # Method which collects the requests into batches until the batcher is stopped, run on the batcher thread
+    def run_batches(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+
+            batch = [request]
+            deadline = request[2] + self.batch_window
+            stopping = False
+
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+
+                if request is None:
+                    stopping = True
+                    break
+
+                batch.append(request)
+
+            self.run_batch(batch)
+
+            if stopping:
+                return
+
+    # Method which predicts a batch of requests in a single inference and resolves their futures
+    def run_batch(self, batch):
+        start_time = time.perf_counter()
+
+        try:
+            outputs = self.model(np.concatenate([state for state, _, _ in batch]), training=False)
+            outputs = [np.asarray(output) for output in (outputs if isinstance(outputs, (list, tuple)) else [outputs])]
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+
+            with self.metrics_lock:
+                self.error_count += len(batch)
+            return
+
+        end_time = time.perf_counter()
+
+        for i, (_, future, arrival_time) in enumerate(batch):
+            future.set_result([output[i] for output in outputs])
+
+        with self.metrics_lock:
+            self.request_count += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            self.inference_times.append(end_time - start_time)
+            self.queue_waits.extend(start_time - arrival_time for _, _, arrival_time in batch)
+            self.latencies.extend(end_time - arrival_time for _, _, arrival_time in batch)
+
+    # Method which predicts the outputs of a single state and returns the index, label and confidence of each head
+    def predict(self, state):
+        outputs = self.submit(state).result(timeout=REQUEST_TIMEOUT)
+        predictions = {}
+
+        for (output_name, labels), output in zip(self.head_labels.items(), outputs):
+            index = int(np.argmax(output))
+            predictions[output_name] = {
+                "index": index,
+                "label": labels[index] if labels and index < len(labels) else None,
+                "confidence": float(output[index]),
+                "outputs": [float(value) for value in output]
+            }
+
+        return predictions
+
+    # Method which returns the request, batch, queue and latency metrics of the model
+    def metrics(self):
+        with self.metrics_lock:
+            batch_count = sum(self.batch_sizes.values())
+
+            return {
+                "requests": self.request_count,
+                "errors": self.error_count,
+                "batches": batch_count,
+                "mean_batch_size": self.request_count / batch_count if batch_count else 0.0,
+                "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "queue_depth": self.requests.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "latency_ms": latency_distribution(list(self.latencies)),
+                "queue_wait_ms": latency_distribution(list(self.queue_waits)),
+                "inference_ms": latency_distribution(list(self.inference_times))
+            }
+
+    # Method which stops the batcher once the queued requests are predicted
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    # Routes the HTTP requests of the inference server
+    #
+    # GET  /models                      lists the served models with their input shape and outputs
+    # GET  /metrics                     returns the metrics of every served model
+    # POST /models/<name>/predict       predicts a screenshot sent as the request body, an optional task query
+    #                                   parameter selects the task augmentation like on the device
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+
+        if path == "/models":
+            self.send_json(200, self.server.inference_server.describe_models())
+        elif path == "/metrics":
+            self.send_json(200, self.server.inference_server.metrics())
+        else:
+            self.send_json(404, {"error": "Unknown path: {}".format(path)})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        image_bytes = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if len(parts) != 3 or parts[0] != "models" or parts[2] != "predict":
+            self.send_json(404, {"error": "Unknown path: {}".format(url.path)})
+            return
+
+        try:
+            task = parse_qs(url.query).get("task")
+            task_index = int(task[0]) if task else None
+            predictions = self.server.inference_server.predict(parts[1], image_bytes, task_index)
+        except KeyError:
+            self.send_json(404, {"error": "Unknown model: {}".format(parts[1])})
+        except TimeoutError:
+            self.send_json(504, {"error": "The prediction timed out"})
+        except (ValueError, OSError) as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e) or type(e).__name__})
+        else:
+            self.send_json(200, {"model": parts[1], "outputs": predictions})
+
+    # Method which sends a JSON response
+    def send_json(self, status, content):
+        body = json.dumps(content).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Every request would be logged to stderr otherwise, the metrics summarize them instead
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixInferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # HTTP over a Unix socket for clients on the same machine, one thread per connection like the TCP server
+
+    daemon_threads = True
+
+    # Unix sockets have no client address, the request handler expects a host and port
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+class InferenceServer:
+    # Long-lived inference service keeping models loaded, with a micro-batcher per model
+    #
+    # Models are served under their file name without the extension and take screenshots preprocessed the same
+    # way as the Android agent does, so the device farm stand-in and the evaluation tools can share warm models
+    # instead of loading them on every call. Only .keras models are served, as they take any batch size.
+
+    def __init__(self, configuration, log_message, tensorflow_model, batch_window=None, max_batch_size=None):
+        self.configuration = configuration
+        self.log_message = log_message
+        self.tensorflow_model = tensorflow_model
+        self.batch_window = (configuration.serve_batch_window if batch_window is None else batch_window) / 1000
+        self.max_batch_size = configuration.serve_max_batch if max_batch_size is None else max_batch_size
+        self.batchers = {}
+        self.http_server = None
+        self.start_time = time.perf_counter()
+
+    # Method which loads and warms up a model and starts its batcher
+    def load_model(self, model_path):
+        name = os.path.splitext(os.path.basename(model_path))[0]
+
+        if name in self.batchers:
+            raise ValueError("A model named {} is already served".format(name))
+
+        load_time = time.perf_counter()
+        model = self.tensorflow_model.load_serving_model(model_path, self.max_batch_size)
+        load_time = time.perf_counter() - load_time
+
+        # Sequential models only name their last layer
+        output_names = model.output_names if len(model.outputs) > 1 else [model.layers[-1].name]
+
+        self.batchers[name] = ModelBatcher(name, model, read_head_labels(model_path, output_names),
+                                           self.batch_window, self.max_batch_size)
+        self.log_message("Serving model: {} as {}, loaded in {:.2f} s".format(model_path, name, load_time))
+
+    # Method which preprocesses an encoded screenshot and predicts it with a served model
+    def predict(self, model_name, image_bytes, task_index=None):
+        batcher = self.batchers[model_name]
+        state = capture_state(BytesIO(image_bytes), batcher.input_size, task_index)
+
+        return batcher.predict(state)
+
+    # Method which describes the served models
+    def describe_models(self):
+        return {name: {"input_shape": list(batcher.input_size),
+                       "outputs": {output_name: labels for output_name, labels in batcher.head_labels.items()}}
+                for name, batcher in self.batchers.items()}
+
+    # Method which returns the metrics of every served model
+    def metrics(self):
+        return {
+            "uptime": time.perf_counter() - self.start_time,
+            "batch_window_ms": self.batch_window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "models": {name: batcher.metrics() for name, batcher in self.batchers.items()}
+        }
+
+    # Method which creates the HTTP server on a TCP port, or on a Unix socket when a socket path is given
+    def create_http_server(self, host=None, port=None, socket_path=None):
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+            self.http_server = UnixInferenceServer(socket_path, InferenceRequestHandler)
+            address = socket_path
+        else:
+            host = self.configuration.serve_host if host is None else host
+            port = self.configuration.serve_port if port is None else port
+
+            self.http_server = ThreadingHTTPServer((host, port), InferenceRequestHandler)
+            address = "http://{}:{}".format(*self.http_server.server_address[:2])
+
+        self.http_server.inference_server = self
+        self.log_message("Inference server listening on: {} with a {:.1f} ms batch window and batches of up to {}"
+                         .format(address, self.batch_window * 1000, self.max_batch_size))
+
+        return self.http_server
+
+    # Method which serves requests until interrupted and then stops the batchers
+    def serve(self, host=None, port=None, socket_path=None):
+        http_server = self.create_http_server(host, port, socket_path)
+
+        try:
+            http_server.serve_forever()
+        except KeyboardInterrupt:
+            self.log_message("Stopping the inference server")
+        finally:
+            self.shutdown(socket_path)
+
+    # Method which closes the server and stops the batchers
+    def shutdown(self, socket_path=None):
+        if self.http_server is not None:
+            self.http_server.server_close()
+            self.http_server = None
+
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        for batcher in self.batchers.values():
+            batcher.stop()
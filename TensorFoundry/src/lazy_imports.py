@@ -0,0 +1,65 @@
+import importlib
+import json
+import subprocess
+import sys
+import threading
+import time
+
+# Heavy modules which are imported on first use instead of at startup
+HEAVY_MODULES = ["tensorflow", "coremltools"]
+
+# Modules measured by the import time report
+REPORT_MODULES = ["application", "tensorflow", "coremltools", "matplotlib.backends.backend_tkagg", "PIL.ImageTk",
+                  "numpy", "ttkthemes"]
+
+
+class LazyModule:
+    # Module stand-in which imports the real module on first attribute access
+
+    def __init__(self, module_name):
+        self.__dict__["module_name"] = module_name
+        self.__dict__["module"] = None
+
+    def __getattr__(self, attribute):
+        if self.module is None:
+            self.__dict__["module"] = importlib.import_module(self.module_name)
+
+        return getattr(self.module, attribute)
+
+
+# Function which imports the heavy modules in a background thread so their first use does not wait
+def start_warm_up(log_message, module_names=("tensorflow",)):
+
+    def warm_up():
+        for module_name in module_names:
+            start_time = time.perf_counter()
+            importlib.import_module(module_name)
+            log_message("Warm-up imported {} in {:.2f} s".format(module_name, time.perf_counter() - start_time))
+
+    thread = threading.Thread(target=warm_up, daemon=True)
+    thread.start()
+    return thread
+
+
+# Function which measures the cold import time of each module in a fresh interpreter, along with any heavy
+# modules it pulled in as a side effect
+def measure_import_times(module_names=REPORT_MODULES):
+    import_times = {}
+
+    for module_name in module_names:
+        result = subprocess.run(
+            [sys.executable, "-c",
+             "import json, sys, time; start_time = time.perf_counter(); import {}; "
+             "print(json.dumps([time.perf_counter() - start_time, [name for name in {} if name in sys.modules]]))"
+             .format(module_name, HEAVY_MODULES)],
+            capture_output=True, text=True)
+
+        lines = result.stdout.strip().splitlines()
+
+        if result.returncode == 0 and lines:
+            import_time, heavy_modules = json.loads(lines[-1])
+            import_times[module_name] = {"seconds": import_time, "heavy_modules": heavy_modules}
+        else:
+            import_times[module_name] = {"seconds": None, "heavy_modules": []}
+
+    return import_times
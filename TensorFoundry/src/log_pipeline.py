@@ -0,0 +1,211 @@
+import itertools
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from tkinter import END, Listbox, font, ttk
+
+
+# Function which adds a timestamp to a log message
+def timestamp_message(message):
+    timestamp_str = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+    return timestamp_str + " " + message
+
+
+class ProcessLogger:
+    # Picklable log_message replacement for worker processes which forwards into the application log
+
+    def __init__(self, process_queue):
+        self.process_queue = process_queue
+
+    def __call__(self, message):
+        self.process_queue.put(timestamp_message(message))
+
+
+class LogPipeline:
+    def __init__(self, configuration):
+        self.configuration = configuration
+        self.log_queue = queue.SimpleQueue()
+        self.log_buffer = deque(maxlen=configuration.log_limit)
+        self.log_views = []
+        self.process_manager = None
+        self.process_queue = None
+        self.process_thread = None
+        self.file_queue = None
+        self.file_listener = None
+
+        self.start_file_sink()
+
+    # Method for logging a message, safe to call from any thread
+    def log_message(self, message):
+        self.log_queue.put(timestamp_message(message))
+
+    # Method which returns a logger that worker processes can use in place of log_message
+    def create_process_logger(self):
+
+        # A managed queue can be passed to process pools unlike a plain multiprocessing queue
+        if self.process_queue is None:
+            self.process_manager = multiprocessing.Manager()
+            self.process_queue = self.process_manager.Queue()
+            self.process_thread = threading.Thread(target=self.forward_process_messages, daemon=True)
+            self.process_thread.start()
+
+        return ProcessLogger(self.process_queue)
+
+    # Method which forwards messages from worker processes into the log queue
+    def forward_process_messages(self):
+        while True:
+            message = self.process_queue.get()
+
+            if message is None:
+                return
+
+            self.log_queue.put(message)
+
+    # Method which starts the asynchronous rotating log file sink
+    def start_file_sink(self):
+
+        if not self.configuration.log_file_path:
+            return
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.configuration.log_file_path,
+            maxBytes=self.configuration.log_file_bytes,
+            backupCount=self.configuration.log_file_backups,
+            encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        # The file is written by a listener thread so draining the log never waits for the disk
+        self.file_queue = queue.SimpleQueue()
+        self.file_listener = logging.handlers.QueueListener(self.file_queue, file_handler)
+        self.file_listener.start()
+
+    # Method which registers a log view to be fed from the shared buffer
+    def add_view(self, log_view):
+        log_view.log_buffer = self.log_buffer
+        self.log_views.append(log_view)
+
+    # Method which drains a batch of queued messages into the buffer, the file sink and the visible views
+    def drain(self):
+        messages = []
+
+        try:
+            while len(messages) < self.configuration.log_batch_size:
+                messages.extend(self.log_queue.get_nowait().split('\n'))
+        except queue.Empty:
+            pass
+
+        if not messages:
+            return
+
+        self.log_buffer.extend(messages)
+
+        if self.file_queue is not None:
+            for message in messages:
+                self.file_queue.put(logging.makeLogRecord({"msg": message, "levelno": logging.INFO}))
+
+        for log_view in self.log_views:
+            log_view.refresh()
+
+    # Method which flushes the remaining messages and stops the background sinks
+    def close(self):
+
+        if self.process_queue is not None:
+            self.process_queue.put(None)
+            self.process_thread.join()
+            self.process_manager.shutdown()
+
+        # The views are gone with the window so the rest of the messages only go to the file
+        self.log_views.clear()
+
+        if self.file_listener is not None:
+            while not self.log_queue.empty():
+                self.drain()
+
+            self.file_listener.stop()
+
+
+class LogView:
+    # Log listbox which only renders the rows currently visible from the shared log buffer
+
+    def __init__(self, parent, configuration):
+        self.configuration = configuration
+        self.log_buffer = deque()
+        self.first_row = 0
+        self.follow = True
+
+        self.frame = ttk.Frame(parent)
+        self.listbox = Listbox(
+            self.frame,
+            bg=configuration.app_dark_background_color,
+            fg=configuration.app_text_foreground_color,
+            selectbackground=configuration.app_select_background_color,
+            selectforeground=configuration.app_select_foreground_color,
+            takefocus=0
+        )
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.scroll)
+        self.line_height = font.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+
+        self.listbox.bind("<<ListboxSelect>>", self.disable_log_selection)
+        self.listbox.bind("<MouseWheel>", self.mouse_wheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll("scroll", -1, "units"))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll("scroll", 1, "units"))
+        self.listbox.bind("<Map>", lambda event: self.refresh())
+        self.listbox.bind("<Configure>", lambda event: self.refresh())
+
+        self.scrollbar.pack(side="right", fill="y")
+        self.listbox.pack(side="left", fill="both", expand=True)
+
+    # Method for placing the view in its parent
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def disable_log_selection(self, event):
+        self.listbox.selection_clear(0, END)
+
+    # Method which returns the number of rows fitting into the listbox
+    def visible_rows(self):
+        return max(1, self.listbox.winfo_height() // self.line_height)
+
+    # Method which renders the visible rows of the log buffer, hidden tabs are skipped until mapped
+    def refresh(self):
+
+        if not self.listbox.winfo_viewable():
+            return
+
+        rows = self.visible_rows()
+        total = len(self.log_buffer)
+
+        if self.follow:
+            self.first_row = total - rows
+
+        self.first_row = max(0, min(self.first_row, total - rows))
+
+        self.listbox.delete(0, END)
+        self.listbox.insert(END, *itertools.islice(self.log_buffer, self.first_row, self.first_row + rows))
+
+        if total > 0:
+            self.scrollbar.set(self.first_row / total, min(1.0, (self.first_row + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # Method which handles the scrollbar commands and follows the log again when scrolled to the end
+    def scroll(self, action, amount, unit=None):
+        rows = self.visible_rows()
+        total = len(self.log_buffer)
+
+        if action == "moveto":
+            self.first_row = int(float(amount) * total)
+        elif unit == "pages":
+            self.first_row += int(amount) * rows
+        else:
+            self.first_row += int(amount)
+
+        self.follow = self.first_row + rows >= total
+        self.refresh()
+
+    def mouse_wheel(self, event):
+        self.scroll("scroll", -1 if event.delta > 0 else 1, "units")
@@ -0,0 +1,73 @@
+from enum import Enum
+
+from lazy_imports import LazyModule
+
+tf = LazyModule("tensorflow")
+
+
+class Architecture(Enum):
+    CONV_FLATTEN = "Conv + Flatten"
+    CONV_GAP = "Conv + Global pooling"
+    SEPARABLE = "Depthwise separable"
+
+
+# Function which returns an architecture based on its name or value, defaulting to the original architecture
+def read_architecture(name):
+    for architecture in Architecture:
+        if name.upper() in (architecture.name, architecture.value.upper()):
+            return architecture
+
+    return Architecture.CONV_FLATTEN
+
+
+# Function which scales the width of a layer with the width multiplier
+def scale_width(width, width_multiplier):
+    return max(4, int(round(width * width_multiplier)))
+
+
+# Function which creates the layers of the backbone shared by all model types
+def create_backbone(architecture, input_size, num_channels, width_multiplier=1.0):
+    layers = [
+        tf.keras.Input(shape=(input_size, input_size, num_channels)),
+        tf.keras.layers.Rescaling(1. / 255)
+    ]
+
+    if architecture == Architecture.SEPARABLE:
+        layers += create_separable_layers(width_multiplier)
+        layers.append(tf.keras.layers.GlobalAveragePooling2D())
+        return layers
+
+    for filters in (16, 32, 64):
+        layers.append(tf.keras.layers.Conv2D(scale_width(filters, width_multiplier), 3,
+                                             padding='same', activation='relu'))
+        layers.append(tf.keras.layers.MaxPooling2D())
+
+    # Global pooling keeps the dense layer independent of the input size
+    if architecture == Architecture.CONV_GAP:
+        layers.append(tf.keras.layers.GlobalAveragePooling2D())
+    else:
+        layers.append(tf.keras.layers.Flatten())
+
+    layers.append(tf.keras.layers.Dense(scale_width(128, width_multiplier), activation='relu'))
+    return layers
+
+
+# Function which creates a small MobileNet style stack of depthwise separable convolutions
+def create_separable_layers(width_multiplier):
+    layers = [
+        tf.keras.layers.Conv2D(scale_width(16, width_multiplier), 3, strides=2, padding='same', use_bias=False),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.ReLU(6.0)
+    ]
+
+    for filters, strides in ((32, 1), (64, 2), (64, 1), (128, 2), (128, 1), (256, 2)):
+        layers += [
+            tf.keras.layers.DepthwiseConv2D(3, strides=strides, padding='same', use_bias=False),
+            tf.keras.layers.BatchNormalization(),
+            tf.keras.layers.ReLU(6.0),
+            tf.keras.layers.Conv2D(scale_width(filters, width_multiplier), 1, padding='same', use_bias=False),
+            tf.keras.layers.BatchNormalization(),
+            tf.keras.layers.ReLU(6.0)
+        ]
+
+    return layers
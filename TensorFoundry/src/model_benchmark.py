@@ -0,0 +1,197 @@
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from image_processing import capture_state, find_image_filepaths
+
+
+class ModelBenchmark:
+    def __init__(self, configuration, log_message):
+        self.configuration = configuration
+        self.log_message = log_message
+
+    # Method which benchmarks the .keras and .tflite variants of a model against a folder of screenshots
+    def run_benchmark(self, model_path, images_path, task_index=None, thread_counts=(1, 2, 4), repeats=3, warmups=3):
+
+        keras_path = os.path.splitext(model_path)[0] + ".keras"
+        tflite_path = os.path.splitext(model_path)[0] + ".tflite"
+
+        image_paths = find_image_filepaths(images_path)
+        if len(image_paths) == 0:
+            self.log_message("Could not find any images to benchmark from: {}".format(images_path))
+            return None
+
+        if not os.path.isfile(keras_path) and not os.path.isfile(tflite_path):
+            self.log_message("Could not find a .keras or .tflite model at: {}".format(os.path.splitext(model_path)[0]))
+            return None
+
+        results = []
+
+        # The .keras variant decides the input size and serves as the reference for the top-1 agreement, without
+        # it the input size comes from the .tflite model and there is nothing to agree with
+        if os.path.isfile(keras_path):
+            keras_result, states, reference = self.benchmark_keras(keras_path, image_paths, task_index, repeats,
+                                                                   warmups)
+            results.append(keras_result)
+        else:
+            self.log_message("No .keras variant found at: {}, skipping the agreement check".format(keras_path))
+            interpreter = tf.lite.Interpreter(model_path=tflite_path)
+            states, preprocess_time = self.prepare_states(
+                image_paths, interpreter.get_input_details()[0]["shape"][1:], task_index)
+            reference = None
+
+        if os.path.isfile(tflite_path):
+            for thread_count in thread_counts:
+                results.append(
+                    self.benchmark_tflite(tflite_path, states, reference, thread_count, repeats, warmups))
+        else:
+            self.log_message("No .tflite variant found at: {}".format(tflite_path))
+
+        if reference is None:
+            results[0]["preprocess_time"] = preprocess_time
+
+        self.log_results(results, len(image_paths))
+        return results
+
+    # Method which preprocesses the screenshots the same way as the Android agent does before each inference and
+    # returns the states with the preprocessing time per screenshot
+    def prepare_states(self, image_paths, input_size, task_index):
+        preprocess_time = time.perf_counter()
+        states = [capture_state(image_path, input_size, task_index) for image_path in image_paths]
+
+        return states, (time.perf_counter() - preprocess_time) / len(states)
+
+    # Method which benchmarks a .keras model
+    def benchmark_keras(self, model_path, image_paths, task_index, repeats, warmups):
+
+        resident_memory = self.resident_memory()
+        load_time = time.perf_counter()
+        model = tf.keras.models.load_model(model_path)
+        load_time = time.perf_counter() - load_time
+
+        states, preprocess_time = self.prepare_states(image_paths, model.input_shape[1:], task_index)
+
+        # The Android agent runs a single screenshot per inference
+        warmup_time = time.perf_counter()
+        for _ in range(warmups):
+            model(states[0], training=False)
+        warmup_time = time.perf_counter() - warmup_time
+
+        latencies = []
+        predictions = []
+        for _ in range(repeats):
+            predictions.clear()
+            for state in states:
+                inference_time = time.perf_counter()
+                output = model(state, training=False)
+                latencies.append(time.perf_counter() - inference_time)
+                predictions.append(int(np.argmax(output[0])))
+
+        result = {
+            "variant": "keras",
+            "threads": None,
+            "load_time": load_time,
+            "warmup_time": warmup_time,
+            "preprocess_time": preprocess_time,
+            "latency": self.latency_distribution(latencies),
+            "model_size": os.path.getsize(model_path),
+            "memory": self.memory_growth(resident_memory),
+            "agreement": 1.0
+        }
+
+        return result, states, predictions
+
+    # Method which benchmarks a .tflite model with a number of interpreter threads
+    def benchmark_tflite(self, model_path, states, reference, thread_count, repeats, warmups):
+
+        resident_memory = self.resident_memory()
+        load_time = time.perf_counter()
+        interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=thread_count)
+        interpreter.allocate_tensors()
+        load_time = time.perf_counter() - load_time
+
+        input_index = interpreter.get_input_details()[0]["index"]
+        output_index = interpreter.get_output_details()[0]["index"]
+
+        warmup_time = time.perf_counter()
+        for _ in range(warmups):
+            interpreter.set_tensor(input_index, states[0])
+            interpreter.invoke()
+        warmup_time = time.perf_counter() - warmup_time
+
+        latencies = []
+        predictions = []
+        for _ in range(repeats):
+            predictions.clear()
+            for state in states:
+                inference_time = time.perf_counter()
+                interpreter.set_tensor(input_index, state)
+                interpreter.invoke()
+                output = interpreter.get_tensor(output_index)
+                latencies.append(time.perf_counter() - inference_time)
+                predictions.append(int(np.argmax(output[0])))
+
+        agreement = None if reference is None else float(np.mean(np.array(predictions) == np.array(reference)))
+
+        return {
+            "variant": "tflite",
+            "threads": thread_count,
+            "load_time": load_time,
+            "warmup_time": warmup_time,
+            "preprocess_time": None,
+            "latency": self.latency_distribution(latencies),
+            "model_size": os.path.getsize(model_path),
+            "memory": self.memory_growth(resident_memory),
+            "agreement": agreement
+        }
+
+    # Method which summarizes a list of latencies in milliseconds
+    def latency_distribution(self, latencies):
+        latencies = np.array(latencies) * 1000
+        return {
+            "mean": float(np.mean(latencies)),
+            "min": float(np.min(latencies)),
+            "p50": float(np.percentile(latencies, 50)),
+            "p90": float(np.percentile(latencies, 90)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(np.max(latencies))
+        }
+
+    # Method which returns the current resident memory of the process in bytes, None where /proc is not available.
+    # The peak resident memory never decreases, so it cannot tell what each variant adds after the first.
+    def resident_memory(self):
+        try:
+            with open("/proc/self/statm", "r") as file:
+                return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return None
+
+    # Method which returns how much the resident memory grew since an earlier reading
+    def memory_growth(self, resident_memory):
+        current_memory = self.resident_memory()
+        return None if resident_memory is None or current_memory is None else current_memory - resident_memory
+
+    # Method which logs the benchmark results as a table
+    def log_results(self, results, image_count):
+        self.log_message("Benchmark results over {} screenshots:".format(image_count))
+        self.log_message("{:<8}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}{:>12}{:>11}".format(
+            "Variant", "Threads", "Load ms", "Warmup ms", "Mean ms", "P50 ms", "P90 ms", "P99 ms", "Memory MB",
+            "Agreement"))
+
+        for result in results:
+            self.log_message("{:<8}{:>8}{:>10.1f}{:>10.1f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>12}{:>11}".format(
+                result["variant"],
+                result["threads"] or "-",
+                result["load_time"] * 1000,
+                result["warmup_time"] * 1000,
+                result["latency"]["mean"],
+                result["latency"]["p50"],
+                result["latency"]["p90"],
+                result["latency"]["p99"],
+                "-" if result["memory"] is None else "{:.1f}".format(result["memory"] / 2 ** 20),
+                "-" if result["agreement"] is None else "{:.1f}%".format(result["agreement"] * 100)))
+
+        if results[0]["preprocess_time"] is not None:
+            self.log_message("Preprocessing per screenshot: {:.2f} ms".format(results[0]["preprocess_time"] * 1000))
@@ -0,0 +1,131 @@
+import time
+
+import numpy as np
+from lazy_imports import LazyModule
+
+tf = LazyModule("tensorflow")
+
+
+# Function which counts the floating point operations of a single inference, a multiply-add counts as two
+def count_flops(model):
+    flops = 0
+
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.Model):
+            flops += count_flops(layer)
+        else:
+            flops += count_layer_flops(layer)
+
+    return flops
+
+
+# Function which counts the floating point operations of the compute heavy layers
+def count_layer_flops(layer):
+
+    if isinstance(layer, tf.keras.layers.DepthwiseConv2D):
+        _, height, width, channels = layer.output.shape
+        kernel_height, kernel_width = layer.kernel_size
+        return 2 * height * width * channels * kernel_height * kernel_width
+
+    if isinstance(layer, tf.keras.layers.Conv2D):
+        _, height, width, channels = layer.output.shape
+        kernel_height, kernel_width = layer.kernel_size
+        input_channels = layer.input.shape[-1] // layer.groups
+        return 2 * height * width * channels * kernel_height * kernel_width * input_channels
+
+    if isinstance(layer, tf.keras.layers.Dense):
+        return 2 * layer.input.shape[-1] * layer.units
+
+    return 0
+
+
+# Function which estimates the float32 activation memory of a single inference in bytes
+def count_activation_memory(model):
+    layer_sizes = []
+
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.Model):
+            layer_sizes.append(count_activation_memory(layer)["total"])
+        else:
+            layer_sizes.append(int(np.prod(layer.output.shape[1:])) * 4)
+
+    # Training keeps every activation around whereas inference only needs two neighbouring layers at a time
+    peak = max(first + second for first, second in zip(layer_sizes, layer_sizes[1:] + [0]))
+    return {"total": sum(layer_sizes), "peak": peak}
+
+
+# Function which measures the median latency of a callable in seconds
+def measure_latency(function, repeats, warmups=2):
+    for _ in range(warmups):
+        function()
+
+    latencies = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start_time)
+
+    return float(np.median(latencies))
+
+
+# Function which creates an untrained copy of a compiled model so measuring training steps leaves it untouched
+def clone_compiled_model(model):
+    clone = tf.keras.models.clone_model(model)
+    clone.compile(optimizer=model.optimizer.__class__(), loss=model.loss)
+    return clone
+
+
+# Function which estimates the size, compute, memory and measured CPU cost of a compiled model
+def estimate_model_cost(model, batch_size=32, repeats=10):
+    input_shape = model.input_shape[1:]
+
+    single_state = np.random.uniform(0, 255, (1,) + input_shape).astype(np.float32)
+    states = np.random.uniform(0, 255, (batch_size,) + input_shape).astype(np.float32)
+    labels = tuple(np.random.randint(0, output.shape[-1], (batch_size,)) for output in model.outputs)
+    labels = labels[0] if len(labels) == 1 else labels
+
+    training_model = clone_compiled_model(model)
+    activation_memory = count_activation_memory(model)
+
+    return {
+        "name": model.name,
+        "input_size": input_shape[0],
+        "parameters": model.count_params(),
+        "flops": count_flops(model),
+        "activation_memory": activation_memory["total"],
+        "peak_activation_memory": activation_memory["peak"],
+        "inference_latency": measure_latency(lambda: model(single_state, training=False), repeats),
+        "batch_latency": measure_latency(lambda: model(states, training=False), repeats),
+        "train_step_latency": measure_latency(lambda: training_model.train_on_batch(states, labels), repeats),
+        "batch_size": batch_size
+    }
+
+
+# Function which logs the header of a model cost table
+def log_cost_header(log_message):
+    log_message("{:<24}{:>6}{:>8}{:>12}{:>10}{:>13}{:>11}{:>11}{:>11}".format(
+        "Model", "Input", "Width", "Parameters", "MFLOPs", "Activ. MB", "Infer ms", "Batch ms", "Train ms"))
+
+
+# Function which logs a single model cost as a table row
+def log_cost_row(cost, log_message, width_multiplier=1.0):
+    log_message("{:<24}{:>6}{:>8.2f}{:>12,}{:>10.2f}{:>13.2f}{:>11.2f}{:>11.2f}{:>11.2f}".format(
+        cost["name"][:23],
+        cost["input_size"],
+        width_multiplier,
+        cost["parameters"],
+        cost["flops"] / 1e6,
+        cost["activation_memory"] / 2 ** 20,
+        cost["inference_latency"] * 1000,
+        cost["batch_latency"] * 1000,
+        cost["train_step_latency"] * 1000))
+
+
+# Function which logs the size, compute, memory and measured CPU cost of a compiled model
+def log_model_cost(model, log_message, batch_size=32, width_multiplier=1.0):
+    cost = estimate_model_cost(model, batch_size)
+
+    log_message("Estimated cost with batch size {} on this CPU:".format(batch_size))
+    log_cost_header(log_message)
+    log_cost_row(cost, log_message, width_multiplier)
+    return cost
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from model_cost import count_flops, measure_latency
+
+# Smallest probability taken the logarithm of, the softmax outputs of a confident model round to zero
+PROBABILITY_EPSILON = 1e-7
+
+
+# Function which softens softmax probabilities with a temperature and returns their log-probabilities, the
+# logarithm of a softmax output recovers its logits up to a constant which the softmax cancels
+def soften_probabilities(probabilities, temperature):
+    logits = tf.math.log(tf.clip_by_value(probabilities, PROBABILITY_EPSILON, 1.0))
+    return tf.nn.log_softmax(logits / temperature, axis=-1)
+
+
+class DistillationModel(tf.keras.Model):
+    # Trains a student model on the soft targets of a frozen teacher model together with the dataset labels
+    #
+    # Both models end in a softmax, so the saved student is a regular supervised model. The loss is the
+    # Kullback-Leibler divergence between the softened teacher and student outputs scaled by the squared
+    # temperature, mixed with the label cross-entropy weighted by alpha. Only the student weights are trained.
+
+    def __init__(self, student, teacher, temperature, alpha):
+        super().__init__(name="DISTILLATION")
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+
+    def compute_loss(self, x=None, y=None, y_pred=None, sample_weight=None, training=True):
+        teacher_log_probabilities = soften_probabilities(self.teacher(x, training=False), self.temperature)
+        student_log_probabilities = soften_probabilities(y_pred, self.temperature)
+
+        # The squared temperature keeps the soft target gradients at the scale of the label gradients
+        distillation_loss = tf.reduce_mean(tf.reduce_sum(
+            tf.exp(teacher_log_probabilities) * (teacher_log_probabilities - student_log_probabilities), axis=-1))
+        label_loss = tf.reduce_mean(tf.keras.losses.sparse_categorical_crossentropy(y, y_pred))
+
+        loss = self.alpha * label_loss + (1 - self.alpha) * self.temperature ** 2 * distillation_loss
+
+        if self.losses:
+            loss += tf.add_n(self.losses)
+
+        return loss
+
+
+# Function which measures the top-1 agreement of a student with its teacher and the accuracy of both on a dataset
+def measure_agreement(teacher, student, dataset):
+    agreeing_count = 0
+    teacher_correct_count = 0
+    student_correct_count = 0
+    image_count = 0
+
+    for images, labels in dataset:
+        teacher_outputs = np.argmax(teacher(images, training=False), axis=-1)
+        student_outputs = np.argmax(student(images, training=False), axis=-1)
+        labels = labels.numpy()
+
+        agreeing_count += int(np.sum(teacher_outputs == student_outputs))
+        teacher_correct_count += int(np.sum(teacher_outputs == labels))
+        student_correct_count += int(np.sum(student_outputs == labels))
+        image_count += len(labels)
+
+    image_count = max(image_count, 1)
+
+    return {
+        "images": image_count,
+        "agreement": agreeing_count / image_count,
+        "teacher_accuracy": teacher_correct_count / image_count,
+        "student_accuracy": student_correct_count / image_count
+    }
+
+
+# Function which measures the size and the single image CPU latency of a saved model
+def measure_model_size(model, model_path, repeats=20):
+    state = np.random.uniform(0, 255, (1,) + model.input_shape[1:]).astype(np.float32)
+
+    return {
+        "parameters": model.count_params(),
+        "file_bytes": os.path.getsize(model_path),
+        "flops": count_flops(model),
+        "inference_latency": measure_latency(lambda: model(state, training=False), repeats)
+    }
+
+
+# Function which logs the size, latency and accuracy of the teacher and student side by side
+def log_distillation_report(report, log_message):
+    log_message("{:<10}{:>12}{:>10}{:>10}{:>11}{:>10}".format(
+        "Model", "Parameters", "Size MB", "MFLOPs", "Infer ms", "Accuracy"))
+
+    for name in ["teacher", "student"]:
+        size = report[name]
+        log_message("{:<10}{:>12,}{:>10.2f}{:>10.2f}{:>11.2f}{:>9.2f}%".format(
+            name.capitalize(),
+            size["parameters"],
+            size["file_bytes"] / 2 ** 20,
+            size["flops"] / 1e6,
+            size["inference_latency"] * 1000,
+            100 * report["agreement"][name + "_accuracy"]))
+
+    log_message("The student is {:.1f}x smaller and {:.1f}x faster, agreeing with the teacher on {:.2f}% of {} "
+                "{} images".format(
+                    report["teacher"]["parameters"] / max(report["student"]["parameters"], 1),
+                    report["teacher"]["inference_latency"] / max(report["student"]["inference_latency"], 1e-9),
+                    100 * report["agreement"]["agreement"],
+                    report["agreement"]["images"],
+                    report["evaluation"]))
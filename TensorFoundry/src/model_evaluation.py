@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+
+from application_utils import read_output_labels
+from image_processing import DATASET_IMAGE_TYPES, load_dataset_state
+
+
+class ModelEvaluation:
+    def __init__(self, configuration, log_message, tensorflow_model):
+        self.configuration = configuration
+        self.log_message = log_message
+        self.tensorflow_model = tensorflow_model
+
+    # Method which evaluates a model against a dataset with a folder per output, hidden folders are skipped
+    def run_evaluation(self, model_path, dataset_path, threshold=0.0):
+
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+        class_names, load_classes = read_output_labels(model_name, model_path)
+
+        if not load_classes:
+            self.log_message("Could not read the {}_output_labels.txt!".format(model_name))
+            return None
+
+        image_paths = []
+        labels = []
+
+        for label, class_name in enumerate(class_names):
+            class_path = os.path.join(dataset_path, class_name)
+
+            if not os.path.isdir(class_path):
+                continue
+
+            class_images = [os.path.join(class_path, file) for file in sorted(os.listdir(class_path))
+                            if file.lower().endswith(DATASET_IMAGE_TYPES)]
+            image_paths += class_images
+            labels += [label] * len(class_images)
+
+        if len(image_paths) == 0:
+            self.log_message("Could not find any dataset images to evaluate from: {}".format(dataset_path))
+            return None
+
+        # Dataset images are already cropped and augmented, so they are only resized like the training pipeline does
+        outputs = self.tensorflow_model.predict_cached(model_path, image_paths, "dataset_image|bilinear",
+                                                       load_dataset_state)
+
+        return self.summarize(class_names, np.array(labels), outputs, threshold)
+
+    # Method which computes the accuracy, per class precision and recall, the confusion matrix and threshold coverage
+    def summarize(self, class_names, labels, outputs, threshold):
+        predictions = np.argmax(outputs, axis=1)
+        confidences = np.max(outputs, axis=1)
+        confusion = np.zeros((len(class_names), len(class_names)), dtype=np.int64)
+        np.add.at(confusion, (labels, predictions), 1)
+
+        # Predictions below the threshold would be left for review instead of acted on
+        covered = confidences >= threshold
+
+        classes = {}
+        for index, class_name in enumerate(class_names):
+            true_positives = confusion[index, index]
+            classes[class_name] = {
+                "support": int(confusion[index].sum()),
+                "precision": float(true_positives / confusion[:, index].sum()) if confusion[:, index].sum() else None,
+                "recall": float(true_positives / confusion[index].sum()) if confusion[index].sum() else None
+            }
+
+        return {
+            "images": int(len(labels)),
+            "accuracy": float(np.mean(predictions == labels)),
+            "threshold": threshold,
+            "coverage": float(np.mean(covered)),
+            "covered_accuracy": float(np.mean(predictions[covered] == labels[covered])) if covered.any() else None,
+            "classes": classes,
+            "confusion": confusion.tolist(),
+            "class_names": list(class_names)
+        }
+
+    # Method which logs the evaluation results as tables
+    def log_results(self, results):
+        self.log_message("Evaluated {} images, accuracy {:.1f}%".format(results["images"], results["accuracy"] * 100))
+
+        if results["covered_accuracy"] is not None:
+            self.log_message("Above the threshold {:.2f}: coverage {:.1f}%, accuracy {:.1f}%".format(
+                results["threshold"], results["coverage"] * 100, results["covered_accuracy"] * 100))
+
+        self.log_message("{:<24}{:>9}{:>11}{:>9}".format("Class", "Support", "Precision", "Recall"))
+        for class_name, result in results["classes"].items():
+            self.log_message("{:<24}{:>9}{:>11}{:>9}".format(
+                class_name[:23],
+                result["support"],
+                "-" if result["precision"] is None else "{:.2f}".format(result["precision"]),
+                "-" if result["recall"] is None else "{:.2f}".format(result["recall"])))
+
+        self.log_message("Confusion matrix (rows are labels, columns are predictions):")
+        for class_name, row in zip(results["class_names"], results["confusion"]):
+            self.log_message("{:<24}{}".format(class_name[:23], "".join("{:>7}".format(count) for count in row)))
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+
+# Content hashes of files which have not changed since they were last hashed
+file_hashes = {}
+file_hashes_lock = threading.Lock()
+
+
+# Function which returns the SHA-256 hash of a file's content, rehashing only when its size or mtime changes
+def file_hash(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    with file_hashes_lock:
+        if key in file_hashes:
+            return file_hashes[key]
+
+    content_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            content_hash.update(block)
+
+    with file_hashes_lock:
+        file_hashes[key] = content_hash.hexdigest()
+
+    return file_hashes[key]
+
+
+class PredictionCache:
+    # Persistent model outputs keyed by model content, preprocessing and image content stored in SQLite
+
+    def __init__(self, configuration, log_message):
+        self.configuration = configuration
+        self.log_message = log_message
+        self.cache_path = os.path.expanduser(configuration.prediction_cache_path)
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "model_hash TEXT, preprocessing TEXT, image_hash TEXT, outputs BLOB, "
+                "PRIMARY KEY (model_hash, preprocessing, image_hash)) WITHOUT ROWID")
+
+    # Method which opens a connection, one per call so the cache can be used from any thread or process
+    def connect(self):
+        return sqlite3.connect(self.cache_path, timeout=30)
+
+    # Method which returns the cached outputs of the image hashes that have been predicted before
+    def get_outputs(self, model_hash, preprocessing, image_hashes):
+        outputs = {}
+
+        with closing(self.connect()) as connection:
+            for start in range(0, len(image_hashes), 500):
+                batch_hashes = image_hashes[start:start + 500]
+                rows = connection.execute(
+                    "SELECT image_hash, outputs FROM predictions WHERE model_hash = ? AND preprocessing = ? "
+                    "AND image_hash IN ({})".format(",".join("?" * len(batch_hashes))),
+                    [model_hash, preprocessing] + batch_hashes)
+
+                outputs.update((image_hash, np.frombuffer(blob, dtype=np.float32)) for image_hash, blob in rows)
+
+        return outputs
+
+    # Method which stores the outputs of the image hashes
+    def put_outputs(self, model_hash, preprocessing, image_outputs):
+        with closing(self.connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                [(model_hash, preprocessing, image_hash, np.asarray(output, dtype=np.float32).tobytes())
+                 for image_hash, output in image_outputs.items()])
+
+    # Method which returns the outputs of the images, only the images missing from the cache are predicted
+    def predict(self, model_path, image_paths, preprocessing, predict_missing):
+
+        if not image_paths:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        model_hash = file_hash(model_path)
+        image_hashes = [file_hash(image_path) for image_path in image_paths]
+        outputs = self.get_outputs(model_hash, preprocessing, list(set(image_hashes)))
+
+        missing_paths = {}
+        for image_path, image_hash in zip(image_paths, image_hashes):
+            if image_hash not in outputs:
+                missing_paths.setdefault(image_hash, image_path)
+
+        self.log_message("Prediction cache hits: {} of {} images".format(
+            len(image_paths) - sum(image_hash in missing_paths for image_hash in image_hashes), len(image_paths)))
+
+        # The model is only loaded when something is missing
+        if missing_paths:
+            missing_outputs = dict(zip(missing_paths, predict_missing(list(missing_paths.values()))))
+            self.put_outputs(model_hash, preprocessing, missing_outputs)
+            outputs.update(missing_outputs)
+
+        return np.stack([outputs[image_hash] for image_hash in image_hashes])
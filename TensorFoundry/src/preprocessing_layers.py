@@ -0,0 +1,62 @@
+import tensorflow as tf
+
+from image_processing import LCG_INCREMENT, LCG_MULTIPLIER
+
+
+# Layer which crops the top bar off raw screenshots the same way as save_dataset_image does
+class ScreenshotCrop(tf.keras.layers.Layer):
+
+    def call(self, inputs):
+        height = tf.shape(inputs)[1]
+
+        # Integer arithmetic matches int(height * 0.05) for every screenshot height
+        top_crop = height * 5 // 100
+        return inputs[:, top_crop:, :, :]
+
+
+# Layer which augments resized screenshots with a task index the same way as augment_image_task does
+class TaskAugmentation(tf.keras.layers.Layer):
+
+    def call(self, inputs):
+        images, tasks = inputs
+        tasks = tf.cast(tf.reshape(tasks, [-1, 1, 1, 1]), images.dtype)
+
+        # Only the lowest byte of the generator survives the final modulo, so the multiplier and increment
+        # reduce to their lowest bytes as well and the whole generator fits into float arithmetic
+        augmented = tf.math.floormod((LCG_MULTIPLIER % 256) * (images + tasks) + LCG_INCREMENT % 256, 256)
+
+        # The leading run of black pixels of the whole image walked column by column stays black, so the columns
+        # are flattened into a single walk before the running count of non-black pixels
+        not_black = tf.cast(tf.reduce_any(tf.not_equal(images, 0), axis=-1), images.dtype)
+        shape = tf.shape(not_black)
+        column_major = tf.reshape(tf.transpose(not_black, [0, 2, 1]), [shape[0], -1])
+        leading_black = tf.equal(tf.math.cumsum(column_major, axis=1), 0)
+        leading_black = tf.reshape(leading_black, [shape[0], shape[2], shape[1]])
+        leading_black = tf.expand_dims(tf.transpose(leading_black, [0, 2, 1]), -1)
+        augmented = tf.where(leading_black, tf.zeros_like(augmented), augmented)
+
+        # A negative task index leaves the screenshot untouched, which is used by the assert models
+        return tf.where(tasks >= 0, augmented, images)
+
+
+# Function which wraps a trained model so that it accepts raw screenshots and a task index
+def create_preprocessing_model(model, num_channels):
+    input_height, input_width = model.input_shape[1], model.input_shape[2]
+
+    screenshot = tf.keras.Input(shape=(None, None, num_channels), name="screenshot")
+    task = tf.keras.Input(shape=(), dtype="int32", name="task")
+
+    state = ScreenshotCrop(name="crop")(screenshot)
+    state = tf.keras.layers.Resizing(input_height, input_width, interpolation="nearest", name="resize")(state)
+    state = TaskAugmentation(name="task_augmentation")([state, task])
+
+    # The outputs are renamed after the heads of the wrapped model, otherwise they all take the name of the
+    # nested model
+    outputs = model(state)
+    if len(model.outputs) > 1:
+        outputs = [tf.keras.layers.Identity(name=output_name)(output)
+                   for output_name, output in zip(model.output_names, outputs)]
+    else:
+        outputs = tf.keras.layers.Identity(name=model.layers[-1].name)(outputs)
+
+    return tf.keras.Model(inputs=[screenshot, task], outputs=outputs, name=model.name + "_PREPROCESSING")
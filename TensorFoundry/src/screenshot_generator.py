@@ -0,0 +1,195 @@
+import multiprocessing
+import os
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from image_processing import DATASET_FORMATS, TOP_CROP_RATIO, augment_image_task, crop_resize_image, \
+    encode_dataset_image
+
+# Dataset layouts the generator can write
+LAYOUTS = ["source", "assert", "task"]
+
+# Size of the full source screenshots, matching the phones the source images are captured on
+SCREENSHOT_SIZE = (1080, 2400)
+
+# Size the dataset layouts draw their screenshots at before the crop and resize, a quarter of the phone
+# resolution loses nothing at the model input sizes and is sixteen times less to draw
+DATASET_SCREENSHOT_SIZE = (270, 600)
+
+# Images written by a worker process per job, large enough to hide the process overhead
+CHUNK_SIZE = 256
+
+# Characters of the text noise
+TEXT_CHARACTERS = string.ascii_letters + string.digits + "    "
+
+
+# Function which returns a random colour, light colours for backgrounds and saturated ones for widgets
+def random_color(random, light=False):
+    low = 200 if light else 0
+    return tuple(int(channel) for channel in random.integers(low, 256, 3))
+
+
+# Function which returns a line of random text
+def random_text(random, length):
+    return "".join(random.choice(list(TEXT_CHARACTERS), length))
+
+
+# Function which draws the screen of a class, the layout is fixed by the class while the text and scroll
+# position change with every image
+def draw_screenshot(screenshot_size, seed, class_index, image_index):
+    width, height = screenshot_size
+    scale = width / SCREENSHOT_SIZE[0]
+    layout = np.random.default_rng([seed, class_index])
+    noise = np.random.default_rng([seed, class_index, image_index])
+
+    image = Image.new("RGB", screenshot_size, random_color(layout, light=True))
+    draw = ImageDraw.Draw(image)
+    draw.font = ImageFont.load_default(max(8, int(40 * scale)))
+
+    # Content scrolls a little between captures of the same screen
+    scroll = int(noise.integers(0, 40) * scale)
+
+    # Layout blocks such as cards and pictures on a grid below the app bar
+    app_bar_bottom = int(height * TOP_CROP_RATIO) + int(160 * scale)
+    for _ in range(layout.integers(3, 7)):
+        left = int(layout.integers(0, 4) * width / 4)
+        top = app_bar_bottom + int(layout.integers(0, 12) * height / 16) - scroll
+        right = min(width, left + int(layout.integers(1, 5) * width / 4))
+        bottom = top + int(layout.integers(1, 4) * height / 16)
+        draw.rectangle((left + 8 * scale, top + 8 * scale, right - 8 * scale, bottom - 8 * scale),
+                       fill=random_color(layout))
+
+    # Text noise in lines between the blocks
+    line_height = max(12, int(48 * scale))
+    for top in range(app_bar_bottom + line_height - scroll, height - line_height, line_height * 3):
+        if noise.random() < 0.5:
+            draw.text((int(32 * scale), top), random_text(noise, int(noise.integers(8, 40))), fill=(40, 40, 40))
+
+    # Buttons at fixed places with their labels
+    for _ in range(layout.integers(1, 4)):
+        left = int(layout.integers(0, 3) * width / 3 + 24 * scale)
+        top = int(height * layout.uniform(0.5, 0.92))
+        draw.rounded_rectangle((left, top, left + width / 3 - 48 * scale, top + 120 * scale),
+                               radius=int(24 * scale), fill=random_color(layout))
+        draw.text((left + 24 * scale, top + 40 * scale), random_text(layout, 8), fill=(255, 255, 255))
+
+    # App bar with the screen title, drawn over the scrolled content
+    status_bar_bottom = int(height * TOP_CROP_RATIO)
+    draw.rectangle((0, status_bar_bottom, width, app_bar_bottom), fill=random_color(layout))
+    draw.text((int(48 * scale), status_bar_bottom + int(60 * scale)), "SCREEN {}".format(class_index),
+              fill=(255, 255, 255))
+
+    # Status bar with a clock and icons which differ on every capture and are cropped off the datasets
+    draw.rectangle((0, 0, width, status_bar_bottom), fill=(0, 0, 0))
+    draw.text((int(32 * scale), status_bar_bottom // 3), "{:02d}:{:02d}".format(
+        int(noise.integers(0, 24)), int(noise.integers(0, 60))), fill=(255, 255, 255))
+    for icon in range(int(noise.integers(1, 5))):
+        left = width - int((icon + 1) * 60 * scale)
+        draw.rectangle((left, status_bar_bottom // 3, left + 36 * scale, status_bar_bottom * 2 // 3),
+                       fill=(255, 255, 255))
+
+    return image
+
+
+# Function which returns the class names of a layout
+def layout_class_names(layout, class_count):
+    prefix = {"source": "screen", "assert": "SCREEN", "task": "ACTION"}[layout]
+    return ["{}_{:03d}".format(prefix, class_index) for class_index in range(class_count)]
+
+
+# Function which returns the task names of the task layout
+def layout_task_names(task_count):
+    return ["TASK_{:02d}".format(task_index) for task_index in range(task_count)]
+
+
+# Function which writes a chunk of generated images, run in a worker process
+def write_images(target_folder, layout, start_index, end_index, class_count, task_count, input_size, num_channels,
+                 dataset_format, seed):
+    class_names = layout_class_names(layout, class_count)
+    task_names = layout_task_names(task_count)
+
+    for image_index in range(start_index, end_index):
+        class_index = image_index % class_count
+
+        if layout == "source":
+            image = draw_screenshot(SCREENSHOT_SIZE, seed, class_index, image_index)
+            image_path = os.path.join(target_folder, "synthetic_app", class_names[class_index] + "_view",
+                                      "Screenshot_{:07d}.png".format(image_index))
+        else:
+            image = crop_resize_image(draw_screenshot(DATASET_SCREENSHOT_SIZE, seed, class_index, image_index),
+                                      input_size)
+            image_name = "synthetic_{:07d}".format(image_index)
+
+            # The same screens need a different action for every task, so only the task augmentation tells them apart
+            if layout == "task":
+                task_index = (image_index // class_count) % task_count
+                image = augment_image_task(image, task_index)
+                class_index = (class_index + task_index) % class_count
+                image_name += "_" + task_names[task_index]
+
+            if num_channels == 1:
+                image = image.convert("L")
+
+            image_path = os.path.join(target_folder, class_names[class_index],
+                                      image_name + DATASET_FORMATS[dataset_format])
+
+        with open(image_path, "wb") as file:
+            file.write(encode_dataset_image(image, os.path.splitext(image_path)[1]))
+
+    return end_index - start_index
+
+
+# Function which generates a synthetic dataset in the source, assert or task layout with parallel writers, the
+# source screenshots are always PNG while the dataset layouts are written in the storage format
+def generate_dataset(target_folder, layout, image_count, class_count, task_count, input_size, num_channels, workers,
+                     log_message, seed=0, dataset_format="PNG"):
+    if layout not in LAYOUTS:
+        raise ValueError("Unknown layout: {}".format(layout))
+
+    if dataset_format not in DATASET_FORMATS:
+        raise ValueError("Unknown dataset format: {}".format(dataset_format))
+
+    if image_count < 1 or class_count < 1 or task_count < 1:
+        raise ValueError("The image, class and task counts must be positive")
+
+    # Folders are created up front so the workers never race on them
+    class_names = layout_class_names(layout, class_count)
+    for class_name in class_names:
+        if layout == "source":
+            os.makedirs(os.path.join(target_folder, "synthetic_app", class_name + "_view"), exist_ok=True)
+        else:
+            os.makedirs(os.path.join(target_folder, class_name), exist_ok=True)
+
+    if layout != "source":
+        with open(os.path.join(target_folder, "output_labels.txt"), 'w') as file:
+            for class_name in class_names: file.write(class_name + "\n")
+
+    if layout == "task":
+        with open(os.path.join(target_folder, "dataset_tasks.txt"), 'w') as file:
+            for task_name in layout_task_names(task_count): file.write(task_name + "\n")
+
+    log_message("Generating {} {} images of {} classes into: {}".format(image_count, layout, class_count,
+                                                                         target_folder))
+
+    # Every image is drawn from its own seed, so the output does not depend on the number of workers
+    chunks = [(target_folder, layout, start_index, min(start_index + CHUNK_SIZE, image_count), class_count,
+               task_count, input_size, num_channels, dataset_format, seed)
+              for start_index in range(0, image_count, CHUNK_SIZE)]
+
+    written_count = 0
+    logged_share = 0
+
+    # Spawned workers only import the imaging modules, never the GUI or TensorFlow
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for chunk_count in executor.map(write_images, *zip(*chunks)):
+            written_count += chunk_count
+
+            if written_count * 10 // image_count > logged_share:
+                logged_share = written_count * 10 // image_count
+                log_message("Generated {} of {} images".format(written_count, image_count))
+
+    return written_count
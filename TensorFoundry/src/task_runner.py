@@ -0,0 +1,226 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from tkinter import DoubleVar, StringVar, ttk
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    # Handle of a background job which the job reads its cancellation from and reports its progress to
+
+    def __init__(self, name, work, on_done, on_error, task_view, item_executor, item_workers):
+        self.name = name
+        self.work = work
+        self.on_done = on_done
+        self.on_error = on_error
+        self.task_view = task_view
+        self.item_executor = item_executor
+        self.item_workers = item_workers
+        self.cancel_event = threading.Event()
+        self.progress_lock = threading.Lock()
+        self.completed = 0
+        self.total = 0
+        self.future = None
+
+    # Method for requesting the job to stop at its next checkpoint
+    def cancel(self):
+        self.cancel_event.set()
+
+    # Method which raises TaskCancelled when the job has been cancelled
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+
+    # Method which updates the progress of the job, safe to call from any thread
+    def set_progress(self, completed, total=None):
+        with self.progress_lock:
+            self.completed = completed
+            if total is not None:
+                self.total = total
+
+    # Method which returns the completed and total item counts of the job
+    def progress(self):
+        with self.progress_lock:
+            return self.completed, self.total
+
+    # Method which runs a function over the items on the worker pool and returns the results in item order. At most
+    # one item per worker is queued at a time, so the items of jobs running side by side take turns on the pool.
+    def map(self, function, items):
+        items = list(items)
+        results = [None] * len(items)
+        self.set_progress(0, len(items))
+
+        pending = {}
+        next_index = 0
+
+        try:
+            while next_index < len(items) or pending:
+
+                while next_index < len(items) and len(pending) < self.item_workers:
+                    pending[self.item_executor.submit(function, items[next_index])] = next_index
+                    next_index += 1
+
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+
+                self.set_progress(next_index - len(pending))
+                self.check_cancelled()
+        finally:
+            for future in pending:
+                future.cancel()
+
+            # Items already running finish before the job goes on, so nothing writes after the job has ended
+            wait(pending)
+
+        return results
+
+
+class TaskRunner:
+    # Runs long operations off the Tk thread and hands their results back to it through app.after
+
+    def __init__(self, app, configuration, log_message):
+        self.app = app
+        self.configuration = configuration
+        self.log_message = log_message
+
+        # Jobs writing the dataset run one at a time in submission order so later jobs see the files written by
+        # earlier ones, the other jobs only feed the UI and run alongside them so they never hold up the writes
+        self.job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job")
+        self.background_executor = ThreadPoolExecutor(max_workers=configuration.worker_threads,
+                                                      thread_name_prefix="background")
+        self.item_executor = ThreadPoolExecutor(max_workers=configuration.worker_threads, thread_name_prefix="item")
+        self.tasks = []
+        self.task_views = []
+
+        # A single poll loop runs while there are jobs, a job queued from an on_done callback joins it
+        self.polling = False
+
+    # Method which queues a job, on_done is called on the Tk thread with the job result and on_error with the
+    # exception when the job fails or is cancelled. The job is shown on the task view which queued it. Jobs which
+    # do not write the dataset pass serial=False to run on the background executor.
+    def run(self, name, work, on_done=None, on_error=None, task_view=None, serial=True):
+        task = Task(name, work, on_done, on_error, task_view, self.item_executor, self.configuration.worker_threads)
+        task.future = (self.job_executor if serial else self.background_executor).submit(work, task)
+        self.tasks.append(task)
+
+        # Start polling when the first job is queued
+        if not self.polling:
+            self.polling = True
+            self.app.after(self.configuration.task_poll_rate, self.poll)
+
+        return task
+
+    # Method which cancels a job, a job which has not started yet never runs
+    def cancel(self, task):
+        task.cancel()
+        task.future.cancel()
+
+    # Method which returns whether any job is queued or running
+    def busy(self):
+        return len(self.tasks) > 0
+
+    # Method which registers a progress view to be updated while jobs run
+    def add_view(self, task_view):
+        task_view.task_runner = self
+        self.task_views.append(task_view)
+
+    # Method which hands finished jobs back to the Tk thread and refreshes the progress views
+    def poll(self):
+
+        # Jobs on the background executor may finish before older jobs, the serial jobs finish in order
+        for task in [task for task in self.tasks if task.future.done()]:
+            self.tasks.remove(task)
+            self.finish(task)
+
+        for task_view in self.task_views:
+            task_view.refresh([task for task in self.tasks if task.task_view is task_view])
+
+        if self.tasks:
+            self.app.after(self.configuration.task_poll_rate, self.poll)
+        else:
+            self.polling = False
+
+    # Method which delivers the result of a finished job, a cancelled job never delivers its result
+    def finish(self, task):
+        try:
+            if task.cancel_event.is_set():
+                raise TaskCancelled()
+
+            result = task.future.result()
+        except TaskCancelled as e:
+            self.log_message("{} cancelled".format(task.name))
+            if task.on_error:
+                task.on_error(e)
+            return
+        except Exception as e:
+            self.log_message("{} failed: {}".format(task.name, e))
+            if task.on_error:
+                task.on_error(e)
+            return
+
+        if task.on_done:
+            task.on_done(result)
+
+    # Method which cancels the remaining jobs and waits for the workers to stop
+    def close(self):
+        for task in self.tasks:
+            self.cancel(task)
+
+        self.job_executor.shutdown(wait=True, cancel_futures=True)
+        self.background_executor.shutdown(wait=True, cancel_futures=True)
+        self.item_executor.shutdown(wait=True, cancel_futures=True)
+
+
+class TaskView:
+    # Progress bar with a cancel button showing the oldest job queued from the view, the cancel button only cancels
+    # the shown job
+
+    def __init__(self, parent, configuration):
+        self.configuration = configuration
+        self.task_runner = None
+        self.task = None
+        self.progress_var = DoubleVar(value=0.0)
+        self.status_var = StringVar(value="")
+
+        self.frame = ttk.Frame(parent)
+        self.status_label = ttk.Label(self.frame, textvariable=self.status_var)
+        self.progress_bar = ttk.Progressbar(self.frame, orient="horizontal", mode="determinate",
+                                            variable=self.progress_var, maximum=1.0)
+        self.cancel_button = ttk.Button(self.frame, text="Cancel", command=self.cancel_button,
+                                        width=configuration.app_button_size, state="disabled")
+
+        self.status_label.pack(side="top", anchor="nw", fill="x")
+        self.cancel_button.pack(side="right", padx=configuration.app_padding)
+        self.progress_bar.pack(side="left", fill="x", expand=True)
+
+    # Method for placing the view in its parent
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def cancel_button(self):
+        if self.task_runner and self.task:
+            self.task_runner.cancel(self.task)
+
+    # Method which shows the progress of the oldest job of the view, or an idle bar when the view has no jobs
+    def refresh(self, tasks):
+        self.task = tasks[0] if tasks else None
+        task = self.task
+
+        if task is None:
+            self.progress_var.set(0.0)
+            self.status_var.set("")
+            self.cancel_button.configure(state="disabled")
+            return
+
+        completed, total = task.progress()
+        self.progress_var.set(completed / total if total else 0.0)
+        self.cancel_button.configure(state="normal")
+
+        status = "{}: {}/{}".format(task.name, completed, total) if total else "{}...".format(task.name)
+        if len(tasks) > 1:
+            status += " ({} queued)".format(len(tasks) - 1)
+        self.status_var.set(status)
@@ -1,65 +1,207 @@
 import os
 
-import tensorflow as tf
-from tensorflow.python.data import AUTOTUNE
+import numpy as np
+
+from dataset_scanner import FORMAT_LOADER_TYPES, SCANNED_IMAGE_TYPES, DatasetScanner
+from image_processing import open_dataset_image, walk_visible
+from lazy_imports import LazyModule
+
+tf = LazyModule("tensorflow")
+
+# Seed of the validation split so the same images are held out on every run
+VALIDATION_SEED = 1337
 
 
 class DataSet:
 
-    def __init__(self, configuration, log_message, plot_dataset, input_size):
+    def __init__(self, configuration, log_message, input_size):
         self.configuration = configuration
         self.log_message = log_message
-        self.plot_dataset = plot_dataset
         self.input_size = input_size
         self.batch_size = 32
 
-    # Method which creates the test datasets for supervised training
+    # Method which creates the training and validation datasets for supervised training, the validation
+    # dataset is None when VALIDATION_SPLIT is zero
     def create_datasets(self, path, class_names):
 
         # Sanity check to make sure there is sufficient training data
         file_count = 0
-        for _, _, files in os.walk(path):
+        file_types = set()
+        for _, _, files in walk_visible(path):
             file_count += len(files)
+            file_types.update(os.path.splitext(file)[1].lower() for file in files)
 
         if file_count < self.configuration.min_dataset_size:
             self.log_message("Too few dataset files detected for training, needs contain at least {} -files!".format(
                 self.configuration.min_dataset_size))
             return None
 
-        # Create the training dataset
+        # Decode and validate every image first, so a broken file is reported before the job starts
+        dataset_scanner = DatasetScanner(self.configuration, self.log_message)
+        scan_report = dataset_scanner.scan_dataset(path, class_names, self.input_size)
+        dataset_scanner.log_report(scan_report)
+
+        if scan_report["errors"]:
+            self.log_message("The dataset has {} errors, fix them before training!".format(scan_report["errors"]))
+            return None
+
+        validation_split = self.configuration.validation_split
+
+        if file_types & FORMAT_LOADER_TYPES:
+            training_dataset, validation_dataset = self.create_format_datasets(path, class_names, validation_split)
+            return training_dataset.prefetch(buffer_size=tf.data.AUTOTUNE), (
+                None if validation_dataset is None else validation_dataset.prefetch(buffer_size=tf.data.AUTOTUNE))
+
+        # Create the training dataset and hold out the validation images with a fixed seed, so the same images
+        # are held out on every run
         try:
-            training_dataset = tf.keras.utils.image_dataset_from_directory(
-                path,
-                image_size=(self.input_size[0], self.input_size[1]),
-                batch_size=self.batch_size,
-                class_names=class_names
-            )
+            if validation_split > 0:
+                training_dataset, validation_dataset = tf.keras.utils.image_dataset_from_directory(
+                    path,
+                    image_size=(self.input_size[0], self.input_size[1]),
+                    batch_size=self.batch_size,
+                    class_names=class_names,
+                    validation_split=validation_split,
+                    subset="both",
+                    seed=VALIDATION_SEED
+                )
+            else:
+                training_dataset = tf.keras.utils.image_dataset_from_directory(
+                    path,
+                    image_size=(self.input_size[0], self.input_size[1]),
+                    batch_size=self.batch_size,
+                    class_names=class_names
+                )
+                validation_dataset = None
         except:
             self.log_message("Error creating dataset, please check model and dataset output compatibility!")
             return None
 
-        # Plotting the dataset
-        self.plot_dataset(training_dataset)
-
         # Optimizing the datasets for training
-        training_dataset = training_dataset.cache().prefetch(buffer_size=AUTOTUNE)
+        training_dataset = training_dataset.cache().prefetch(buffer_size=tf.data.AUTOTUNE)
+
+        if validation_dataset is not None:
+            validation_dataset = validation_dataset.cache().prefetch(buffer_size=tf.data.AUTOTUNE)
+
+        return training_dataset, validation_dataset
+
+    # Method which creates the training and validation datasets of a dataset stored in any of the storage formats,
+    # splitting the images the same way as the Keras directory loader
+    def create_format_datasets(self, path, class_names, validation_split):
+        image_paths = []
+        labels = []
+
+        for label, class_name in enumerate(class_names):
+            for root, dirs, files in sorted(walk_visible(os.path.join(path, class_name))):
+                class_images = [os.path.join(root, file) for file in sorted(files)
+                                if file.lower().endswith(SCANNED_IMAGE_TYPES)]
+                image_paths += class_images
+                labels += [label] * len(class_images)
+
+        self.log_message("Found {} files belonging to {} classes.".format(len(image_paths), len(class_names)))
+
+        # Shuffle once with the validation seed and hold out the tail, so the same images are held out on every run
+        order = np.random.RandomState(VALIDATION_SEED).permutation(len(image_paths))
+        image_paths = [image_paths[index] for index in order]
+        labels = [labels[index] for index in order]
+        validation_count = int(validation_split * len(image_paths))
+        training_count = len(image_paths) - validation_count
+
+        training_dataset = self.create_format_dataset(image_paths[:training_count], labels[:training_count], True)
+
+        if validation_count == 0:
+            return training_dataset, None
+
+        return training_dataset, self.create_format_dataset(
+            image_paths[training_count:], labels[training_count:], False)
+
+    # Method which decodes the images of a subset once into the cache and batches them
+    def create_format_dataset(self, image_paths, labels, shuffle):
+        height, width, channels = self.input_size[1], self.input_size[0], self.input_size[2]
+
+        # The scan has checked every image has the input size and channels, so no image needs resizing
+        def decode_tensorflow(image_path):
+            return tf.io.decode_image(tf.io.read_file(image_path), channels=channels, expand_animations=False)
+
+        # Pillow decodes WebP as not every TensorFlow build can
+        def decode_webp(image_path):
+            def read_pixels(path):
+                with open_dataset_image(path.decode()) as image:
+                    return np.asarray(image.convert("L" if channels == 1 else "RGB"), dtype=np.uint8)
+
+            return tf.numpy_function(read_pixels, [image_path], tf.uint8)
+
+        # The pixels of a version 1 .npy file follow a header whose length is stored in bytes 8 and 9
+        def decode_npy(image_path):
+            data = tf.io.read_file(image_path)
+            header_length = tf.cast(tf.io.decode_raw(tf.strings.substr(data, 8, 2), tf.uint16)[0], tf.int32)
+            return tf.io.decode_raw(tf.strings.substr(data, 10 + header_length, height * width * channels), tf.uint8)
+
+        decoders = {".webp": decode_webp, ".npy": decode_npy}
+        decoder_images = {}
+
+        for image_path, label in zip(image_paths, labels):
+            decode = decoders.get(os.path.splitext(image_path)[1].lower(), decode_tensorflow)
+            decoder_images.setdefault(decode, ([], []))
+            decoder_images[decode][0].append(image_path)
+            decoder_images[decode][1].append(label)
+
+        # Each storage format is read by its own map, a single map choosing the decoder per image is much slower
+        dataset = None
+        for decode, (decoder_paths, decoder_labels) in decoder_images.items():
+            decoder_dataset = tf.data.Dataset.from_tensor_slices((decoder_paths, decoder_labels)).map(
+                lambda image_path, label, decode=decode: (
+                    tf.reshape(decode(image_path), (height, width, channels)), label),
+                num_parallel_calls=tf.data.AUTOTUNE)
+            dataset = decoder_dataset if dataset is None else dataset.concatenate(decoder_dataset)
+
+        # The decoded pixels are cached as bytes before the shuffle, so every epoch sees a new order, and only
+        # cast to floats like the Keras directory loader returns them once batched
+        dataset = dataset.cache()
+
+        if shuffle:
+            dataset = dataset.shuffle(self.batch_size * 8, seed=VALIDATION_SEED, reshuffle_each_iteration=True)
+
+        return dataset.batch(self.batch_size).map(lambda images, labels: (tf.cast(images, tf.float32), labels))
+
+    # Method which combines the task and assert datasets for training a multi-head model
+    def create_multihead_datasets(self, task_path, task_names, assert_path, assert_names, task_count):
+
+        task_datasets = self.create_datasets(task_path, task_names)
+        assert_datasets = self.create_datasets(assert_path, assert_names)
+
+        if task_datasets is None or assert_datasets is None:
+            return None
+
+        training_dataset = self.combine_multihead_datasets(task_datasets[0], assert_datasets[0], task_count)
+
+        if task_datasets[1] is None:
+            return training_dataset, None
+
+        return training_dataset, self.combine_multihead_datasets(task_datasets[1], assert_datasets[1], task_count)
+
+    # Method which interleaves task and assert images with per-head sample weights
+    def combine_multihead_datasets(self, task_dataset, assert_dataset, task_count):
+
+        # Task images only train the task head and assert images only train the assert head
+        task_dataset = task_dataset.unbatch().map(
+            lambda image, label: (image, (label, tf.zeros_like(label)), (tf.constant(1.0), tf.constant(0.0))))
 
-        return training_dataset
+        from preprocessing_layers import TaskAugmentation
 
-    # Method which loads a single image and labels to test a model's output
-    def create_test_data(self, model_name, model_path, image_path):
+        # On device both heads see the same task augmented screenshot, so the assert images are augmented
+        # with a random task index, where -1 leaves the image untouched
+        task_augmentation = TaskAugmentation()
 
-        # Load the image and format it into a state for model input
-        image = tf.keras.utils.load_img(image_path,
-                                        target_size=(self.input_size[0], self.input_size[1], self.input_size[2]))
-        test_state = tf.keras.utils.img_to_array(image)
-        test_state = tf.expand_dims(test_state, 0)  # Create batch axis
+        def augment_assert_batch(images, labels):
+            tasks = tf.random.uniform([tf.shape(images)[0]], minval=-1, maxval=task_count, dtype=tf.int32)
+            return task_augmentation([images, tasks]), labels
 
-        # Path to the file where the class names are saved
-        labels_path = os.path.join(os.path.dirname(model_path), f"{model_name}_output_labels.txt")
+        assert_dataset = assert_dataset.map(augment_assert_batch).unbatch().map(
+            lambda image, label: (image, (tf.zeros_like(label), label), (tf.constant(0.0), tf.constant(1.0))))
 
-        # Read the class names from the file into a list
-        with open(labels_path, 'r') as file:
-            class_names = [line.strip() for line in file]
+        # Interleave the samples so every batch trains both heads
+        combined_dataset = tf.data.Dataset.sample_from_datasets(
+            [task_dataset, assert_dataset], stop_on_empty_dataset=False)
 
-        return test_state, class_names
+        return combined_dataset.batch(self.batch_size).prefetch(buffer_size=tf.data.AUTOTUNE)
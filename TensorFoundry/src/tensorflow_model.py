@@ -1,31 +1,39 @@
+import math
 import os
-import tensorflow as tf
-import coremltools as ct
 
+import numpy as np
 
-class TensorflowModel(tf.Module):
+from image_processing import TOP_CROP_RATIO, capture_state
+from lazy_imports import LazyModule
+from model_architectures import Architecture, create_backbone
+from model_cost import estimate_model_cost, log_cost_header, log_cost_row, log_model_cost
+from prediction_cache import PredictionCache
+
+# TensorFlow and CoreMLTools are only imported on first use to keep the application startup fast
+tf = LazyModule("tensorflow")
+ct = LazyModule("coremltools")
+
+
+class TensorflowModel:
 
     def __init__(self, configuration, log_message, refresh_application):
-        super().__init__()
         self.configuration = configuration
         self.log_message = log_message
         self.refresh_application = refresh_application
         self.stop_training = False
+        self.prediction_cache = None
+
+    # Method which builds a supervised model from the selected architecture
+    def build_model(self, input_size, output_size, architecture, width_multiplier):
+        return tf.keras.Sequential(
+            create_backbone(architecture, input_size, self.configuration.num_channels, width_multiplier) +
+            [tf.keras.layers.Dense(output_size, activation='softmax', name="output")]
+        )
 
     # Method for creating the model
-    def create_model(self, input_size, output_size, model_path, output_names):
-        self.model = tf.keras.Sequential([
-            tf.keras.layers.Rescaling(1. / 255, input_shape=(input_size, input_size, self.configuration.num_channels)),
-            tf.keras.layers.Conv2D(16, 3, padding='same', activation='relu'),
-            tf.keras.layers.MaxPooling2D(),
-            tf.keras.layers.Conv2D(32, 3, padding='same', activation='relu'),
-            tf.keras.layers.MaxPooling2D(),
-            tf.keras.layers.Conv2D(64, 3, padding='same', activation='relu'),
-            tf.keras.layers.MaxPooling2D(),
-            tf.keras.layers.Flatten(),
-            tf.keras.layers.Dense(128, activation='relu'),
-            tf.keras.layers.Dense(output_size, activation='softmax', name="output")
-        ])
+    def create_model(self, input_size, output_size, model_path, output_names,
+                     architecture=Architecture.CONV_FLATTEN, width_multiplier=1.0):
+        self.model = self.build_model(input_size, output_size, architecture, width_multiplier)
 
         # Set the name for the model
         self.model.name = "SUPERVISED"
@@ -36,18 +44,149 @@ class TensorflowModel(tf.Module):
         # Compile the model
         self.compile_model()
 
+        # Report the cost of the model at the chosen input size
+        log_model_cost(self.model, self.log_message, width_multiplier=width_multiplier)
+
         # Finally save the model
         self.save_model(model_path, output_names)
 
-    # Method for compiling the model
-    def compile_model(self):
-        self.model.compile(
-            optimizer='adam',
+    # Method for creating a model with a shared backbone and separate task and assert heads
+    def create_multihead_model(self, input_size, task_names, assert_names, model_path,
+                               architecture=Architecture.CONV_FLATTEN, width_multiplier=1.0):
+        backbone = create_backbone(architecture, input_size, self.configuration.num_channels, width_multiplier)
+
+        inputs = backbone[0]
+        features = inputs
+        for layer in backbone[1:]:
+            features = layer(features)
+
+        self.model = self.create_multihead_outputs(inputs, features, len(task_names), len(assert_names))
+
+        # Print model summary
+        self.model.summary()
+
+        # Compile the model
+        self.compile_multihead_model()
+
+        # Report the cost of the model at the chosen input size
+        log_model_cost(self.model, self.log_message, width_multiplier=width_multiplier)
+
+        # Finally save the model
+        self.save_multihead_model(model_path, task_names, assert_names)
+
+    # Method which adds the task and assert heads on top of the shared backbone features
+    def create_multihead_outputs(self, inputs, features, task_size, assert_size):
+        task_output = tf.keras.layers.Dense(task_size, activation='softmax', name="task_output")(features)
+        assert_output = tf.keras.layers.Dense(assert_size, activation='softmax', name="assert_output")(features)
+
+        return tf.keras.Model(inputs=inputs, outputs=[task_output, assert_output], name="MULTIHEAD")
+
+    # Method which tabulates the cost of candidate input sizes and architectures before committing to one. The swept
+    # models are thrown away and the created model is kept, the optional task reports the progress of the sweep.
+    def sweep_model_costs(self, input_sizes, architectures, width_multipliers, output_size, task=None):
+        costs = []
+        sweep_count = len(input_sizes) * len(architectures) * len(width_multipliers)
+
+        self.log_message("Sweeping the cost of {} model configurations...".format(sweep_count))
+        log_cost_header(self.log_message)
+
+        for architecture in architectures:
+            for width_multiplier in width_multipliers:
+                for input_size in input_sizes:
+                    if task:
+                        task.set_progress(len(costs), sweep_count)
+                        task.check_cancelled()
+
+                    model = self.build_model(input_size, output_size, architecture, width_multiplier)
+                    model.name = architecture.name
+                    self.compile_model(model)
+
+                    cost = estimate_model_cost(model)
+                    cost["architecture"] = architecture.name
+                    cost["width_multiplier"] = width_multiplier
+                    costs.append(cost)
+
+                    log_cost_row(cost, self.log_message, width_multiplier)
+
+        return costs
+
+    # Method for compiling the created model, or another model when given
+    def compile_model(self, model=None):
+        if model is None:
+            model = self.model
+
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=self.configuration.learning_rate),
             loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
             metrics=['accuracy'])
 
+    # Method for compiling the multi-head model
+    def compile_multihead_model(self):
+        self.model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=self.configuration.learning_rate),
+            loss={
+                "task_output": tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+                "assert_output": tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True)
+            },
+            metrics={
+                "task_output": ['accuracy'],
+                "assert_output": ['accuracy']
+            })
+
+    # Method which creates the training callbacks for the progress, early stopping and learning rate schedule
+    def create_training_callbacks(self, model_path, epoch_count, validation_dataset, plot_results, profile_steps=0):
+
+        from training_callback import TrainingCallback
+        from training_profiler import TrainingProfiler
+        from training_telemetry import TrainingTelemetry
+
+        # Without a validation split the training loss is the only metric left to monitor
+        monitor = "val_loss" if validation_dataset is not None else "loss"
+        configuration = self.configuration
+
+        callbacks = [TrainingCallback(self.log_message, self.refresh_application, plot_results,
+                                      self.stop_training_check, configuration.training_time_limit * 60)]
+
+        # Step timing, input wait and memory of the run for comparing runs and machines
+        if configuration.telemetry_path:
+            model_name = os.path.splitext(os.path.basename(model_path))[0]
+            callbacks.append(TrainingTelemetry(self.log_message, configuration.telemetry_path, model_name))
+
+        # The first batches are skipped as they include tracing the train step
+        if profile_steps > 0:
+            callbacks.append(TrainingProfiler(self.log_message, model_path, configuration.profile_start_batch,
+                                              profile_steps))
+
+        # The best weights are restored at the end of training however it stops
+        if configuration.early_stopping_patience > 0:
+            callbacks.append(tf.keras.callbacks.EarlyStopping(
+                monitor=monitor, patience=configuration.early_stopping_patience, restore_best_weights=True))
+
+        if configuration.lr_schedule == "PLATEAU":
+            callbacks.append(tf.keras.callbacks.ReduceLROnPlateau(
+                monitor=monitor, factor=configuration.lr_plateau_factor,
+                patience=configuration.lr_plateau_patience, min_lr=configuration.lr_minimum))
+
+        elif configuration.lr_schedule == "COSINE":
+            callbacks.append(tf.keras.callbacks.LearningRateScheduler(
+                lambda epoch: configuration.lr_minimum + 0.5 * (configuration.learning_rate - configuration.lr_minimum)
+                * (1 + math.cos(math.pi * epoch / epoch_count))))
+
+        return callbacks
+
+    # Method which logs where early stopping ended the training
+    def log_early_stopping(self, callbacks):
+        for callback in callbacks:
+            if isinstance(callback, tf.keras.callbacks.EarlyStopping) and callback.best_weights is not None:
+                if callback.stopped_epoch > 0:
+                    self.log_message("Early stopping at epoch {} as {} stopped improving".format(
+                        callback.stopped_epoch, callback.monitor))
+
+                self.log_message("Restored the weights of the best epoch {}".format(callback.best_epoch))
+
     # Method for training a supervised model
-    def train_model(self, model_path, epochs, training_dataset, class_names, plot_results):
+    def train_model(self, model_path, epochs, training_dataset, validation_dataset, class_names, plot_results,
+                    profile_steps=0):
 
         # Load a model and set as the current model
         self.model = tf.keras.models.load_model(model_path)
@@ -56,21 +195,129 @@ class TensorflowModel(tf.Module):
         self.model.pop()
         self.model.add(tf.keras.layers.Dense(len(class_names), activation='softmax', name="output"))
         self.compile_model()
+        callbacks = self.create_training_callbacks(model_path, epochs, validation_dataset, plot_results,
+                                                   profile_steps)
 
         # Train the model
-        self.log_message("Starting the supervised training sequence with {} epochs!".format(epochs.get()))
+        self.log_message("Starting the supervised training sequence with {} epochs!".format(epochs))
         self.model.fit(training_dataset,
-                       validation_data=training_dataset,
-                       epochs=epochs.get(),
-                       callbacks=[TrainingCallback(
-                           self.log_message, self.refresh_application, plot_results, self.stop_training_check)])
-
-        loss, accuracy = self.model.evaluate(training_dataset, verbose=2)
-        self.log_message("Model test dataset accuracy: {:5.2f}% and loss: {:5.4f}".format(100 * accuracy, loss))
+                       validation_data=validation_dataset,
+                       epochs=epochs,
+                       callbacks=callbacks)
+        self.log_early_stopping(callbacks)
+
+        # Evaluate on the held out images when there are any
+        if validation_dataset is not None:
+            loss, accuracy = self.model.evaluate(validation_dataset, verbose=2)
+            self.log_message("Model validation dataset accuracy: {:5.2f}% and loss: {:5.4f}".format(
+                100 * accuracy, loss))
+        else:
+            loss, accuracy = self.model.evaluate(training_dataset, verbose=2)
+            self.log_message("Model training dataset accuracy: {:5.2f}% and loss: {:5.4f}".format(
+                100 * accuracy, loss))
 
         # Save the trained model
         self.save_model(model_path, class_names)
 
+    # Method for training the shared backbone and both heads of a multi-head model
+    def train_multihead_model(self, model_path, epochs, training_dataset, validation_dataset, task_names,
+                              assert_names, plot_results, profile_steps=0):
+
+        # Load a model and set as the current model
+        self.model = tf.keras.models.load_model(model_path)
+        self.log_message("Beginning training of multi-head model: {}".format(model_path))
+
+        # Rebuild the heads if the dataset outputs do not match the model outputs
+        if (self.model.get_layer("task_output").units != len(task_names) or
+                self.model.get_layer("assert_output").units != len(assert_names)):
+            features = self.model.get_layer("task_output").input
+            self.model = self.create_multihead_outputs(self.model.input, features, len(task_names), len(assert_names))
+
+        self.compile_multihead_model()
+        callbacks = self.create_training_callbacks(model_path, epochs, validation_dataset, plot_results,
+                                                   profile_steps)
+
+        # Train the model
+        self.log_message("Starting the multi-head training sequence with {} epochs!".format(epochs))
+        self.model.fit(training_dataset,
+                       validation_data=validation_dataset,
+                       epochs=epochs,
+                       callbacks=callbacks)
+        self.log_early_stopping(callbacks)
+
+        evaluation_dataset = validation_dataset if validation_dataset is not None else training_dataset
+        results = self.model.evaluate(evaluation_dataset, verbose=2, return_dict=True)
+        self.log_message(
+            "Model evaluation dataset task accuracy: {:5.2f}%, assert accuracy: {:5.2f}% and loss: {:5.4f}".format(
+                100 * results["task_output_accuracy"], 100 * results["assert_output_accuracy"], results["loss"]))
+
+        # Save the trained model
+        self.save_multihead_model(model_path, task_names, assert_names)
+
+    # Method for distilling a trained teacher model into a smaller student model of another architecture, the
+    # student is saved as a supervised model with the teacher labels and can be converted like any other model
+    def distill_model(self, teacher_path, student_path, epochs, training_dataset, validation_dataset, class_names,
+                      architecture, width_multiplier, plot_results, temperature=None, alpha=None):
+
+        from model_distillation import DistillationModel, log_distillation_report, measure_agreement, \
+            measure_model_size
+
+        temperature = self.configuration.distillation_temperature if temperature is None else temperature
+        alpha = self.configuration.distillation_alpha if alpha is None else alpha
+
+        if not student_path.lower().endswith(".keras"):
+            student_path += ".keras"
+
+        teacher = tf.keras.models.load_model(teacher_path)
+
+        if len(teacher.outputs) > 1:
+            self.log_message("Only supervised models with a single output can be distilled!")
+            return None
+
+        if teacher.output_shape[-1] != len(class_names):
+            self.log_message("The teacher has {} outputs but the dataset has {} outputs!".format(
+                teacher.output_shape[-1], len(class_names)))
+            return None
+
+        # The student reads the same dataset images as the teacher
+        student = self.build_model(teacher.input_shape[1], len(class_names), architecture, width_multiplier)
+        student.name = "SUPERVISED"
+
+        self.model = DistillationModel(student, teacher, temperature, alpha)
+        self.model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=self.configuration.learning_rate),
+            metrics=['accuracy'])
+        callbacks = self.create_training_callbacks(student_path, epochs, validation_dataset, plot_results)
+
+        self.log_message("Distilling model: {} into a {} student with width {} at temperature {}".format(
+            teacher_path, architecture.name, width_multiplier, temperature))
+        self.model.fit(training_dataset,
+                       validation_data=validation_dataset,
+                       epochs=epochs,
+                       callbacks=callbacks)
+        self.log_early_stopping(callbacks)
+
+        # Save the student on its own so it converts and loads like a trained supervised model
+        self.model = student
+        self.save_model(student_path, class_names)
+
+        evaluation_dataset = validation_dataset if validation_dataset is not None else training_dataset
+        report = {
+            "teacher_path": teacher_path,
+            "student_path": student_path,
+            "architecture": architecture.name,
+            "width_multiplier": width_multiplier,
+            "temperature": temperature,
+            "alpha": alpha,
+            "evaluation": "validation" if validation_dataset is not None else "training",
+            "teacher": measure_model_size(teacher, teacher_path),
+            "student": measure_model_size(student, student_path),
+            "agreement": measure_agreement(teacher, student, evaluation_dataset)
+        }
+
+        log_distillation_report(report, self.log_message)
+        return report
+
     # Method for returning the current status of the stop training to the callback
     def stop_training_check(self):
         return self.stop_training
@@ -79,28 +326,96 @@ class TensorflowModel(tf.Module):
     def get_model_input(self, model_path):
         return tf.keras.models.load_model(model_path).input_shape[1:]
 
-    # Method for testing the model
-    def test_model(self, model_path, test_state, class_names):
+    # Method which loads a model to keep serving and runs it once at the single and largest batch size, so the
+    # first requests do not pay for building the model
+    def load_serving_model(self, model_path, max_batch_size):
+        model = tf.keras.models.load_model(model_path)
 
-        # Load a model and set as the current model
-        self.model = tf.keras.models.load_model(model_path)
-        predictions = self.model.predict(test_state)
+        for batch_size in sorted({1, max_batch_size}):
+            model(np.zeros((batch_size,) + model.input_shape[1:], dtype=np.float32), training=False)
+
+        return model
+
+    # Method for testing the model
+    def test_model(self, model_path, image_path, class_names):
+        predictions = self.predict_cached(model_path, [image_path], "load_img|nearest", self.load_test_state)
 
         self.log_message("Predicted values:")
         for i, value in enumerate(predictions[0]):
             self.log_message(f"{class_names[i]}: {value:.4f}")
 
+    # Method which loads a single image into a state for model input
+    def load_test_state(self, image_path, input_size):
+        image = tf.keras.utils.load_img(image_path, target_size=(input_size[0], input_size[1]))
+        return np.expand_dims(tf.keras.utils.img_to_array(image), 0)
+
+    # Method which returns the prediction cache, created on first use
+    def get_prediction_cache(self):
+        if self.prediction_cache is None:
+            self.prediction_cache = PredictionCache(self.configuration, self.log_message)
+
+        return self.prediction_cache
+
+    # Method which predicts the outputs of images in batches, images predicted before come from the prediction cache
+    # without loading the model. The preprocessing names how load_state turns an image into a state.
+    def predict_cached(self, model_path, image_paths, preprocessing, load_state, task=None, batch_size=32):
+
+        def predict_missing(missing_paths):
+            model = tf.keras.models.load_model(model_path)
+            input_size = model.input_shape[1:]
+            outputs = []
+
+            if task:
+                task.set_progress(0, len(missing_paths))
+
+            for start in range(0, len(missing_paths), batch_size):
+                states = np.concatenate([load_state(image_path, input_size)
+                                         for image_path in missing_paths[start:start + batch_size]])
+                outputs.append(model(states, training=False).numpy())
+
+                if task:
+                    task.set_progress(start + len(outputs[-1]))
+                    task.check_cancelled()
+
+            return np.concatenate(outputs)
+
+        return self.get_prediction_cache().predict(model_path, image_paths, preprocessing, predict_missing)
+
+    # Method which predicts the output index and confidence of screenshots in batches, run on the task runner
+    def predict_images(self, task, model_path, image_paths, task_index=None, batch_size=32):
+        outputs = self.predict_cached(
+            model_path,
+            image_paths,
+            "capture_state|crop={}|task={}".format(TOP_CROP_RATIO, task_index),
+            lambda image_path, input_size: capture_state(image_path, input_size, task_index),
+            task,
+            batch_size)
+
+        return [(int(np.argmax(output)), float(np.max(output))) for output in outputs]
+
     # Method for saving the model
     def save_model(self, model_path, output_names):
+        self.save_output_labels(model_path, "output", output_names)
+        self.save_keras_model(model_path)
 
-        model_name = os.path.splitext(os.path.basename(model_path))[0]
+    # Method for saving the multi-head model with the labels of both heads
+    def save_multihead_model(self, model_path, task_names, assert_names):
+        self.save_output_labels(model_path, "task_output", task_names)
+        self.save_output_labels(model_path, "assert_output", assert_names)
+        self.save_keras_model(model_path)
 
-        # Writing the output names into a file
-        labels_path = os.path.join(os.path.dirname(model_path), f"{model_name}_output_labels.txt")
+    # Method for writing the output names of a model head into a file
+    def save_output_labels(self, model_path, head_name, output_names):
+
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+        labels_path = os.path.join(os.path.dirname(model_path), f"{model_name}_{head_name}_labels.txt")
 
         with open(labels_path, 'w') as file:
             for output_name in output_names: file.write(output_name + "\n")
 
+    # Method for saving the current model in .keras format
+    def save_keras_model(self, model_path):
+
         # Sanity check needed on certain platforms
         if not model_path.lower().endswith(".keras"):
             model_path += ".keras"
@@ -109,10 +424,18 @@ class TensorflowModel(tf.Module):
         self.log_message("The .keras model saved at: {}".format(model_path))
 
     # Method for converting a model from .keras to .tflite
-    def convert_model_tflite(self, path):
+    def convert_model_tflite(self, path, embed_preprocessing=False):
 
         # Load the model
         model = tf.keras.models.load_model(path)
+        model_path = path.replace(".keras", ".tflite")
+
+        # Wrap the model with the screenshot preprocessing so it accepts raw screenshots and a task index
+        if embed_preprocessing:
+            from preprocessing_layers import create_preprocessing_model
+
+            model = create_preprocessing_model(model, self.configuration.num_channels)
+            model_path = path.replace(".keras", "_preprocessing.tflite")
 
         # Convert the model
         converter = tf.lite.TFLiteConverter.from_keras_model(model)
@@ -123,12 +446,25 @@ class TensorflowModel(tf.Module):
         tflite_model = converter.convert()
 
         # Save the model
-        model_path = path.replace(".keras", ".tflite")
         with open(model_path, 'wb') as f:
             f.write(tflite_model)
 
         self.log_message("New TFlite model created at: {}".format(model_path))
 
+        # The interpreter orders the output tensors differently from the model outputs
+        if len(model.outputs) > 1:
+            self.log_tflite_outputs(model, tflite_model)
+
+    # Method which logs which TFLite output tensor holds each of the model outputs
+    def log_tflite_outputs(self, model, tflite_model):
+        interpreter = tf.lite.Interpreter(model_content=tflite_model)
+        tensor_indices = [output["index"] for output in interpreter.get_output_details()]
+        signature_outputs = interpreter.get_signature_runner().get_output_details()
+
+        for i, output_name in enumerate(model.output_names):
+            output_index = tensor_indices.index(signature_outputs[f"output_{i}"]["index"])
+            self.log_message("Model output '{}' is TFLite output tensor {}".format(output_name, output_index))
+
     # Method for converting a model from .keras to .coreml
     def convert_model_coreml(self, path):
 
@@ -143,34 +479,3 @@ class TensorflowModel(tf.Module):
         coreml_model.save(model_path)
 
         self.log_message("New CoreML model created at: {}".format(model_path))
-
-
-class TrainingCallback(tf.keras.callbacks.Callback):
-
-    def __init__(self,
-                 log_message,
-                 refresh_application,
-                 plot_results,
-                 stop_training_check):
-        self.log_message = log_message
-        self.refresh_application = refresh_application
-        self.plot_results = plot_results
-        self.stop_training_check = stop_training_check
-        self.plot_accuracy = [0.0]
-        self.plot_loss = [0.0]
-
-    def on_epoch_end(self, epoch, logs=None):
-        self.plot_accuracy.append(float("{:5.2f}".format(logs["accuracy"] * 100)))
-        self.plot_loss.append(float("{:5.4f}".format(logs["loss"])))
-        self.plot_results(self.plot_accuracy, self.plot_loss)
-
-        self.log_message(
-            "Epoch {} accuracy: {:5.2f}% loss: {:5.4f}".format(epoch, logs["accuracy"] * 100, logs["loss"]))
-
-        # Checking if we need to stop training and save the model
-        if self.stop_training_check():
-            self.log_message("Stopping model training at epoch {}!".format(epoch))
-            self.model.stop_training = True
-
-    def on_train_batch_end(self, batch, logs=None):
-        self.refresh_application()
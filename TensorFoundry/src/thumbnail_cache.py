@@ -0,0 +1,158 @@
+import hashlib
+import os
+import threading
+
+from PIL import Image, ImageDraw
+
+from image_processing import DATASET_IMAGE_TYPES, open_dataset_image, walk_visible
+
+# Height of the class name strip under each thumbnail
+LABEL_HEIGHT = 14
+
+# Share of the cache size limit written between evictions, and freed below the limit by an eviction, so the
+# cache folder is not listed on every write
+EVICTION_SHARE = 0.1
+
+
+class ThumbnailCache:
+    # Downscaled copies of dataset images cached outside the dataset and keyed by path and modification time
+    #
+    # Reading a thumbnail touches its file, so the file modification times order the thumbnails by their last use
+    # and the least recently used ones are evicted once the cache grows over its size limit.
+
+    def __init__(self, configuration, log_message):
+        self.configuration = configuration
+        self.log_message = log_message
+        self.cache_path = os.path.expanduser(configuration.thumbnail_cache_path)
+        self.thumbnail_size = configuration.thumbnail_size
+        self.cache_limit = configuration.thumbnail_cache_limit * 2 ** 20
+        self.eviction_lock = threading.Lock()
+
+        # The first written thumbnail evicts on a worker thread, so the cache folder is not listed on startup
+        self.written_bytes = self.cache_limit * EVICTION_SHARE
+
+        os.makedirs(self.cache_path, exist_ok=True)
+
+    # Method which lists the class name and path of every dataset image, hidden folders are skipped
+    def find_dataset_images(self, dataset_path):
+        dataset_images = []
+
+        for class_name in sorted(os.listdir(dataset_path)):
+            class_path = os.path.join(dataset_path, class_name)
+
+            if class_name.startswith(".") or not os.path.isdir(class_path):
+                continue
+
+            for root, dirs, files in walk_visible(class_path):
+                dataset_images += [(class_name, os.path.join(root, file)) for file in sorted(files)
+                                   if file.lower().endswith(DATASET_IMAGE_TYPES)]
+
+        return dataset_images
+
+    # Method which returns the cache file of an image, an edited image gets a new file as its mtime changes
+    def thumbnail_path(self, image_path):
+        modified_time = os.stat(image_path).st_mtime_ns
+        key = "{}|{}|{}".format(os.path.abspath(image_path), modified_time, self.thumbnail_size)
+        return os.path.join(self.cache_path, hashlib.sha1(key.encode()).hexdigest() + ".png")
+
+    # Method which returns whether the thumbnail of an image is already cached
+    def is_cached(self, image_path):
+        return os.path.isfile(self.thumbnail_path(image_path))
+
+    # Method which loads the thumbnail of an image, creating and caching it on the first request
+    def load_thumbnail(self, image_path):
+        thumbnail_path = self.thumbnail_path(image_path)
+
+        # A thumbnail evicted since the check is created again
+        try:
+            with Image.open(thumbnail_path) as thumbnail:
+                thumbnail = thumbnail.convert("RGB")
+
+            os.utime(thumbnail_path)
+            return thumbnail
+        except FileNotFoundError:
+            pass
+
+        with open_dataset_image(image_path) as image:
+            thumbnail = image.convert("RGB")
+            thumbnail.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.Resampling.BILINEAR)
+
+        # Written under a temporary name so a concurrent reader never sees a partial file
+        temporary_path = "{}.{}.tmp".format(thumbnail_path, os.getpid())
+        thumbnail.save(temporary_path, format="PNG")
+        thumbnail_bytes = os.path.getsize(temporary_path)
+        os.replace(temporary_path, thumbnail_path)
+
+        # Only the thread crossing the written share evicts, the others carry on writing
+        if self.cache_limit > 0:
+            with self.eviction_lock:
+                self.written_bytes += thumbnail_bytes
+                evict = self.written_bytes >= self.cache_limit * EVICTION_SHARE
+                if evict:
+                    self.written_bytes = 0
+
+            if evict:
+                self.evict_thumbnails()
+
+        return thumbnail
+
+    # Method which removes the least recently used thumbnails while the cache is over its size limit and returns
+    # the number of removed thumbnails
+    def evict_thumbnails(self):
+        thumbnails = []
+
+        for entry in os.scandir(self.cache_path):
+            if entry.name.endswith(".png"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                thumbnails.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        cache_bytes = sum(size for _, size, _ in thumbnails)
+        if cache_bytes <= self.cache_limit:
+            return 0
+
+        removed_count = 0
+        for _, size, thumbnail_path in sorted(thumbnails):
+            if cache_bytes <= self.cache_limit * (1 - EVICTION_SHARE):
+                break
+
+            try:
+                os.remove(thumbnail_path)
+            except FileNotFoundError:
+                pass
+
+            cache_bytes -= size
+            removed_count += 1
+
+        return removed_count
+
+    # Method which creates the missing thumbnails of the dataset images on the task runner
+    def build_thumbnails(self, task, dataset_images):
+        missing_paths = [image_path for _, image_path in dataset_images if not self.is_cached(image_path)]
+        task.map(self.load_thumbnail, missing_paths)
+        return len(missing_paths)
+
+    # Method which composites a page of thumbnails with their class names into a single image
+    def render_page(self, dataset_images, columns, rows):
+        cell_width = self.thumbnail_size + self.configuration.app_padding
+        cell_height = self.thumbnail_size + LABEL_HEIGHT + self.configuration.app_padding
+
+        page = Image.new("RGB", (columns * cell_width, rows * cell_height),
+                         self.configuration.app_dark_background_color)
+        draw = ImageDraw.Draw(page)
+
+        for index, (class_name, image_path) in enumerate(dataset_images[:columns * rows]):
+            left = (index % columns) * cell_width
+            top = (index // columns) * cell_height
+            thumbnail = self.load_thumbnail(image_path)
+
+            # Center the thumbnail in its cell as screenshots are rarely square
+            page.paste(thumbnail, (left + (self.thumbnail_size - thumbnail.width) // 2,
+                                   top + (self.thumbnail_size - thumbnail.height) // 2))
+            draw.text((left, top + self.thumbnail_size), class_name[:self.thumbnail_size // 6],
+                      fill=self.configuration.app_text_foreground_color)
+
+        return page
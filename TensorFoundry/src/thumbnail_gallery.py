@@ -0,0 +1,236 @@
+import math
+from collections import OrderedDict
+from tkinter import Canvas, ttk
+
+from PIL import ImageTk
+
+# Number of visible pages of thumbnails kept as Tk images when scrolling back and forth
+PHOTO_CACHE_PAGES = 4
+
+
+class ThumbnailGallery:
+    # Scrollable grid of image thumbnails which only draws the visible rows and supports multi-selection
+
+    def __init__(self, parent, configuration, thumbnail_cache, task_runner, task_view, width, height):
+        self.configuration = configuration
+        self.thumbnail_cache = thumbnail_cache
+        self.task_runner = task_runner
+        self.task_view = task_view
+        self.image_paths = []
+        self.captions = {}
+        self.selection = set()
+        self.anchor_index = None
+        self.first_row = 0
+        self.photo_images = OrderedDict()
+        self.pending_paths = set()
+        self.failed_paths = set()
+
+        self.frame = ttk.Frame(parent)
+        self.canvas = Canvas(
+            self.frame,
+            bg=configuration.app_dark_background_color,
+            highlightthickness=0,
+            width=width,
+            height=height
+        )
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.scroll)
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<Map>", lambda event: self.redraw())
+        self.canvas.bind("<Button-1>", self.click)
+        self.canvas.bind("<Control-Button-1>", self.control_click)
+        self.canvas.bind("<Shift-Button-1>", self.shift_click)
+        self.canvas.bind("<MouseWheel>", self.mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll("scroll", 1, "units"))
+
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+    # Method for placing the gallery in its parent
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def pack_forget(self):
+        self.frame.pack_forget()
+
+    # Method which replaces the shown images and clears the selection, captions are drawn over the thumbnails
+    def set_images(self, image_paths, captions=None):
+        self.image_paths = list(image_paths)
+        self.captions = captions or {}
+        self.selection.clear()
+        self.anchor_index = None
+        self.first_row = 0
+        self.redraw()
+
+    # Method which returns the selected image paths in gallery order
+    def selected_paths(self):
+        return [self.image_paths[index] for index in sorted(self.selection)]
+
+    def cell_size(self):
+        return self.thumbnail_cache.thumbnail_size + self.configuration.app_padding
+
+    def columns(self):
+        return max(1, self.canvas.winfo_width() // self.cell_size())
+
+    def visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.cell_size())
+
+    def row_count(self):
+        return math.ceil(len(self.image_paths) / self.columns())
+
+    # Method which returns the Tk image of a cached thumbnail, or None when it has not been created yet
+    def photo_image(self, image_path):
+
+        if image_path in self.photo_images:
+            self.photo_images.move_to_end(image_path)
+            return self.photo_images[image_path]
+
+        if not self.thumbnail_cache.is_cached(image_path):
+            return None
+
+        self.photo_images[image_path] = ImageTk.PhotoImage(self.thumbnail_cache.load_thumbnail(image_path))
+
+        # Keep only the most recently drawn thumbnails
+        while len(self.photo_images) > self.columns() * (self.visible_rows() + 1) * PHOTO_CACHE_PAGES:
+            self.photo_images.popitem(last=False)
+
+        return self.photo_images[image_path]
+
+    # Method which draws the visible rows and queues the missing thumbnails
+    def redraw(self):
+
+        if not self.canvas.winfo_viewable():
+            return
+
+        columns = self.columns()
+        cell_size = self.cell_size()
+        self.first_row = max(0, min(self.first_row, self.row_count() - self.visible_rows()))
+
+        first_index = self.first_row * columns
+        last_index = min(len(self.image_paths), (self.first_row + self.visible_rows() + 1) * columns)
+        missing_paths = []
+
+        self.canvas.delete("all")
+
+        for index in range(first_index, last_index):
+            left = (index % columns) * cell_size
+            top = (index // columns - self.first_row) * cell_size
+            photo_image = self.photo_image(self.image_paths[index])
+
+            if photo_image:
+                self.canvas.create_image(left, top, anchor="nw", image=photo_image)
+            else:
+                missing_paths.append(self.image_paths[index])
+                self.canvas.create_rectangle(left, top, left + cell_size - self.configuration.app_padding,
+                                             top + cell_size - self.configuration.app_padding,
+                                             outline=self.configuration.app_light_background_color)
+
+            if self.image_paths[index] in self.captions:
+                self.canvas.create_text(left + 2, top + cell_size - self.configuration.app_padding - 2, anchor="sw",
+                                        text=self.captions[self.image_paths[index]],
+                                        fill=self.configuration.app_text_foreground_color)
+
+            if index in self.selection:
+                self.canvas.create_rectangle(left + 1, top + 1, left + cell_size - self.configuration.app_padding,
+                                             top + cell_size - self.configuration.app_padding,
+                                             outline=self.configuration.app_select_background_color, width=3)
+
+        rows = self.row_count()
+        if rows > 0:
+            self.scrollbar.set(self.first_row / rows, min(1.0, (self.first_row + self.visible_rows()) / rows))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+        if missing_paths:
+            self.create_thumbnails(missing_paths)
+
+    # Method which creates missing thumbnails in parallel on the task runner and redraws once they exist. Images
+    # which cannot be read stay empty cells and are not queued again.
+    def create_thumbnails(self, image_paths):
+        image_paths = [image_path for image_path in image_paths
+                       if image_path not in self.pending_paths and image_path not in self.failed_paths]
+
+        if not image_paths:
+            return
+
+        self.pending_paths.update(image_paths)
+
+        # Function which creates a single thumbnail and returns whether it could be created
+        def create_thumbnail(image_path):
+            try:
+                self.thumbnail_cache.load_thumbnail(image_path)
+            except Exception:
+                return False
+
+            return True
+
+        def finish_thumbnails(created):
+            self.pending_paths.difference_update(image_paths)
+            self.failed_paths.update(image_path for image_path, success in zip(image_paths, created) if not success)
+            self.redraw()
+
+        # A cancelled or failed job leaves its images to be queued again by the next redraw
+        def release_thumbnails(error):
+            self.pending_paths.difference_update(image_paths)
+
+        self.task_runner.run(
+            "Creating thumbnails",
+            lambda task: task.map(create_thumbnail, image_paths),
+            finish_thumbnails,
+            release_thumbnails,
+            task_view=self.task_view,
+            serial=False)
+
+    # Method which returns the index of the image under a canvas position
+    def index_at(self, x, y):
+        column = x // self.cell_size()
+
+        if column >= self.columns():
+            return None
+
+        index = (self.first_row + y // self.cell_size()) * self.columns() + column
+        return index if index < len(self.image_paths) else None
+
+    def click(self, event):
+        index = self.index_at(event.x, event.y)
+
+        if index is not None:
+            self.selection = {index}
+            self.anchor_index = index
+            self.redraw()
+
+    def control_click(self, event):
+        index = self.index_at(event.x, event.y)
+
+        if index is not None:
+            self.selection ^= {index}
+            self.anchor_index = index
+            self.redraw()
+
+    def shift_click(self, event):
+        index = self.index_at(event.x, event.y)
+
+        if index is None:
+            return
+
+        if self.anchor_index is None:
+            self.anchor_index = index
+
+        self.selection = set(range(min(self.anchor_index, index), max(self.anchor_index, index) + 1))
+        self.redraw()
+
+    # Method which handles the scrollbar commands
+    def scroll(self, action, amount, unit=None):
+
+        if action == "moveto":
+            self.first_row = int(float(amount) * self.row_count())
+        elif unit == "pages":
+            self.first_row += int(amount) * self.visible_rows()
+        else:
+            self.first_row += int(amount)
+
+        self.redraw()
+
+    def mouse_wheel(self, event):
+        self.scroll("scroll", -1 if event.delta > 0 else 1, "units")
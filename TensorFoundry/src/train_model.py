@@ -1,42 +1,32 @@
 import math
 import os
 import platform
-from tkinter import END, ttk, Listbox, IntVar
+from tkinter import ttk, IntVar
 
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
-from application_utils import DialogType, filepath_dialog, validate_spinbox
+from application_utils import DialogType, filepath_dialog, read_task_labels, validate_spinbox
 from create_dataset import read_output_labels
+from log_pipeline import LogView
 from tensorflow_dataset import DataSet
 
 
 class TrainModel:
-    def __init__(self, app, configuration, log_message, plot_dataset, output_size, tensorflow_model):
+    def __init__(self, app, configuration, log_message, preview_dataset, output_size, tensorflow_model):
         self.app = app
         self.configuration = configuration
         self.log_message = log_message
-        self.plot_dataset = plot_dataset
+        self.preview_dataset = preview_dataset
         self.output_size = output_size
         self.tensorflow_model = tensorflow_model
-        self.training_log_listbox = None
+        self.training_log_view = None
         self.epoch_var = None
+        self.profile_steps_var = None
         self.training_plot_figure = None
         self.training_plot_canvas = None
         self.training_plot = None
 
-    # Method which logs into the dataset log listbox
-    def print_training_log(self, messages):
-        for msg in messages:
-            self.training_log_listbox.insert(END, msg)
-            self.training_log_listbox.yview(END)
-
-        if self.training_log_listbox.index("end") > self.configuration.log_limit:
-            self.training_log_listbox.delete(0)
-
-    def disable_log_selection(self, event):
-        self.training_log_listbox.selection_clear(0, END)
-
     # Method for the train button
     def train_model_button(self):
 
@@ -58,23 +48,91 @@ class TrainModel:
             class_names, load_classes = read_output_labels(model_name, model_path)
 
             if load_dataset and load_classes:
-                training_dataset = (
+                datasets = (
                     DataSet(self.configuration,
                             self.log_message,
-                            self.plot_dataset,
                             input_size)
                     .create_datasets(dataset_path,
                                      class_names)
                 )
 
-                if training_dataset is None:
+                if datasets is None:
                     return
 
+                training_dataset, validation_dataset = datasets
+
                 self.log_message("Created datasets for classes {}".format(class_names))
 
+                # The preview is only rendered once its tab is opened so training does not wait for it
+                self.preview_dataset(dataset_path)
+
                 self.tensorflow_model.stop_training = False
                 self.tensorflow_model.train_model(
-                    model_path, self.epoch_var, training_dataset, class_names, self.plot_results)
+                    model_path, self.epoch_var.get(), training_dataset, validation_dataset, class_names,
+                    self.plot_results, self.profile_steps_var.get())
+
+    # Method for the train multi-head model button
+    def train_multihead_model_button(self):
+
+        self.log_message("Please select a multi-head model")
+        model_path, load_model = filepath_dialog(
+            self.app,
+            DialogType.OPENFILE,
+            "Please select a multi-head model:",
+            [('Keras models', '.keras')])
+
+        if not load_model:
+            return
+
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+        task_names, load_task_classes = read_output_labels(f"{model_name}_task", model_path)
+        assert_names, load_assert_classes = read_output_labels(f"{model_name}_assert", model_path)
+
+        if not load_task_classes or not load_assert_classes:
+            self.log_message("Could not read the task and assert output labels of {}!".format(model_name))
+            return
+
+        self.log_message("Please select the task dataset directory")
+        task_path, load_task_dataset = (
+            filepath_dialog(self.app, DialogType.SELECTDIR, "Please select the task dataset directory:"))
+
+        if not load_task_dataset:
+            return
+
+        self.log_message("Please select the assert dataset directory")
+        assert_path, load_assert_dataset = (
+            filepath_dialog(self.app, DialogType.SELECTDIR, "Please select the assert dataset directory:"))
+
+        if not load_assert_dataset:
+            return
+
+        # The number of tasks decides the range of task augmentations applied to the assert images
+        task_labels, load_tasks = read_task_labels(task_path)
+        task_count = len(task_labels) if load_tasks else 0
+
+        input_size = self.tensorflow_model.get_model_input(model_path)
+        datasets = (
+            DataSet(self.configuration,
+                    self.log_message,
+                    input_size)
+            .create_multihead_datasets(task_path,
+                                       task_names,
+                                       assert_path,
+                                       assert_names,
+                                       task_count)
+        )
+
+        if datasets is None:
+            return
+
+        training_dataset, validation_dataset = datasets
+        self.log_message("Created datasets for tasks {} and asserts {}".format(task_names, assert_names))
+        self.preview_dataset(task_path)
+
+        self.tensorflow_model.stop_training = False
+        self.tensorflow_model.train_multihead_model(
+            model_path, self.epoch_var.get(), training_dataset, validation_dataset, task_names, assert_names,
+            self.plot_results, self.profile_steps_var.get())
 
         # Method for the stop training button
 
@@ -106,13 +164,13 @@ class TrainModel:
 
             if load_image:
                 model_name = os.path.splitext(os.path.basename(model_path))[0]
-                input_size = self.tensorflow_model.get_model_input(model_path)
+                class_names, load_classes = read_output_labels(model_name, model_path)
 
-                test_state, class_names = (DataSet(self.configuration, self.log_message, self.plot_dataset, input_size)
-                                           .create_test_data(model_name, model_path, image_path))
+                if not load_classes:
+                    self.log_message("Could not read the {}_output_labels.txt!".format(model_name))
+                    return
 
-                self.tensorflow_model.test_model(
-                    model_path, test_state, class_names)
+                self.tensorflow_model.test_model(model_path, image_path, class_names)
 
     def calculate_epoch_interval(self):
         return max(math.floor(self.epoch_var.get() / 10), 1)
@@ -145,6 +203,11 @@ class TrainModel:
             text="Number of epochs:"
         )
 
+        profile_steps_label = ttk.Label(
+            train_model_tab,
+            text="Profile batches:"
+        )
+
         # Buttons
         train_model_button = ttk.Button(
             train_model_tab,
@@ -153,6 +216,13 @@ class TrainModel:
             width=self.configuration.app_button_size
         )
 
+        train_multihead_model_button = ttk.Button(
+            train_model_tab,
+            text="Train multi-head model",
+            command=self.train_multihead_model_button,
+            width=self.configuration.app_button_size
+        )
+
         stop_training_button = ttk.Button(
             train_model_tab,
             text="Stop training",
@@ -168,16 +238,7 @@ class TrainModel:
         )
 
         # List boxes
-        self.training_log_listbox = Listbox(
-            train_model_tab,
-            bg=self.configuration.app_dark_background_color,
-            fg=self.configuration.app_text_foreground_color,
-            selectbackground=self.configuration.app_select_background_color,
-            selectforeground=self.configuration.app_select_foreground_color,
-            takefocus=0
-        )
-
-        self.training_log_listbox.bind("<<ListboxSelect>>", self.disable_log_selection)
+        self.training_log_view = LogView(train_model_tab, self.configuration)
 
         # Spin boxes
         self.epoch_var = IntVar(value=self.configuration.epoch_count)
@@ -192,6 +253,17 @@ class TrainModel:
 
         epoch_spinbox.config(validate="key", validatecommand=(train_model_tab.register(validate_spinbox), "%P"))
 
+        # Zero batches leaves the profiler off
+        self.profile_steps_var = IntVar(value=self.configuration.profile_steps)
+        profile_steps_spinbox = ttk.Spinbox(
+            train_model_tab,
+            from_=0,
+            to=999999,
+            textvariable=self.profile_steps_var,
+            width=self.configuration.app_spinbox_size,
+            wrap=True
+        )
+
         # Fetch the dpi
         dpi = self.app.winfo_fpixels('1i')
 
@@ -213,12 +285,12 @@ class TrainModel:
         self.training_plot.spines['right'].set_color(self.configuration.app_text_foreground_color)
         self.training_plot.spines['left'].set_color(self.configuration.app_text_foreground_color)
 
-        self.training_log_listbox.pack(side="top",
-                                       anchor="se",
-                                       fill="both",
-                                       padx=self.configuration.app_padding,
-                                       pady=self.configuration.app_padding,
-                                       expand=True)
+        self.training_log_view.pack(side="top",
+                                    anchor="se",
+                                    fill="both",
+                                    padx=self.configuration.app_padding,
+                                    pady=self.configuration.app_padding,
+                                    expand=True)
 
         self.training_plot_canvas.get_tk_widget().pack(side="right",
                                                        anchor="se",
@@ -238,6 +310,19 @@ class TrainModel:
                            pady=self.configuration.app_padding,
                            expand=False)
 
+        profile_steps_label.pack(side="top",
+                                 anchor="nw",
+                                 padx=self.configuration.app_padding,
+                                 pady=self.configuration.app_padding,
+                                 expand=False)
+
+        profile_steps_spinbox.pack(side="top",
+                                   fill='x',
+                                   anchor="center",
+                                   padx=self.configuration.app_padding,
+                                   pady=self.configuration.app_padding,
+                                   expand=False)
+
         test_model_button.pack(side="bottom",
                                fill='x',
                                anchor="center",
@@ -252,6 +337,13 @@ class TrainModel:
                                   pady=self.configuration.app_padding,
                                   expand=False)
 
+        train_multihead_model_button.pack(side="bottom",
+                                          fill='x',
+                                          anchor="center",
+                                          padx=self.configuration.app_padding,
+                                          pady=self.configuration.app_padding,
+                                          expand=False)
+
         train_model_button.pack(side="bottom",
                                 fill='x',
                                 anchor="center",
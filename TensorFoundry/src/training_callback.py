@@ -0,0 +1,60 @@
+import time
+
+import tensorflow as tf
+
+
+class TrainingCallback(tf.keras.callbacks.Callback):
+
+    def __init__(self,
+                 log_message,
+                 refresh_application,
+                 plot_results,
+                 stop_training_check,
+                 time_limit=0):
+        self.log_message = log_message
+        self.refresh_application = refresh_application
+        self.plot_results = plot_results
+        self.stop_training_check = stop_training_check
+        self.time_limit = time_limit
+        self.plot_accuracy = [0.0]
+        self.plot_loss = [0.0]
+        self.start_time = None
+        self.epoch_start_time = None
+
+    def on_train_begin(self, logs=None):
+        self.start_time = time.perf_counter()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start_time = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        accuracy = self.read_accuracy(logs)
+        self.plot_accuracy.append(float("{:5.2f}".format(accuracy * 100)))
+        self.plot_loss.append(float("{:5.4f}".format(logs["loss"])))
+        self.plot_results(self.plot_accuracy, self.plot_loss)
+
+        if "val_loss" in logs:
+            self.log_message("Epoch {} accuracy: {:5.2f}% loss: {:5.4f} validation loss: {:5.4f}".format(
+                epoch, accuracy * 100, logs["loss"], logs["val_loss"]))
+        else:
+            self.log_message(
+                "Epoch {} accuracy: {:5.2f}% loss: {:5.4f}".format(epoch, accuracy * 100, logs["loss"]))
+
+        # Checking if we need to stop training and save the model
+        if self.stop_training_check():
+            self.log_message("Stopping model training at epoch {}!".format(epoch))
+            self.model.stop_training = True
+
+        # Stop before an epoch as long as the last one would run over the time limit
+        now = time.perf_counter()
+        if self.time_limit and now - self.start_time + now - self.epoch_start_time > self.time_limit:
+            self.log_message("Stopping model training at epoch {} as the time limit was reached!".format(epoch))
+            self.model.stop_training = True
+
+    # Method which reads the training accuracy, multi-head models report the mean accuracy of their heads
+    def read_accuracy(self, logs):
+        accuracies = [value for key, value in logs.items() if key.endswith("accuracy") and not key.startswith("val_")]
+        return sum(accuracies) / len(accuracies)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.refresh_application()
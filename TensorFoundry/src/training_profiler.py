@@ -0,0 +1,140 @@
+import glob
+import json
+import os
+from collections import Counter
+
+import tensorflow as tf
+
+# Number of ops and input pipeline stages listed in the profile summary
+TOP_OPS_COUNT = 15
+
+
+# Function which reads the self-times of the TensorFlow ops and tf.data stages from a captured trace
+def summarize_trace(profile_path):
+
+    # The XSpace protobuf is not part of the public API, so the summary is skipped when it moves
+    try:
+        from tensorflow.tsl.profiler.protobuf import xplane_pb2
+    except ImportError:
+        try:
+            from tensorflow.core.profiler.protobuf import xplane_pb2
+        except ImportError:
+            return None
+
+    trace_paths = sorted(glob.glob(os.path.join(profile_path, "plugins", "profile", "*", "*.xplane.pb")))
+    if not trace_paths:
+        return None
+
+    space = xplane_pb2.XSpace()
+    with open(trace_paths[-1], "rb") as file:
+        space.ParseFromString(file.read())
+
+    op_times = Counter()
+    op_counts = Counter()
+    stage_times = Counter()
+
+    for plane in space.planes:
+        for line in plane.lines:
+            self_times = Counter()
+            call_counts = Counter()
+            open_events = []
+
+            # Events on a thread nest by time, the self-time of an event excludes the events it encloses
+            for event in sorted(line.events, key=lambda event: (event.offset_ps, -event.duration_ps)):
+                while open_events and open_events[-1][1] <= event.offset_ps:
+                    open_events.pop()
+
+                name = plane.event_metadata[event.metadata_id].name
+                self_times[name] += event.duration_ps
+                call_counts[name] += 1
+
+                if open_events:
+                    self_times[open_events[-1][0]] -= event.duration_ps
+
+                open_events.append((name, event.offset_ps + event.duration_ps))
+
+            # Ops are traced as "name:type" while the tf.data stages are traced as "Iterator::..."
+            for name, self_time in self_times.items():
+                if name.startswith("Iterator::"):
+                    stage_times[name] += self_time
+                elif ":" in name and "::" not in name and " " not in name:
+                    op_times[name] += self_time
+                    op_counts[name] += call_counts[name]
+
+    total_op_time = sum(op_times.values())
+
+    return {
+        "trace": trace_paths[-1],
+        "ops": [{"op": name,
+                 "self_time_ms": self_time / 1e9,
+                 "share": self_time / total_op_time if total_op_time else 0.0,
+                 "calls": op_counts[name]}
+                for name, self_time in op_times.most_common(TOP_OPS_COUNT)],
+        "input_stages": [{"stage": name, "self_time_ms": self_time / 1e9}
+                         for name, self_time in stage_times.most_common(TOP_OPS_COUNT)]
+    }
+
+
+class TrainingProfiler(tf.keras.callbacks.Callback):
+    # Captures a TensorFlow profiler trace over a range of training batches, including the tf.data pipeline
+    #
+    # The trace is written into <model>_profile next to the model and can be opened with the TensorBoard
+    # profile plugin, the top ops and input pipeline stages by self-time are logged when the capture stops.
+
+    def __init__(self, log_message, model_path, start_batch, batch_count):
+        super().__init__()
+        self.log_message = log_message
+        self.profile_path = os.path.splitext(model_path)[0] + "_profile"
+        self.start_batch = start_batch
+        self.end_batch = start_batch + batch_count
+        self.step = 0
+        self.profiling = False
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.step == self.start_batch:
+            try:
+                tf.profiler.experimental.start(self.profile_path)
+                self.profiling = True
+                self.log_message("Profiling training batches {} to {}".format(self.start_batch, self.end_batch - 1))
+            except Exception as e:
+                self.log_message("Could not start the profiler: {}".format(e))
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step += 1
+
+        if self.step == self.end_batch:
+            self.stop_profiler()
+
+    def on_train_end(self, logs=None):
+        self.stop_profiler()
+
+    # Method which stops a running capture and logs the summary
+    def stop_profiler(self):
+        if not self.profiling:
+            return
+
+        self.profiling = False
+        tf.profiler.experimental.stop()
+        self.log_message("Profiler trace saved at: {}".format(self.profile_path))
+
+        try:
+            summary = summarize_trace(self.profile_path)
+        except Exception as e:
+            self.log_message("Could not summarize the profiler trace: {}".format(e))
+            return
+
+        if summary is None:
+            self.log_message("The profiler trace could not be summarized with this TensorFlow version")
+            return
+
+        with open(os.path.join(self.profile_path, "top_ops.json"), "w") as file:
+            json.dump(summary, file, indent=2)
+
+        self.log_message("{:<64}{:>12}{:>8}{:>8}".format("Op", "Self ms", "Share", "Calls"))
+        for op in summary["ops"]:
+            self.log_message("{:<64}{:>12.2f}{:>7.1f}%{:>8}".format(
+                op["op"][-63:], op["self_time_ms"], op["share"] * 100, op["calls"]))
+
+        self.log_message("{:<64}{:>12}".format("Input pipeline stage", "Self ms"))
+        for stage in summary["input_stages"]:
+            self.log_message("{:<64}{:>12.2f}".format(stage["stage"][-63:], stage["self_time_ms"]))
@@ -0,0 +1,185 @@
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import tensorflow as tf
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Share of the step time spent waiting on the input pipeline above which a run is reported as input bound
+INPUT_BOUND_SHARE = 0.5
+
+
+# Function which returns the peak resident set size of the process in megabytes, None where it is not available
+def read_peak_rss():
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes and macOS bytes
+    return peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+
+class TrainingTelemetry(tf.keras.callbacks.Callback):
+    # Records the batch and epoch wall times, examples/sec, input pipeline wait and peak RSS of a training run
+    #
+    # Every run writes <model>_<timestamp>.jsonl with a "run" record describing the machine followed by "batch"
+    # and "epoch" records, and a TensorBoard event folder of the same name next to it. The input wait is
+    # measured by fetching each batch from the dataset iterator before handing it to the compiled train step,
+    # so the compute time is the rest of the batch time.
+
+    def __init__(self, log_message, telemetry_path, model_name):
+        super().__init__()
+        self.log_message = log_message
+        self.run_name = "{}_{}".format(model_name, datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+        os.makedirs(telemetry_path, exist_ok=True)
+        self.jsonl_path = os.path.join(telemetry_path, self.run_name + ".jsonl")
+        self.summary_path = os.path.join(telemetry_path, self.run_name)
+
+        self.jsonl_file = None
+        self.summary_writer = None
+        self.train_function = None
+        self.step = 0
+        self.epoch = 0
+        self.epoch_totals = None
+        self.run_totals = {"batch_time": 0.0, "input_time": 0.0}
+        self.batch_start_time = None
+        self.batch_input_time = 0.0
+        self.batch_examples = 0
+        self.epoch_start_time = None
+
+    # Method which writes a record into the JSONL file
+    def write_record(self, record):
+        self.jsonl_file.write(json.dumps(record) + "\n")
+
+    # Method which fetches the next batch in Python to time the wait on the input pipeline
+    def timed_train_function(self, iterator):
+        start_time = time.perf_counter()
+        data = next(iterator)
+        self.batch_input_time = time.perf_counter() - start_time
+        self.batch_examples = int(tf.nest.flatten(data)[0].shape[0])
+
+        # A list of batches runs the same compiled step as the iterator does
+        return self.train_function([data])
+
+    def on_train_begin(self, logs=None):
+        self.jsonl_file = open(self.jsonl_path, "w", encoding="utf-8")
+        self.summary_writer = tf.summary.create_file_writer(self.summary_path)
+
+        self.write_record({
+            "type": "run",
+            "run": self.run_name,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "gpus": [device.name for device in tf.config.list_physical_devices("GPU")],
+            "tensorflow": tf.__version__,
+            "parameters": self.model.count_params()
+        })
+
+        # Without a single step train function the input wait and examples cannot be separated and are zero
+        if self.model.train_function is not None and self.model.steps_per_execution == 1:
+            self.train_function = self.model.train_function
+            self.model.train_function = self.timed_train_function
+
+        self.log_message("Writing training telemetry into: {}".format(self.jsonl_path))
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.epoch_start_time = time.perf_counter()
+        self.epoch_totals = {"batches": 0, "examples": 0, "batch_time": 0.0, "input_time": 0.0}
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.batch_start_time = time.perf_counter()
+        self.batch_input_time = 0.0
+        self.batch_examples = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        batch_time = time.perf_counter() - self.batch_start_time
+        compute_time = batch_time - self.batch_input_time
+
+        self.epoch_totals["batches"] += 1
+        self.epoch_totals["examples"] += self.batch_examples
+        self.epoch_totals["batch_time"] += batch_time
+        self.epoch_totals["input_time"] += self.batch_input_time
+
+        self.write_record({
+            "type": "batch",
+            "epoch": self.epoch,
+            "step": self.step,
+            "batch": batch,
+            "examples": self.batch_examples,
+            "batch_time": batch_time,
+            "input_time": self.batch_input_time,
+            "compute_time": compute_time,
+            "examples_per_sec": self.batch_examples / batch_time if batch_time > 0 else None
+        })
+
+        with self.summary_writer.as_default(step=self.step):
+            tf.summary.scalar("batch/time", batch_time)
+            tf.summary.scalar("batch/input_time", self.batch_input_time)
+            tf.summary.scalar("batch/compute_time", compute_time)
+
+        self.step += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch_time = time.perf_counter() - self.epoch_start_time
+        totals = self.epoch_totals
+        peak_rss = read_peak_rss()
+
+        self.run_totals["batch_time"] += totals["batch_time"]
+        self.run_totals["input_time"] += totals["input_time"]
+
+        input_share = totals["input_time"] / totals["batch_time"] if totals["batch_time"] > 0 else 0.0
+        examples_per_sec = totals["examples"] / totals["batch_time"] if totals["batch_time"] > 0 else 0.0
+
+        record = {
+            "type": "epoch",
+            "epoch": epoch,
+            "batches": totals["batches"],
+            "examples": totals["examples"],
+            "epoch_time": epoch_time,
+            "train_time": totals["batch_time"],
+            "input_time": totals["input_time"],
+            "compute_time": totals["batch_time"] - totals["input_time"],
+            "validation_time": epoch_time - totals["batch_time"],
+            "mean_batch_time": totals["batch_time"] / totals["batches"] if totals["batches"] else None,
+            "examples_per_sec": examples_per_sec,
+            "input_share": input_share,
+            "peak_rss_mb": peak_rss
+        }
+        record.update({key: float(value) for key, value in (logs or {}).items()})
+        self.write_record(record)
+        self.jsonl_file.flush()
+
+        with self.summary_writer.as_default(step=epoch):
+            for key in ("epoch_time", "examples_per_sec", "input_share", "peak_rss_mb"):
+                if record[key] is not None:
+                    tf.summary.scalar("epoch/" + key, record[key])
+        self.summary_writer.flush()
+
+        self.log_message("Epoch {} took {:.2f} s, {:.0f} examples/s, {:.0f}% waiting on input{}".format(
+            epoch, epoch_time, examples_per_sec, input_share * 100,
+            "" if peak_rss is None else ", peak RSS {:.0f} MB".format(peak_rss)))
+
+    def on_train_end(self, logs=None):
+        if self.train_function is not None:
+            self.model.train_function = self.train_function
+            self.train_function = None
+
+        # Tell whether faster input or faster compute would speed the run up
+        if self.run_totals["batch_time"] > 0:
+            input_share = self.run_totals["input_time"] / self.run_totals["batch_time"]
+            self.log_message("Training spent {:.0f}% of its step time waiting on input and was {} bound".format(
+                input_share * 100, "input" if input_share > INPUT_BOUND_SHARE else "compute"))
+
+        self.jsonl_file.close()
+        self.summary_writer.close()
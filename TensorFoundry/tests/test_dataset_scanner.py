@@ -0,0 +1,62 @@
+import os
+from types import SimpleNamespace
+
+from PIL import Image
+
+from dataset_scanner import DatasetScanner
+from image_processing import encode_dataset_image
+
+
+# Function which writes images of a size into the output folders of a dataset in the format of the extension
+def write_dataset(dataset_path, class_names, size, extension):
+    for class_name in class_names:
+        os.makedirs(os.path.join(dataset_path, class_name))
+
+        for image_index in range(2):
+            image = Image.new("RGB", (size, size), (image_index, 40, 80))
+            image_path = os.path.join(dataset_path, class_name, "image_{}{}".format(image_index, extension))
+
+            with open(image_path, "wb") as file:
+                file.write(encode_dataset_image(image, extension))
+
+
+# Function which scans a dataset with an isolated cache
+def scan_dataset(tmp_path, dataset_path, class_names, input_size):
+    configuration = SimpleNamespace(scan_cache_path=str(tmp_path / "scan.sqlite"), scan_processes=1)
+    return DatasetScanner(configuration, lambda message: None).scan_dataset(dataset_path, class_names, input_size)
+
+
+# The Keras directory loader resizes the images, so a size mismatch only warns
+def test_wrong_size_warns_for_resizing_loader(tmp_path):
+    dataset_path = str(tmp_path / "dataset")
+    write_dataset(dataset_path, ["FIRST", "SECOND"], 32, ".png")
+
+    report = scan_dataset(tmp_path, dataset_path, ["FIRST", "SECOND"], (64, 64, 3))
+
+    assert report["errors"] == 0
+    assert report["severities"] == {"wrong_size": "warning"}
+    assert len(report["problems"]["wrong_size"]) == 4
+
+
+# The format loader reads the images as they are, so a size mismatch stops the training
+def test_wrong_size_fails_for_format_loader(tmp_path):
+    dataset_path = str(tmp_path / "dataset")
+    write_dataset(dataset_path, ["FIRST", "SECOND"], 32, ".npy")
+
+    report = scan_dataset(tmp_path, dataset_path, ["FIRST", "SECOND"], (64, 64, 3))
+
+    assert report["format_loader"]
+    assert report["errors"] == 4
+    assert report["severities"] == {"wrong_size": "error"}
+
+
+# A matching dataset has no problems in any format
+def test_matching_dataset_has_no_problems(tmp_path):
+    dataset_path = str(tmp_path / "dataset")
+    write_dataset(dataset_path, ["FIRST"], 16, ".webp")
+
+    report = scan_dataset(tmp_path, dataset_path, ["FIRST"], (16, 16, 3))
+
+    assert report["errors"] == 0
+    assert report["problems"] == {}
+    assert report["files"] == 2
@@ -0,0 +1,54 @@
+import numpy as np
+
+from embedding_index import IVF_MIN_SIZE, EmbeddingIndex, normalize_embeddings
+
+
+# Function which returns random unit embeddings
+def random_embeddings(random, count, size=16):
+    return normalize_embeddings(random.normal(size=(count, size)).astype(np.float32))
+
+
+# Function which creates an index large enough for the inverted lists
+def create_index(random):
+    count = IVF_MIN_SIZE * 2
+    index = EmbeddingIndex("model.keras", ["FIRST", "SECOND"], random_embeddings(random, count),
+                           random.integers(0, 2, count))
+    index.train_inverted_lists()
+    return index
+
+
+# The inverted lists hold every embedding once, in the list it is assigned to
+def assert_inverted_lists_match(index):
+    assert sum(len(indexes) for indexes in index.inverted_lists) == len(index.embeddings)
+
+    for list_index, indexes in enumerate(index.inverted_lists):
+        assert np.all(index.assignments[indexes] == list_index)
+
+
+# A search through the inverted lists finds the same neighbours as a scan of the probed lists
+def test_search_reads_only_the_probed_lists():
+    random = np.random.default_rng(0)
+    index = create_index(random)
+    queries = random_embeddings(random, 20)
+
+    _, similarities = index.search(queries, k=5, probes=3)
+    probed_lists = index.nearest_centroids(queries, 3)
+
+    for query, query_lists, query_similarities in zip(queries, probed_lists, similarities):
+        candidates = np.flatnonzero(np.isin(index.assignments, query_lists))
+        expected = np.sort(index.embeddings[candidates].astype(np.float32) @ query)[::-1][:5]
+        np.testing.assert_allclose(query_similarities, expected, rtol=1e-6)
+
+
+# Added embeddings join their inverted lists and survive a save and load
+def test_add_and_load_keep_the_inverted_lists(tmp_path):
+    random = np.random.default_rng(1)
+    index = create_index(random)
+
+    index.add(random_embeddings(random, 30), "THIRD")
+    assert_inverted_lists_match(index)
+
+    index.save(str(tmp_path / "index.npz"))
+    loaded_index = EmbeddingIndex.load(str(tmp_path / "index.npz"))
+
+    assert_inverted_lists_match(loaded_index)
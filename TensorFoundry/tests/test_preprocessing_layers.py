@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+from PIL import Image
+
+from image_processing import augment_image_task
+from preprocessing_layers import TaskAugmentation, create_preprocessing_model
+
+
+# Function which augments an image with the preprocessing layer and returns the pixels as uint8
+def augment_layer(pixels, task_index):
+    images = np.expand_dims(pixels.astype(np.float32), 0)
+    tasks = np.array([task_index], dtype=np.int32)
+
+    return TaskAugmentation()([images, tasks]).numpy()[0].astype(np.uint8)
+
+
+# The second column starts with a black pixel after the leading black run of the first column has ended,
+# so only the single leading run of the whole image walked column by column may stay black
+@pytest.mark.parametrize("task_index", [0, 1, 4])
+def test_task_augmentation_matches_augment_image_task(task_index):
+    pixels = np.full((4, 4, 3), 3, dtype=np.uint8)
+    pixels[0:2, 0] = 0
+    pixels[0, 1] = 0
+    pixels[1:3, 3] = 0
+
+    expected = np.asarray(augment_image_task(Image.fromarray(pixels), task_index))
+
+    np.testing.assert_array_equal(augment_layer(pixels, task_index), expected)
+    assert expected[0, 1].any()
+
+
+# Random screenshots with black borders cover runs crossing column boundaries
+def test_task_augmentation_matches_augment_image_task_on_random_images():
+    random = np.random.default_rng(0)
+
+    for _ in range(5):
+        pixels = random.integers(0, 256, (16, 12, 3), dtype=np.uint8)
+        pixels[:random.integers(0, 16), :random.integers(1, 12)] = 0
+        pixels[random.random((16, 12)) < 0.2] = 0
+
+        expected = np.asarray(augment_image_task(Image.fromarray(pixels), 2))
+        np.testing.assert_array_equal(augment_layer(pixels, 2), expected)
+
+
+# A negative task index leaves the screenshot untouched for the assert models
+def test_task_augmentation_skips_negative_task():
+    pixels = np.random.default_rng(1).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+
+    np.testing.assert_array_equal(augment_layer(pixels, -1), pixels)
+
+
+# The wrapped multi-head model keeps the head names, which the TFLite output log and the labels rely on
+def test_preprocessing_model_keeps_head_names():
+    inputs = tf.keras.Input(shape=(8, 8, 3))
+    features = tf.keras.layers.Flatten()(inputs)
+    model = tf.keras.Model(inputs=inputs, name="MULTIHEAD", outputs=[
+        tf.keras.layers.Dense(2, activation="softmax", name="task_output")(features),
+        tf.keras.layers.Dense(3, activation="softmax", name="assert_output")(features)])
+
+    assert create_preprocessing_model(model, 3).output_names == ["task_output", "assert_output"]
@@ -0,0 +1,146 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from task_runner import TaskRunner
+
+
+class FakeApp:
+    # Stand-in for the Tk application which records the scheduled callbacks instead of running a main loop
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, delay, callback):
+        self.callbacks.append(callback)
+
+
+class FakeTaskView:
+    # Stand-in for a task view which records the jobs it was shown
+
+    def __init__(self):
+        self.task_runner = None
+        self.task = None
+
+    def refresh(self, tasks):
+        self.task = tasks[0] if tasks else None
+
+
+# A job queued from the on_done callback of another job joins the running poll loop instead of starting another
+def test_job_queued_from_on_done_keeps_a_single_poll_loop():
+    app = FakeApp()
+    task_runner = TaskRunner(app, SimpleNamespace(worker_threads=2, task_poll_rate=1), lambda message: None)
+    results = []
+
+    task_runner.run("First", lambda task: 1,
+                    lambda result: task_runner.run("Second", lambda task: result + 1, results.append))
+
+    try:
+        while app.callbacks:
+            assert len(app.callbacks) == 1
+
+            time.sleep(0.01)
+            app.callbacks.pop(0)()
+    finally:
+        task_runner.close()
+
+    assert results == [2]
+    assert not task_runner.polling
+
+
+# Function which runs the poll loop of the task runner until every job has been delivered
+def run_poll_loop(app):
+    while app.callbacks:
+        time.sleep(0.01)
+        app.callbacks.pop(0)()
+
+
+# A failed job reports its exception to on_error instead of delivering a result, once its running items have ended
+def test_failed_job_calls_on_error():
+    app = FakeApp()
+    task_runner = TaskRunner(app, SimpleNamespace(worker_threads=2, task_poll_rate=1), lambda message: None)
+    results = []
+    errors = []
+
+    # Function which fails on a single item after the other items have been handled
+    def handle_item(item):
+        if item == 2:
+            raise ValueError(item)
+
+        time.sleep(0.02)
+        results.append(item)
+
+    task_runner.run("Failing", lambda task: task.map(handle_item, range(4)), results.append,
+                    lambda error: errors.append((error, len(results))))
+
+    try:
+        run_poll_loop(app)
+    finally:
+        task_runner.close()
+
+    assert len(errors) == 1
+    assert isinstance(errors[0][0], ValueError)
+    assert errors[0][1] == len(results)
+
+
+# Cancelling the job of a view leaves the jobs of other views running, and the cancelled job never delivers its
+# result even when it does not check for cancellation
+def test_cancel_only_stops_the_job_of_the_view():
+    app = FakeApp()
+    task_runner = TaskRunner(app, SimpleNamespace(worker_threads=2, task_poll_rate=1), lambda message: None)
+    preview_view = FakeTaskView()
+    dataset_view = FakeTaskView()
+    task_runner.add_view(preview_view)
+    task_runner.add_view(dataset_view)
+
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+    errors = []
+
+    # Function which blocks without checking for cancellation
+    def render_preview(task):
+        started.set()
+        release.wait()
+        return "preview"
+
+    preview_task = task_runner.run("Rendering preview", render_preview, results.append, errors.append,
+                                   task_view=preview_view)
+    task_runner.run("Adding images", lambda task: "images", results.append, errors.append, task_view=dataset_view)
+
+    try:
+        started.wait()
+        app.callbacks.pop(0)()
+        assert preview_view.task is preview_task
+
+        task_runner.cancel(preview_view.task)
+        release.set()
+        run_poll_loop(app)
+    finally:
+        task_runner.close()
+
+    assert results == ["images"]
+    assert len(errors) == 1
+
+
+# A long job feeding the UI leaves the dataset writes free to run
+def test_background_job_does_not_hold_up_serial_jobs():
+    app = FakeApp()
+    task_runner = TaskRunner(app, SimpleNamespace(worker_threads=2, task_poll_rate=1), lambda message: None)
+    release = threading.Event()
+    results = []
+
+    task_runner.run("Building thumbnails", lambda task: release.wait(), serial=False)
+    task_runner.run("Adding images", lambda task: "images", results.append)
+
+    try:
+        while not results:
+            time.sleep(0.01)
+            app.callbacks.pop(0)()
+
+        release.set()
+        run_poll_loop(app)
+    finally:
+        task_runner.close()
+
+    assert results == ["images"]
@@ -0,0 +1,63 @@
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from thumbnail_cache import ThumbnailCache
+
+
+# Function which creates a thumbnail cache with a size limit in megabytes
+def create_cache(tmp_path, cache_limit):
+    configuration = SimpleNamespace(thumbnail_cache_path=str(tmp_path / "thumbnails"), thumbnail_size=32,
+                                    thumbnail_cache_limit=cache_limit)
+    return ThumbnailCache(configuration, lambda message: None)
+
+
+# Function which writes noise images which compress badly, so every thumbnail takes a few kilobytes
+def write_images(tmp_path, count):
+    random = np.random.default_rng(0)
+    image_paths = []
+
+    for image_index in range(count):
+        image_path = str(tmp_path / "image_{}.png".format(image_index))
+        Image.fromarray(random.integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(image_path)
+        image_paths.append(image_path)
+
+    return image_paths
+
+
+# Function which returns the total size of the cached thumbnails
+def cache_bytes(thumbnail_cache):
+    return sum(entry.stat().st_size for entry in os.scandir(thumbnail_cache.cache_path))
+
+
+# The cache stays under its limit and keeps the most recently used thumbnails
+def test_cache_evicts_least_recently_used_thumbnails(tmp_path):
+    image_paths = write_images(tmp_path, 40)
+    thumbnail_cache = create_cache(tmp_path, 0.05)
+
+    thumbnail_cache.load_thumbnail(image_paths[0])
+    for image_path in image_paths[1:]:
+        time.sleep(0.002)
+        thumbnail_cache.load_thumbnail(image_path)
+
+        # Reading the first thumbnail again keeps it the most recently used
+        thumbnail_cache.load_thumbnail(image_paths[0])
+
+    assert cache_bytes(thumbnail_cache) <= thumbnail_cache.cache_limit * 1.1
+    assert thumbnail_cache.is_cached(image_paths[0])
+    assert thumbnail_cache.is_cached(image_paths[-1])
+    assert not thumbnail_cache.is_cached(image_paths[1])
+
+
+# A zero limit never evicts
+def test_cache_without_limit_keeps_every_thumbnail(tmp_path):
+    image_paths = write_images(tmp_path, 10)
+    thumbnail_cache = create_cache(tmp_path, 0)
+
+    for image_path in image_paths:
+        thumbnail_cache.load_thumbnail(image_path)
+
+    assert all(thumbnail_cache.is_cached(image_path) for image_path in image_paths)
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from task_runner import TaskCancelled
+from thumbnail_gallery import ThumbnailGallery
+
+
+class FakeTaskRunner:
+    # Stand-in for the task runner which runs each job straight away, or cancels it when told to
+
+    def __init__(self, cancel=False):
+        self.cancel = cancel
+        self.names = []
+
+    def run(self, name, work, on_done=None, on_error=None, task_view=None, serial=True):
+        self.names.append(name)
+
+        if self.cancel:
+            on_error(TaskCancelled())
+            return
+
+        on_done(work(SimpleNamespace(map=lambda function, items: [function(item) for item in items])))
+
+
+class FakeThumbnailCache:
+    # Stand-in for the thumbnail cache which cannot decode the broken images
+
+    def __init__(self, broken_paths):
+        self.broken_paths = broken_paths
+
+    def load_thumbnail(self, image_path):
+        if image_path in self.broken_paths:
+            raise OSError("cannot identify image file")
+
+
+# Function which creates a gallery without its Tk widgets
+def create_gallery(task_runner, thumbnail_cache):
+    gallery = ThumbnailGallery.__new__(ThumbnailGallery)
+    gallery.task_runner = task_runner
+    gallery.task_view = None
+    gallery.thumbnail_cache = thumbnail_cache
+    gallery.pending_paths = set()
+    gallery.failed_paths = set()
+    gallery.redraw = lambda: None
+    return gallery
+
+
+# A broken screenshot only skips its own thumbnail and is not queued again
+def test_broken_image_skips_only_its_thumbnail():
+    task_runner = FakeTaskRunner()
+    gallery = create_gallery(task_runner, FakeThumbnailCache({"broken.png"}))
+
+    gallery.create_thumbnails(["first.png", "broken.png", "second.png"])
+    gallery.create_thumbnails(["broken.png"])
+
+    assert gallery.failed_paths == {"broken.png"}
+    assert gallery.pending_paths == set()
+    assert len(task_runner.names) == 1
+
+
+# A cancelled job releases its images so the next redraw queues them again
+def test_cancelled_job_releases_pending_thumbnails():
+    task_runner = FakeTaskRunner(cancel=True)
+    gallery = create_gallery(task_runner, FakeThumbnailCache(set()))
+
+    gallery.create_thumbnails(["first.png"])
+    gallery.create_thumbnails(["first.png"])
+
+    assert gallery.pending_paths == set()
+    assert gallery.failed_paths == set()
+    assert len(task_runner.names) == 2